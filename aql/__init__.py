@@ -1,16 +1,20 @@
-from .parser.lexer import tokenize, LexerError
+from .parser.lexer import tokenize, iter_tokens, LexerError
 from .parser.parser import parse, ParserError
+from .optimizer import optimize, is_unsatisfiable
 from .parser.ast import (
     Query, LogicalExpression, ComparisonCondition,
-    Identifier, Value, SetLiteral,
+    Identifier, Value, SetLiteral, Constant, SortKey,
     ComparisonOperator, LogicalOperator,
     print_ast
 )
 
 __all__ = [
     'tokenize',
+    'iter_tokens',
     'parse',
     'print_ast',
+    'optimize',
+    'is_unsatisfiable',
     'LexerError',
     'ParserError',
     # AST classes
@@ -20,6 +24,8 @@ __all__ = [
     'Identifier',
     'Value',
     'SetLiteral',
+    'Constant',
+    'SortKey',
     'ComparisonOperator',
     'LogicalOperator',
 ] 
\ No newline at end of file
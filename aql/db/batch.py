@@ -0,0 +1,116 @@
+from typing import List, Dict, Any, Tuple, Optional, Sequence
+from .plan_cache import get_plan_cache
+from .sql_builder import ParamStyle
+
+# Column added to every row of a batched statement, holding the index of the
+# query that produced it
+QUERY_TAG_COLUMN = 'aql_query'
+
+# Column holding each row's position in its query's ORDER BY, 0 for
+# queries without one
+QUERY_ROW_COLUMN = 'aql_row'
+
+# Alias of the derived table wrapping a query with ORDER BY or LIMIT
+BRANCH_ALIAS = 'aql_branch'
+
+def _order_clause(template: str) -> str:
+    """The ORDER BY keys of a compiled template, or '' without ORDER BY"""
+    # Literals are parameter slots in a template, so ' ORDER BY ' can only start the clause
+    if ' ORDER BY ' not in template:
+        return ''
+    clause = template.rsplit(' ORDER BY ', 1)[1]
+    return 'ORDER BY ' + clause.split(' LIMIT ', 1)[0]
+
+def _split_select(sql: str) -> Tuple[str, str]:
+    """The select list and the rest of a translated query"""
+    head, rest = sql.split(' FROM ', 1)
+    select_list = head[len('SELECT '):]
+    if select_list == '*':
+        select_list = '"resumes".*'
+    return select_list, rest
+
+def _tag_select(sql: str, tag: int, ordered: bool = False, order_clause: str = '') -> str:
+    """Prefix the select list of a translated query with its tag and row columns"""
+    select_list, rest = _split_select(sql)
+    if ordered:
+        # ORDER BY and LIMIT cannot precede UNION ALL in a compound select,
+        # and SQLite rejects bracketed members, so the query becomes a
+        # derived table. A union keeps no row order, so each row's position
+        # is numbered by the same keys and the statement is sorted by it.
+        numbered = f'SELECT ROW_NUMBER() OVER ({order_clause}) AS "{QUERY_ROW_COLUMN}",{select_list} FROM {rest}'
+        return f'SELECT {tag} AS "{QUERY_TAG_COLUMN}","{BRANCH_ALIAS}".* FROM ({numbered}) AS "{BRANCH_ALIAS}"'
+    return f'SELECT {tag} AS "{QUERY_TAG_COLUMN}",0 AS "{QUERY_ROW_COLUMN}",{select_list} FROM {rest}'
+
+def translate_many(
+    query_strs: Sequence[str],
+    param_style: Optional[ParamStyle] = None,
+    semi_joins: bool = False,
+    backend: str = 'direct',
+    columns: Optional[Sequence[str]] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Translate a batch of AQL queries into one UNION ALL statement.
+    Every row carries the index of the first query in the batch that
+    produced it in the aql_query column and its position in that query's
+    ORDER BY in the aql_row column, followed by the resumes columns or the
+    given projection; repeated queries share one branch. With any ORDER BY
+    in the batch, the statement is sorted by aql_query and aql_row.
+    Templates come from the shared plan cache, so only new query shapes
+    are parsed and translated.
+    Returns: (query_string, parameters)
+    """
+    if not query_strs:
+        raise ValueError("No queries to translate")
+
+    cache = get_plan_cache()
+    branches: List[str] = []
+    params: List[Any] = []
+    seen: Dict[str, int] = {}
+    ordered = False
+    for tag, query_str in enumerate(query_strs):
+        if query_str in seen:
+            continue
+        seen[query_str] = tag
+        plan, literals = cache.plan(query_str, semi_joins, backend, columns)
+        sql = plan.render(literals, param_style, first_index=len(params) + 1)
+        order_clause = _order_clause(''.join(plan.fragments)) if plan.ordered else ''
+        branches.append(_tag_select(sql, tag, plan.ordered, order_clause))
+        params.extend(literals)
+        ordered = ordered or bool(order_clause)
+    sql = ' UNION ALL '.join(branches)
+    if ordered:
+        sql += f' ORDER BY "{QUERY_TAG_COLUMN}","{QUERY_ROW_COLUMN}"'
+    return sql, params
+
+def split_rows(query_strs: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[List[Tuple[Any, ...]]]:
+    """Demultiplex the rows of a batched statement into one row list per query, dropping the tag and row columns"""
+    results: List[List[Tuple[Any, ...]]] = [[] for _ in query_strs]
+    for row in rows:
+        results[row[0]].append(tuple(row[2:]))
+
+    # Repeated queries were answered by the branch of their first occurrence
+    first: Dict[str, int] = {}
+    for index, query_str in enumerate(query_strs):
+        if query_str in first:
+            results[index] = list(results[first[query_str]])
+        else:
+            first[query_str] = index
+    return results
+
+def execute_many(
+    cursor: Any,
+    query_strs: Sequence[str],
+    param_style: ParamStyle = ParamStyle.FORMAT,
+    semi_joins: bool = False,
+    backend: str = 'direct',
+    columns: Optional[Sequence[str]] = None
+) -> List[List[Tuple[Any, ...]]]:
+    """
+    Run a batch of AQL queries in a single round trip on a DB-API cursor.
+    Returns the resume rows of each query, in the order the queries were given.
+    """
+    if not query_strs:
+        return []
+    sql, params = translate_many(query_strs, param_style, semi_joins, backend, columns)
+    cursor.execute(sql, params)
+    return split_rows(query_strs, cursor.fetchall())
@@ -0,0 +1,281 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Callable, Hashable, AsyncIterator, Sequence
+from ..instrumentation import start_trace, timed
+from .plan_cache import CompiledPlan, get_plan_cache
+from .result_cache import ResultCache, read_table_versions
+from .sql_builder import ParamStyle
+
+Row = Tuple[Any, ...]
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections for asyncio code. Connections are
+    opened lazily through the connect factory, at most max_size at a time.
+    Each connection is opened and used on a thread of its own, so drivers
+    that tie a connection to its thread, like sqlite3, work unchanged.
+    """
+    def __init__(self, connect: Callable[[], Any], max_size: int = 10):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.connect = connect
+        self.max_size = max_size
+        self._idle: List[Any] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Thread of each open connection, by id(connection)
+        self._threads: Dict[int, ThreadPoolExecutor] = {}
+        self._closed = False
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        """Borrow a connection, waiting while all max_size connections are in use"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        if self._slots is None:
+            # Created lazily so the semaphore binds to the running event loop
+            self._slots = asyncio.Semaphore(self.max_size)
+        async with self._slots:
+            if self._idle:
+                connection = self._idle.pop()
+            else:
+                connection = await self._open()
+            try:
+                yield connection
+            except BaseException:
+                # A failed or interrupted connection may be mid-transaction
+                await self.run(_rollback, connection)
+                raise
+            finally:
+                self._idle.append(connection)
+
+    async def _open(self) -> Any:
+        thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='aql-db')
+        try:
+            connection = await asyncio.get_running_loop().run_in_executor(thread, self.connect)
+        except BaseException:
+            thread.shutdown(wait=False)
+            raise
+        self._threads[id(connection)] = thread
+        return connection
+
+    def run(self, function: Callable[..., Any], connection: Any, *args: Any) -> 'asyncio.Future':
+        """Run a blocking function(connection, *args) on the connection's thread"""
+        thread = self._threads[id(connection)]
+        return asyncio.get_running_loop().run_in_executor(thread, function, connection, *args)
+
+    @property
+    def size(self) -> int:
+        """Number of open connections"""
+        return len(self._threads)
+
+    async def close(self) -> None:
+        """Wait for borrowed connections to come back, then close every connection"""
+        self._closed = True
+        if self._slots is not None:
+            for _ in range(self.max_size):
+                await self._slots.acquire()
+        while self._idle:
+            connection = self._idle.pop()
+            await self.run(_close, connection)
+            self._threads.pop(id(connection)).shutdown(wait=False)
+
+def _rollback(connection: Any) -> None:
+    try:
+        connection.rollback()
+    except Exception:
+        pass
+
+def _close(connection: Any) -> None:
+    connection.close()
+
+def _fetch_all(connection: Any, sql: str, params: List[Any]) -> List[Row]:
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _interrupt(connection: Any) -> None:
+    """Abort the statement running on a connection: sqlite3 interrupt() or psycopg2 cancel()"""
+    for method in ('interrupt', 'cancel'):
+        abort = getattr(connection, method, None)
+        if abort is not None:
+            try:
+                abort()
+            except Exception:
+                pass
+            return
+
+@dataclass(frozen=True)
+class ExecutorStats:
+    executed: int
+    coalesced: int
+    timeouts: int
+    cancelled: int
+    in_flight: int
+
+class _Flight:
+    """One running statement and the number of callers waiting for it"""
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: 'asyncio.Task'):
+        self.task = task
+        self.waiters = 0
+
+class AsyncQueryExecutor:
+    """
+    Runs AQL queries on a ConnectionPool with per-query timeouts. Concurrent
+    calls for the same translated SQL and parameters share one execution
+    (single-flight): the first caller starts it and every caller receives
+    the rows. A caller timing out or being cancelled only stops waiting;
+    the statement itself is interrupted once no caller is left.
+
+    With a result_cache, results are answered from the cache until a table
+    they read is written. With version_refresh, the executor reads the
+    aql_table_versions table at most once per that many seconds, so writes
+    by other processes are seen within version_refresh seconds.
+    """
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        param_style: ParamStyle = ParamStyle.FORMAT,
+        semi_joins: bool = False,
+        backend: str = 'direct',
+        timeout: Optional[float] = None,
+        result_cache: Optional[ResultCache] = None,
+        version_refresh: Optional[float] = None
+    ):
+        self.pool = pool
+        self.param_style = param_style
+        self.semi_joins = semi_joins
+        self.backend = backend
+        self.timeout = timeout
+        self.result_cache = result_cache
+        self.version_refresh = version_refresh
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._versions_read: Optional['asyncio.Future'] = None
+        self._versions_read_at = float('-inf')
+        self.executed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    async def execute(self, query_str: str, timeout: Optional[float] = None,
+                      columns: Optional[Sequence[str]] = None) -> List[Row]:
+        """Translate and run an AQL query, returning its rows or just the given columns"""
+        trace = start_trace(query_str)
+        plan, params = get_plan_cache().plan(query_str, self.semi_joins, self.backend, columns, trace=trace)
+        sql = timed(trace, 'translate', plan.render, params, self.param_style)
+        if trace is None:
+            return await self._execute_plan(plan, sql, params, timeout)
+        # Timed out and cancelled queries are traced too: they are the slowest ones
+        start = time.perf_counter_ns()
+        try:
+            return await self._execute_plan(plan, sql, params, timeout)
+        finally:
+            trace.add('execute', time.perf_counter_ns() - start)
+            trace.set_sql(sql)
+            trace.finish()
+
+    async def _execute_plan(self, plan: CompiledPlan, sql: str, params: List[Any],
+                            timeout: Optional[float]) -> List[Row]:
+        """Run a translated query, answering from the result cache when it can"""
+        cache = self.result_cache
+        if cache is None:
+            return await self.execute_sql(sql, params, timeout)
+        if self.version_refresh is not None:
+            await self.refresh_versions()
+        rows, versions = cache.lookup(sql, params, plan.tables)
+        if rows is not None:
+            return list(rows)
+        rows = await self.execute_sql(sql, params, timeout)
+        # execute_sql returned a copy, which callers may modify
+        cache.put(sql, params, plan.tables, versions, list(rows))
+        return rows
+
+    async def refresh_versions(self, force: bool = False) -> None:
+        """
+        Read table versions from the database into the result cache, unless
+        they were read less than version_refresh seconds ago. Concurrent
+        callers share one read.
+        """
+        if self._versions_read is None or self._versions_read.done():
+            now = time.monotonic()
+            if not force and now - self._versions_read_at < (self.version_refresh or 0.0):
+                return
+            self._versions_read_at = now
+            self._versions_read = asyncio.ensure_future(self._read_versions())
+        await asyncio.shield(self._versions_read)
+
+    async def _read_versions(self) -> None:
+        async with self.pool.connection() as connection:
+            versions = await self.pool.run(read_table_versions, connection)
+        self.result_cache.versions.observe(versions)
+
+    async def execute_sql(self, sql: str, params: List[Any],
+                          timeout: Optional[float] = None) -> List[Row]:
+        """Run translated SQL, joining an identical statement already in flight"""
+        # Translation normalizes queries, so equal SQL and parameters mean equal results
+        key = (sql, tuple(params))
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(self._run(key, sql, params)))
+            self._flights[key] = flight
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            rows = await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self._leave(key, flight)
+        # Each caller gets its own list; the row tuples are shared
+        return list(rows)
+
+    def _leave(self, key: Hashable, flight: _Flight) -> None:
+        """Drop a waiter, cancelling the statement if nobody else is waiting for it"""
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _run(self, key: Hashable, sql: str, params: List[Any]) -> List[Row]:
+        try:
+            async with self.pool.connection() as connection:
+                work = self.pool.run(_fetch_all, connection, sql, params)
+                try:
+                    return await asyncio.shield(work)
+                except asyncio.CancelledError:
+                    # The worker thread keeps the connection busy until the
+                    # statement is aborted, so interrupt it and wait
+                    _interrupt(connection)
+                    await asyncio.wait([work])
+                    if not work.cancelled():
+                        work.exception()
+                    raise
+        finally:
+            flight = self._flights.get(key)
+            if flight is not None and flight.task is asyncio.current_task():
+                del self._flights[key]
+
+    def stats(self) -> ExecutorStats:
+        return ExecutorStats(
+            executed=self.executed,
+            coalesced=self.coalesced,
+            timeouts=self.timeouts,
+            cancelled=self.cancelled,
+            in_flight=len(self._flights)
+        )
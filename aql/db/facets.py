@@ -0,0 +1,121 @@
+from typing import List, Dict, Any, Tuple, Optional, Sequence, Union
+from ..facets import Facet, FacetCounts, check_facets, top_values
+from ..parser.ast import Query
+from .query_translator import create_translator
+from .sql_builder import ParamStyle
+from .sql_codegen import FIELD_COLUMNS, sql_literal
+
+# Name of the CTE holding the matching resumes, computed once for all facets
+HITS_CTE = 'aql_hits'
+
+# Joins from the matching resumes to the rows of multi-valued fields, and
+# the aggregate counting each resume once per value
+FACET_JOINS = {
+    'SKILLS': (
+        f' JOIN "resume_skills" ON "resume_skills"."resume_id"="{HITS_CTE}"."id"'
+        ' JOIN "skills" ON "skills"."id"="resume_skills"."skill_id"',
+        # resume_skills has one row per resume and skill
+        'COUNT(*)'
+    ),
+    'EDUCATION': (
+        f' JOIN "education" ON "education"."resume_id"="{HITS_CTE}"."id"',
+        # A resume may list the same degree twice
+        f'COUNT(DISTINCT "{HITS_CTE}"."id")'
+    ),
+}
+
+def translate_facets(
+    query: Union[str, Query],
+    facets: Sequence[Facet],
+    param_style: Optional[ParamStyle] = None,
+    backend: str = 'direct'
+) -> Tuple[str, List[Any]]:
+    """
+    Translate an AQL filter and a facet spec into one statement returning
+    (facet, value, count) rows: a row with a NULL facet holds the number of
+    matching resumes, and the others hold each facet's histogram. Matching
+    resumes are selected once, in a CTE that every facet reads, so the
+    filter runs a single time however many facets are requested. ORDER BY
+    and LIMIT of the query are ignored; facets cover every match.
+    Returns: (query_string, parameters)
+    """
+    facets = check_facets(facets)
+    if isinstance(query, str):
+        from ..parser.parser import parse
+        query = parse(query)
+
+    # Each resume appears once in the CTE, with the columns its facets read
+    columns = ['id'] + [
+        FIELD_COLUMNS[facet.field][1] for facet in facets if facet.field not in FACET_JOINS
+    ]
+    translator = create_translator(backend, param_style, True, columns)
+    hits_sql, params = translator.translate(Query(query.expression))
+
+    def bind(value: Any) -> str:
+        params.append(value)
+        if param_style is None:
+            return sql_literal(value)
+        return param_style.placeholder(len(params))
+
+    branches = [f'SELECT NULL AS "facet",NULL AS "value",COUNT(*) AS "count" FROM "{HITS_CTE}"']
+    for index, facet in enumerate(facets):
+        table, column = FIELD_COLUMNS[facet.field]
+        joins, count = FACET_JOINS.get(facet.field, ('', 'COUNT(*)'))
+        value = f'"{table}"."{column}"' if joins else f'"{column}"'
+        if facet.edges is not None:
+            # Bucket i holds edges[i-1] <= value < edges[i]
+            cases = [f'WHEN {value} IS NULL THEN NULL']
+            for bucket, edge in enumerate(facet.edges):
+                cases.append(f"WHEN {value}<{bind(edge)} THEN '{bucket}'")
+            value = f"CASE {' '.join(cases)} ELSE '{len(facet.edges)}' END"
+
+        branch = (
+            f"SELECT '{facet.field}' AS \"facet\",{value} AS \"value\",{count} AS \"count\""
+            f' FROM "{HITS_CTE}"{joins} GROUP BY 2'
+        )
+        if facet.limit is not None:
+            # ORDER BY and LIMIT cannot precede UNION ALL, so the branch becomes a derived table
+            branch = (
+                f'SELECT * FROM ({branch} ORDER BY "count" DESC,"value" NULLS LAST'
+                f' LIMIT {bind(facet.limit)}) AS "aql_facet_{index}"'
+            )
+        branches.append(branch)
+
+    return f'WITH "{HITS_CTE}" AS ({hits_sql}) ' + ' UNION ALL '.join(branches), params
+
+def read_facet_rows(facets: Sequence[Facet], rows: Sequence[Sequence[Any]]) -> FacetCounts:
+    """Turn the (facet, value, count) rows of translate_facets into FacetCounts"""
+    facets = check_facets(facets)
+    result = FacetCounts(total=0, facets={facet.field: {} for facet in facets})
+    by_field = {facet.field: facet for facet in facets}
+    for name, value, count in rows:
+        if name is None:
+            result.total = int(count)
+            continue
+        facet = by_field[name]
+        if facet.edges is not None and value is not None:
+            value = facet.buckets[int(value)]
+        result.facets[name][value] = int(count)
+
+    for facet in facets:
+        counts = result.facets[facet.field]
+        if facet.edges is not None:
+            ordered = {bucket: counts[bucket] for bucket in facet.buckets if bucket in counts}
+            if None in counts:
+                ordered[None] = counts[None]
+            result.facets[facet.field] = ordered
+        else:
+            result.facets[facet.field] = top_values(counts, facet.limit)
+    return result
+
+def execute_facets(
+    cursor: Any,
+    query: Union[str, Query],
+    facets: Sequence[Facet],
+    param_style: ParamStyle = ParamStyle.FORMAT,
+    backend: str = 'direct'
+) -> FacetCounts:
+    """Compute the total and every facet of a query in one round trip on a DB-API cursor"""
+    sql, params = translate_facets(query, facets, param_style, backend)
+    cursor.execute(sql, params)
+    return read_facet_rows(facets, cursor.fetchall())
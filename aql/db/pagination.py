@@ -0,0 +1,247 @@
+import base64
+import hashlib
+import itertools
+import json
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import List, Any, Tuple, Optional, Iterator, Union, Sequence
+from ..parser.ast import Query
+from .query_translator import create_translator, translate_query
+from .sql_builder import ParamStyle
+from .sql_codegen import sort_column
+
+Row = Tuple[Any, ...]
+
+# Alias of the derived table holding the rows a query matches
+PAGE_ALIAS = 'aql_page'
+
+# Alias of the derived table holding the first LIMIT rows a query matches
+LIMITED_ALIAS = 'aql_limited'
+
+# Position after the last row of a page: (sort key values, resume id)
+Position = Tuple[List[Any], int]
+
+@dataclass(frozen=True)
+class Page:
+    rows: List[Row]
+    cursor: Optional[str]  # Token for the next page, None after the last page
+
+def _encode_value(value: Any) -> Any:
+    # DECIMAL columns come back from psycopg2 as Decimal, which JSON cannot hold
+    if isinstance(value, Decimal):
+        return ['decimal', str(value)]
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return Decimal(value[1])
+    return value
+
+class KeysetPaginator:
+    """
+    Pages through the resumes an AQL query matches with keyset pagination:
+    each page seeks past the sort key and resume id of the previous page's
+    last row, so a deep page costs the same as the first one instead of
+    reading and discarding every earlier row like OFFSET. Rows are ordered
+    by the query's ORDER BY keys with NULLs last and ties broken by
+    resumes.id, or by resumes.id alone. The query's LIMIT caps the rows
+    returned over all pages: every page seeks within the first LIMIT rows,
+    so the cap holds whatever cursor a client sends.
+
+    Page cursors are opaque URL-safe tokens, valid only for the query that
+    produced them. Seeking requires each resume to appear once, so
+    SKILLS/EDUCATION predicates are translated to semi-joins by default.
+    A projection must include id and the sort key columns.
+    """
+    def __init__(
+        self,
+        query: Union[str, Query],
+        page_size: int = 100,
+        param_style: ParamStyle = ParamStyle.FORMAT,
+        semi_joins: bool = True,
+        backend: str = 'direct',
+        columns: Optional[Sequence[str]] = None
+    ):
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        if param_style is None:
+            raise ValueError("Pagination needs a param_style to bind cursor values")
+        if isinstance(query, str):
+            from ..parser.parser import parse
+            query = parse(query)
+
+        self.page_size = page_size
+        self.param_style = param_style
+        self.limit = query.limit
+        self.sort_keys: List[Tuple[str, bool]] = [
+            (sort_column(key.field.name), key.descending) for key in query.order_by
+        ]
+        if columns is not None:
+            keys = ['id'] + [column for column, _ in self.sort_keys]
+            missing = [column for column in keys if column not in columns]
+            if missing:
+                raise ValueError(f"Projection is missing pagination keys: {', '.join(missing)}")
+        translator = create_translator(backend, param_style, semi_joins, columns)
+        self.filter_sql, self.filter_params = translator.translate(Query(query.expression))
+
+        order = [f'"{column}"{" DESC" if descending else ""} NULLS LAST'
+                 for column, descending in self.sort_keys]
+        self._order_sql = ','.join(order + ['"id"'])
+        # Ties a cursor to the query and ordering it was issued for
+        self._query_key = hashlib.sha256(
+            repr((self.filter_sql, self.filter_params, self.sort_keys)).encode()
+        ).hexdigest()[:16]
+
+    def page_sql(self, cursor: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """
+        SQL for the page after a cursor token, or for the first page.
+        Returns: (query_string, parameters)
+        """
+        return self._page_sql(self._decode(cursor), self._page_limit())
+
+    def fetch_page(self, db_cursor: Any, cursor: Optional[str] = None) -> Page:
+        """Run the query for one page on a DB-API cursor"""
+        size = self._page_limit()
+        if size == 0:
+            return Page([], None)
+
+        sql, params = self._page_sql(self._decode(cursor), size)
+        db_cursor.execute(sql, params)
+        rows = [tuple(row) for row in db_cursor.fetchall()]
+        if len(rows) < size:
+            return Page(rows, None)
+
+        columns = [description[0] for description in db_cursor.description]
+        last = rows[-1]
+        values = [last[columns.index(column)] for column, _ in self.sort_keys]
+        return Page(rows, self._encode((values, last[columns.index('id')])))
+
+    def iter_rows(self, db_cursor: Any) -> Iterator[Row]:
+        """Yield every matching row, holding at most one page in memory"""
+        cursor = None
+        while True:
+            page = self.fetch_page(db_cursor, cursor)
+            yield from page.rows
+            if page.cursor is None:
+                return
+            cursor = page.cursor
+
+    def _page_limit(self) -> int:
+        if self.limit is None:
+            return self.page_size
+        return min(self.page_size, self.limit)
+
+    def _page_sql(self, position: Optional[Position], size: int) -> Tuple[str, List[Any]]:
+        params = list(self.filter_params)
+        sql = f'SELECT * FROM ({self.filter_sql}) AS "{PAGE_ALIAS}"'
+        if self.limit is not None:
+            # Cursors only carry a position, so the LIMIT is applied anew on every page
+            limited = f'{sql} ORDER BY {self._order_sql} LIMIT {self._bind(self.limit, params)}'
+            sql = f'SELECT * FROM ({limited}) AS "{LIMITED_ALIAS}"'
+        if position is not None:
+            values, last_id = position
+            sql += f' WHERE {self._seek_sql(values, last_id, params)}'
+        sql += f' ORDER BY {self._order_sql} LIMIT {self._bind(size, params)}'
+        return sql, params
+
+    def _seek_sql(self, values: List[Any], last_id: int, params: List[Any]) -> str:
+        """Condition selecting the rows that sort after a position"""
+        # A row follows the position if it ties on the first j-1 keys and
+        # sorts after it on key j, for some j; resumes.id is the last key.
+        # Positional placeholders are bound once per occurrence, in text order.
+        alternatives: List[List[str]] = []
+        ties: List[Tuple[str, Any]] = []
+        for (column, descending), value in zip(self.sort_keys, values):
+            ref = f'"{column}"'
+            # NULLs sort last, so no row sorts after a NULL on this key
+            if value is not None:
+                conditions = [self._tie_sql(tie, params) for tie in ties]
+                conditions.append(
+                    f'({ref}{"<" if descending else ">"}{self._bind(value, params)} OR {ref} IS NULL)'
+                )
+                alternatives.append(conditions)
+            ties.append((ref, value))
+        conditions = [self._tie_sql(tie, params) for tie in ties]
+        conditions.append(f'"id">{self._bind(last_id, params)}')
+        alternatives.append(conditions)
+        if len(alternatives) == 1:
+            return ' AND '.join(conditions)
+        return '(' + ' OR '.join(
+            conditions[0] if len(conditions) == 1 else f"({' AND '.join(conditions)})"
+            for conditions in alternatives
+        ) + ')'
+
+    def _tie_sql(self, tie: Tuple[str, Any], params: List[Any]) -> str:
+        ref, value = tie
+        if value is None:
+            return f'{ref} IS NULL'
+        return f'{ref}={self._bind(value, params)}'
+
+    def _bind(self, value: Any, params: List[Any]) -> str:
+        params.append(value)
+        return self.param_style.placeholder(len(params))
+
+    def _encode(self, position: Position) -> str:
+        values, last_id = position
+        payload = [self._query_key, [_encode_value(v) for v in values], last_id]
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return token.decode('ascii').rstrip('=')
+
+    def _decode(self, cursor: Optional[str]) -> Optional[Position]:
+        if cursor is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            query_key, values, last_id = payload
+            values = [_decode_value(v) for v in values]
+        except (ValueError, TypeError, IndexError, InvalidOperation):
+            raise ValueError("Invalid pagination cursor")
+        if query_key != self._query_key or len(values) != len(self.sort_keys):
+            raise ValueError("Pagination cursor belongs to a different query")
+        return values, last_id
+
+_stream_names = itertools.count(1)
+
+def server_cursor(connection: Any, name: Optional[str] = None) -> Any:
+    """
+    Open a cursor that leaves the result set on the server: a named cursor
+    on psycopg2 connections, which must be inside a transaction, and a
+    plain cursor on drivers such as sqlite3 whose cursors already step
+    through results on demand.
+    """
+    if name is None:
+        name = f'aql_stream_{next(_stream_names)}'
+    try:
+        return connection.cursor(name=name)
+    except TypeError:
+        return connection.cursor()
+
+def stream_query(
+    connection: Any,
+    query_str: str,
+    batch_size: int = 1000,
+    param_style: ParamStyle = ParamStyle.FORMAT,
+    semi_joins: bool = False,
+    backend: str = 'direct',
+    columns: Optional[Sequence[str]] = None
+) -> Iterator[Row]:
+    """
+    Run an AQL query on a server-side cursor and yield its rows, fetching
+    batch_size rows at a time, so memory stays flat however many resumes
+    match. The cursor is closed when the generator finishes or is closed.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    sql, params = translate_query(
+        query_str, param_style=param_style, semi_joins=semi_joins, backend=backend, columns=columns
+    )
+    cursor = server_cursor(connection)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cursor.close()
@@ -0,0 +1,420 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Hashable, Sequence, Iterator, FrozenSet
+from ..fields import coerce_literal, coerce_query
+from ..instrumentation import QueryTrace, timed, count_nodes
+from ..parser.lexer import TokenType, tokenize, scan, LexerError
+from ..parser.parser import Parser, ParserError, LITERAL_TYPES, convert_literal, convert_limit, set_member_key
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Identifier, Value, SetLiteral, Constant, SortKey,
+    ComparisonOperator, LogicalOperator
+)
+from .query_translator import create_translator
+from .sql_builder import ParamStyle, SetStyle, LARGE_SET_THRESHOLD, is_large_set
+from .sql_codegen import sql_literal
+
+# Templates are compiled with qmark placeholders. With every literal bound
+# as a parameter, placeholders are the only '?' characters in the SQL.
+SLOT_MARKER = ParamStyle.QMARK.placeholder(1)
+
+# Shape element standing for a large set bound as a single parameter
+LARGE_SET_SHAPE = ('large set',)
+
+# Longest query a plan keeps as the example of its shape, for snapshots
+SOURCE_LIMIT = 64 << 10
+
+# Tables read by generated SQL, including those of semi-join subqueries
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN) "(\w+)"')
+
+def referenced_tables(sql: str) -> FrozenSet[str]:
+    """Tables a translated query reads"""
+    return frozenset(_TABLE_REFERENCE.findall(sql))
+
+def fingerprint(query_str: str, large_sets: Optional[SetStyle] = None) -> Tuple[Hashable, List[Any]]:
+    """
+    Split a query string into its shape and its literal values.
+    Queries differing only in literals share the same shape. Literals are
+    coerced to their field's type and repeated set members are dropped,
+    as the translators do. With large_sets, a set
+    above LARGE_SET_THRESHOLD values is one literal in the shape, so sets
+    of any size share a template.
+    Returns: (shape_key, literal_values)
+    """
+    types, starts, ends = scan(query_str)
+    shape: List[Any] = []
+    literals: List[Any] = []
+    # Where the open set starts in shape and literals, and its members so far
+    set_start = literal_start = 0
+    members = None
+    # Field that the next literal is compared with
+    field_name = None
+    for token_type, start, end in zip(types, starts, ends):
+        if token_type in LITERAL_TYPES:
+            value = convert_literal(token_type, query_str[start:end])
+            if shape and shape[-1] == TokenType.LIMIT:
+                # A cached shape skips the parser, so the row count is checked here
+                value = convert_limit(value)
+            else:
+                value = coerce_literal(field_name, value)
+            if members is not None:
+                key = set_member_key(value)
+                if key in members and shape[-1] == TokenType.COMMA and shape[-2] in LITERAL_TYPES:
+                    shape.pop()
+                    continue
+                members.add(key)
+            shape.append(token_type)
+            literals.append(value)
+        elif token_type == TokenType.IDENTIFIER:
+            field_name = query_str[start:end]
+            shape.append(field_name)
+        elif token_type == TokenType.LBRACE:
+            set_start, literal_start = len(shape), len(literals)
+            members = set()
+            shape.append(token_type)
+        elif token_type == TokenType.RBRACE and members is not None:
+            shape.append(token_type)
+            if large_sets is not None and len(members) > LARGE_SET_THRESHOLD and _is_set_shape(shape[set_start:]):
+                literals[literal_start:] = [large_sets.parameter(literals[literal_start:])]
+                shape[set_start:] = [LARGE_SET_SHAPE]
+            members = None
+        else:
+            shape.append(token_type)
+    return tuple(shape), literals
+
+def shape_digest(shape: Hashable) -> str:
+    """Short stable name for a query shape, to group traces of the same query"""
+    return hashlib.blake2b(repr(shape).encode(), digest_size=8).hexdigest()
+
+def _is_set_shape(shape: List[Any]) -> bool:
+    """Whether set tokens are well formed: literals between braces, separated by commas"""
+    inner = shape[1:-1]
+    return (
+        len(inner) % 2 == 1
+        and all(token_type in LITERAL_TYPES for token_type in inner[0::2])
+        and all(token_type == TokenType.COMMA for token_type in inner[1::2])
+    )
+
+# Opcodes of a query skeleton: a postfix program that rebuilds a query's
+# expression, with literals referenced by their slot in the parameters
+_VALUE, _SET, _LARGE_SET, _COMPARE, _CONSTANT, _NOT, _AND, _OR = range(8)
+
+class _Mismatch(Exception):
+    """The literals of a query do not line up with its parameters"""
+
+def query_skeleton(ast: Query, params: List[Any],
+                   large_sets: Optional[SetStyle] = None) -> Optional[tuple]:
+    """
+    Describe a parsed query with its literals replaced by parameter slots,
+    so that every query of its shape can be rebuilt without parsing.
+    The skeleton holds only tuples, strings and numbers. Returns None when
+    the query's literals are not the parameters in order.
+    """
+    next_slot = 0
+
+    def take(value: Any) -> int:
+        nonlocal next_slot
+        if next_slot >= len(params) or set_member_key(params[next_slot]) != set_member_key(value):
+            raise _Mismatch
+        next_slot += 1
+        return next_slot - 1
+
+    program: List[tuple] = []
+    try:
+        # Operands are emitted before their operator, leaves in query order
+        stack: List[Tuple[Node, bool]] = [(ast.expression, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, ComparisonCondition):
+                value = node.value
+                if isinstance(value, SetLiteral):
+                    values = [v.value for v in value.values]
+                    if is_large_set(values, large_sets):
+                        if next_slot >= len(params) or params[next_slot] != large_sets.parameter(values):
+                            raise _Mismatch
+                        next_slot += 1
+                        program.append((_LARGE_SET, next_slot - 1))
+                    else:
+                        program.append((_SET, tuple(take(v) for v in values)))
+                else:
+                    program.append((_VALUE, take(value.value)))
+                program.append((_COMPARE, node.field.name, node.operator.name))
+            elif isinstance(node, Constant):
+                program.append((_CONSTANT, node.value))
+            elif isinstance(node, LogicalExpression):
+                operands = node.operands
+                if expanded:
+                    if node.operator == LogicalOperator.NOT:
+                        program.append((_NOT,))
+                    else:
+                        program.append((_AND if node.operator == LogicalOperator.AND else _OR, len(operands)))
+                else:
+                    stack.append((node, True))
+                    stack.extend((operand, False) for operand in reversed(operands))
+            else:
+                return None
+        limit = take(ast.limit) if ast.limit is not None else None
+    except _Mismatch:
+        return None
+    if next_slot != len(params):
+        return None
+    order_by = tuple((key.field.name, key.descending) for key in ast.order_by)
+    return tuple(program), order_by, limit
+
+def bind_query(skeleton: tuple, params: List[Any], large_sets: Optional[SetStyle] = None) -> Query:
+    """Rebuild a query from its skeleton and the parameters of fingerprint()"""
+    program, order_by, limit = skeleton
+    stack: List[Node] = []
+    for op in program:
+        code = op[0]
+        if code == _VALUE:
+            stack.append(Value(params[op[1]]))
+        elif code == _SET:
+            stack.append(SetLiteral([Value(params[slot]) for slot in op[1]]))
+        elif code == _LARGE_SET:
+            stack.append(SetLiteral([Value(value) for value in large_sets.members(params[op[1]])]))
+        elif code == _COMPARE:
+            stack.append(ComparisonCondition(Identifier(op[1]), ComparisonOperator[op[2]], stack.pop()))
+        elif code == _CONSTANT:
+            stack.append(Constant(op[1]))
+        elif code == _NOT:
+            stack.append(LogicalExpression(LogicalOperator.NOT, stack.pop()))
+        else:
+            operands = stack[-op[1]:]
+            del stack[-op[1]:]
+            stack.append(LogicalExpression.of(LogicalOperator.AND if code == _AND else LogicalOperator.OR, operands))
+    return Query(
+        stack.pop(),
+        [SortKey(Identifier(name), descending) for name, descending in order_by],
+        params[limit] if limit is not None else None
+    )
+
+class CompiledPlan:
+    """
+    SQL template for one query shape, split around its parameter slots,
+    with the skeleton of the parsed query when it could be built
+    """
+    __slots__ = ('fragments', 'ordered', 'skeleton', 'source', 'hits', '_placeholder_sql', '_tables')
+
+    def __init__(self, fragments: Tuple[str, ...], ordered: bool = False,
+                 skeleton: Optional[tuple] = None, source: Optional[str] = None):
+        self.fragments = fragments
+        # Whether the SQL ends in ORDER BY and/or LIMIT clauses
+        self.ordered = ordered
+        self.skeleton = skeleton
+        # A query of the shape, kept unless longer than SOURCE_LIMIT
+        self.source = source
+        # Cache hits, to find the hottest shapes
+        self.hits = 0
+        # Placeholder SQL is fixed per style, so it is rendered once and reused
+        self._placeholder_sql: Dict[ParamStyle, str] = {}
+        self._tables: Optional[FrozenSet[str]] = None
+
+    @property
+    def tables(self) -> FrozenSet[str]:
+        """Tables the SQL reads, for result cache invalidation"""
+        if self._tables is None:
+            self._tables = referenced_tables(''.join(self.fragments))
+        return self._tables
+
+    @property
+    def slot_count(self) -> int:
+        return len(self.fragments) - 1
+
+    def render(self, params: List[Any], param_style: Optional[ParamStyle] = None,
+               first_index: int = 1) -> str:
+        """
+        Bind literal values into the template, or emit placeholders for them.
+        Placeholders are numbered from first_index, for statements that
+        combine several templates.
+        """
+        if len(params) != self.slot_count:
+            raise ValueError(f"Expected {self.slot_count} parameters, got {len(params)}")
+        if param_style is not None:
+            return self.placeholder_sql(param_style, first_index)
+        parts = [self.fragments[0]]
+        for value, fragment in zip(params, self.fragments[1:]):
+            parts.append(sql_literal(value))
+            parts.append(fragment)
+        return ''.join(parts)
+
+    def placeholder_sql(self, param_style: ParamStyle, first_index: int = 1) -> str:
+        """Return the template with a driver placeholder in every slot"""
+        if first_index != 1 and param_style is ParamStyle.DOLLAR:
+            return self._number_placeholders(param_style, first_index)
+        sql = self._placeholder_sql.get(param_style)
+        if sql is None:
+            sql = self._placeholder_sql[param_style] = self._number_placeholders(param_style, 1)
+        return sql
+
+    def _number_placeholders(self, param_style: ParamStyle, first_index: int) -> str:
+        parts = [self.fragments[0]]
+        for index, fragment in enumerate(self.fragments[1:], start=first_index):
+            parts.append(param_style.placeholder(index))
+            parts.append(fragment)
+        return ''.join(parts)
+
+@dataclass(frozen=True)
+class PlanCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class PlanCache:
+    """
+    Bounded LRU cache of compiled SQL templates keyed on query shape.
+    A hit skips parsing and translation and only binds the new literals.
+    With a shared cache (aql.db.shared_cache.SharedPlanCache), local misses
+    are looked up there before compiling, and new plans are added to it.
+    """
+    def __init__(self, maxsize: int = 1024, shared=None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.shared = shared
+        self._plans: 'OrderedDict[Hashable, CompiledPlan]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._translators = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def translate(
+        self,
+        query_str: str,
+        param_style: Optional[ParamStyle] = None,
+        semi_joins: bool = False,
+        backend: str = 'direct',
+        columns: Optional[Sequence[str]] = None,
+        large_sets: Optional[SetStyle] = None,
+        trace: Optional[QueryTrace] = None
+    ) -> Tuple[str, List[Any]]:
+        """Translate an AQL query to SQL, compiling its shape on a cache miss"""
+        plan, params = self.plan(query_str, semi_joins, backend, columns, large_sets, trace)
+        return timed(trace, 'translate', plan.render, params, param_style), params
+
+    def plan(self, query_str: str, semi_joins: bool = False, backend: str = 'direct',
+             columns: Optional[Sequence[str]] = None,
+             large_sets: Optional[SetStyle] = None,
+             trace: Optional[QueryTrace] = None) -> Tuple[CompiledPlan, List[Any]]:
+        """
+        Look up or compile the template for a query's shape, with its literals.
+        Fingerprinting is traced as the lex stage, since it replaces the lexer on a hit.
+        """
+        try:
+            shape, params = timed(trace, 'lex', fingerprint, query_str, large_sets)
+        except (LexerError, ValueError) as e:
+            raise ParserError(str(e))
+        if trace is not None:
+            trace.fingerprint = shape_digest(shape)
+            trace.token_count = len(shape)
+
+        if columns is not None:
+            columns = tuple(columns)
+        key = (backend, semi_joins, columns, large_sets, shape)
+        plan = self.get(key)
+        if plan is None:
+            shared = self.shared
+            if shared is not None:
+                plan = timed(trace, 'translate', shared.load, key)
+            if plan is None:
+                plan = self.compile(query_str, semi_joins, backend, columns, large_sets, trace, params)
+                if shared is not None:
+                    shared.store(key, plan)
+            self.put(key, plan)
+        return plan, params
+
+    def parse(self, query_str: str, large_sets: Optional[SetStyle] = None) -> Query:
+        """Parse a query, rebuilding it from its shape's skeleton when the shape is cached"""
+        plan, params = self.plan(query_str, large_sets=large_sets)
+        if plan.skeleton is None:
+            from ..parser.parser import parse
+            return coerce_query(parse(query_str))
+        return bind_query(plan.skeleton, params, large_sets)
+
+    def compile(self, query_str: str, semi_joins: bool = False, backend: str = 'direct',
+                columns: Optional[Sequence[str]] = None,
+                large_sets: Optional[SetStyle] = None,
+                trace: Optional[QueryTrace] = None,
+                params: Optional[List[Any]] = None) -> CompiledPlan:
+        """
+        Parse and translate a query into a SQL template. Given the query's
+        parameters from fingerprint(), the plan also holds its skeleton.
+        """
+        if columns is not None:
+            columns = tuple(columns)
+        options = (backend, semi_joins, columns, large_sets)
+        translator = self._translators.get(options)
+        if translator is None:
+            translator = create_translator(backend, ParamStyle.QMARK, semi_joins, columns, large_sets)
+            self._translators[options] = translator
+        tokens = timed(trace, 'lex', tokenize, query_str)
+        # Coerced like the fingerprint, so the skeleton has one slot per parameter
+        ast = coerce_query(timed(trace, 'parse', Parser(tokens).parse))
+        template, _ = timed(trace, 'translate', translator.translate, ast)
+        if trace is not None:
+            trace.node_count = count_nodes(ast)
+        ordered = bool(ast.order_by) or ast.limit is not None
+        skeleton = query_skeleton(ast, params, large_sets) if params is not None else None
+        source = query_str if len(query_str) <= SOURCE_LIMIT else None
+        return CompiledPlan(tuple(template.split(SLOT_MARKER)), ordered, skeleton, source)
+
+    def get(self, key: Hashable) -> Optional[CompiledPlan]:
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            plan.hits += 1
+            return plan
+
+    def put(self, key: Hashable, plan: CompiledPlan) -> None:
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+
+    def hottest(self, n: int) -> List[Tuple[Hashable, CompiledPlan]]:
+        """The n cached plans with the most hits, with their keys"""
+        with self._lock:
+            plans = list(self._plans.items())
+        return sorted(plans, key=lambda item: item[1].hits, reverse=True)[:n]
+
+    def clear(self) -> None:
+        """Drop all plans and reset the counters"""
+        with self._lock:
+            self._plans.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> PlanCacheStats:
+        with self._lock:
+            return PlanCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                size=len(self._plans),
+                maxsize=self.maxsize
+            )
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+_default_cache = PlanCache()
+
+def get_plan_cache() -> PlanCache:
+    """Return the process-wide plan cache used by translate_query"""
+    return _default_cache
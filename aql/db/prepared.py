@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Any, Tuple, Optional
+from .sql_builder import ParamStyle
+from .query_translator import translate_query
+
+@dataclass(frozen=True)
+class PreparedStatement:
+    """A server-side prepared statement for one parameterized SQL text"""
+    name: str
+    sql: str
+    param_count: int
+
+    def prepare_sql(self) -> str:
+        return f"PREPARE {self.name} AS {self.sql}"
+
+    def execute_sql(self, param_style: ParamStyle = ParamStyle.FORMAT) -> str:
+        """EXECUTE statement whose arguments are bound by the client driver"""
+        if not self.param_count:
+            return f"EXECUTE {self.name}"
+        args = ', '.join(param_style.placeholder(i) for i in range(1, self.param_count + 1))
+        return f"EXECUTE {self.name}({args})"
+
+    def deallocate_sql(self) -> str:
+        return f"DEALLOCATE {self.name}"
+
+class PreparedStatementRegistry:
+    """
+    Maps parameterized SQL text ($1, $2, ... placeholders) to PostgreSQL
+    prepared statements so repeated query shapes run as EXECUTE on a
+    prepared plan. Prepared statements live in a database session, so
+    keep one registry per connection.
+    """
+    def __init__(self, maxsize: int = 256, prefix: str = 'aql_'):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.prefix = prefix
+        self._statements: 'OrderedDict[str, PreparedStatement]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def prepare(self, sql: str, param_count: int) -> Tuple[PreparedStatement, List[str]]:
+        """
+        Look up the prepared statement for a SQL text, registering it if new.
+        Returns: (statement, setup_statements) where setup_statements holds any
+        DEALLOCATE/PREPARE commands to run on the connection before EXECUTE.
+        """
+        with self._lock:
+            statement = self._statements.get(sql)
+            if statement is not None:
+                self._statements.move_to_end(sql)
+                return statement, []
+
+            setup = []
+            while len(self._statements) >= self.maxsize:
+                _, evicted = self._statements.popitem(last=False)
+                setup.append(evicted.deallocate_sql())
+
+            self._counter += 1
+            statement = PreparedStatement(f"{self.prefix}{self._counter}", sql, param_count)
+            self._statements[sql] = statement
+            setup.append(statement.prepare_sql())
+            return statement, setup
+
+    def prepare_query(self, query_str: str) -> Tuple[PreparedStatement, List[str], List[Any]]:
+        """
+        Translate an AQL query into $n placeholder SQL and prepare it.
+        Returns: (statement, setup_statements, parameters)
+        """
+        sql, params = translate_query(query_str, param_style=ParamStyle.DOLLAR)
+        statement, setup = self.prepare(sql, len(params))
+        return statement, setup, params
+
+    def execute(self, cursor: Any, query_str: str, param_style: ParamStyle = ParamStyle.FORMAT) -> None:
+        """Run an AQL query on a DB-API cursor through its prepared statement"""
+        statement, setup, params = self.prepare_query(query_str)
+        for command in setup:
+            cursor.execute(command)
+        cursor.execute(statement.execute_sql(param_style), params)
+
+    def get(self, sql: str) -> Optional[PreparedStatement]:
+        return self._statements.get(sql)
+
+    def clear(self) -> List[str]:
+        """Forget all statements and return the DEALLOCATE commands for them"""
+        with self._lock:
+            commands = [statement.deallocate_sql() for statement in self._statements.values()]
+            self._statements.clear()
+            return commands
+
+    def __len__(self) -> int:
+        return len(self._statements)
@@ -1,13 +1,47 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Sequence
+from pypika.terms import Parameter
 from ..parser.ast import (
     Node, Query, LogicalExpression, ComparisonCondition,
-    Identifier, Value, SetLiteral,
+    Identifier, Value, SetLiteral, Constant,
     ComparisonOperator, LogicalOperator
 )
-from .sql_builder import AQLQueryBuilder, Operators
+from ..fields import coerce_query, coerce_value
+from ..instrumentation import start_trace, timed, count_nodes
+from .sql_builder import AQLQueryBuilder, Operators, ParamStyle, SetStyle, check_projection, is_large_set
+
+# pypika builds and renders criteria recursively, so deeper criterion trees
+# would exceed Python's recursion limit; the direct backend has no limit
+PYPIKA_MAX_DEPTH = 200
+
+def criterion_depth(root: Node) -> int:
+    """
+    Depth of the criterion tree the pypika backend builds for an expression:
+    one level per NOT, and log2 of the operand count per AND/OR, whose
+    operands are joined pairwise
+    """
+    deepest = 0
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if isinstance(node, LogicalExpression):
+            operands = node.operands
+            depth += max(len(operands) - 1, 1).bit_length()
+            stack.extend((operand, depth) for operand in operands)
+    return deepest
 
 class QueryTranslator:
-    def __init__(self):
+    def __init__(self, param_style: Optional[ParamStyle] = None, semi_joins: bool = False,
+                 columns: Optional[Sequence[str]] = None, large_sets: Optional[SetStyle] = None):
+        # Literals are inlined into the SQL unless a placeholder style is given
+        self.param_style = param_style
+        # Compile SKILLS/EDUCATION predicates into EXISTS subqueries, one per predicate
+        self.semi_joins = semi_joins
+        # Resumes columns to select instead of all of them
+        self.columns = check_projection(columns) if columns is not None else None
+        # Bind IN sets above LARGE_SET_THRESHOLD as one parameter in this style
+        self.large_sets = large_sets
+        
         # Mapping of AQL operators to SQL operator functions
         self.operator_mappings = {
             ComparisonOperator.EQUALS: Operators.equals,
@@ -24,13 +58,23 @@ class QueryTranslator:
         Translate an AQL AST into a SQL query with parameters
         Returns: (query_string, parameters)
         """
+        if criterion_depth(ast.expression) > PYPIKA_MAX_DEPTH:
+            raise ValueError(
+                f"Query is nested too deeply for the pypika backend (over {PYPIKA_MAX_DEPTH} levels); "
+                "use the direct backend"
+            )
         params: List[Any] = []
-        builder = AQLQueryBuilder()
+        builder = AQLQueryBuilder(semi_joins=self.semi_joins, columns=self.columns)
         
         # Translate the expression and add it to the builder
         criterion = self._translate_node(ast.expression, builder, params)
         builder.add_where(criterion)
         
+        for key in ast.order_by:
+            builder.add_order_by(builder.get_sort_field(key.field.name), key.descending)
+        if ast.limit is not None:
+            builder.set_limit(self._bind(ast.limit, params))
+        
         return builder.build(), params
     
     def _translate_node(self, node: Node, builder: AQLQueryBuilder, params: List[Any]):
@@ -39,6 +83,8 @@ class QueryTranslator:
             return self._translate_logical_expression(node, builder, params)
         elif isinstance(node, ComparisonCondition):
             return self._translate_comparison(node, builder, params)
+        elif isinstance(node, Constant):
+            return Operators.constant(node.value)
         else:
             raise ValueError(f"Unexpected node type: {type(node)}")
     
@@ -48,19 +94,26 @@ class QueryTranslator:
             right_criterion = self._translate_node(expr.left, builder, params)
             return ~right_criterion
         
-        left_criterion = self._translate_node(expr.left, builder, params)
-        right_criterion = self._translate_node(expr.right, builder, params)
-        
-        if expr.operator == LogicalOperator.AND:
-            return left_criterion & right_criterion
-        else:  # OR
-            return left_criterion | right_criterion
+        criteria = [self._translate_node(operand, builder, params) for operand in expr.operands]
+        # Joined pairwise, so a long chain is log2(n) deep rather than n;
+        # pypika only brackets mixed AND/OR, so the SQL is the same either way
+        while len(criteria) > 1:
+            paired = []
+            for left, right in zip(criteria[::2], criteria[1::2]):
+                if expr.operator == LogicalOperator.AND:
+                    paired.append(left & right)
+                else:  # OR
+                    paired.append(left | right)
+            if len(criteria) % 2:
+                paired.append(criteria[-1])
+            criteria = paired
+        return criteria[0]
     
     def _translate_comparison(self, condition: ComparisonCondition, builder: AQLQueryBuilder, params: List[Any]):
         """Translate a comparison condition to SQL"""
         field = builder.get_field(condition.field.name)
         operator = condition.operator
-        value = condition.value
+        value = coerce_value(condition.field.name, condition.value)
         
         if operator not in self.operator_mappings:
             raise ValueError(f"Unknown operator: {operator}")
@@ -69,22 +122,100 @@ class QueryTranslator:
         
         # Handle values
         if isinstance(value, Value):
-            params.append(value.value)
-            return operator_func(field, params[-1])
+            criterion = operator_func(field, self._bind(value.value, params))
+        elif isinstance(value, SetLiteral) and is_large_set(value.values, self.large_sets):
+            term = self._bind(self.large_sets.parameter([v.value for v in value.values]), params)
+            criterion = Operators.large_set(field, term, self.large_sets, condition.field.name)
         elif isinstance(value, SetLiteral):
-            values = [v.value for v in value.values]
-            params.extend(values)
-            return operator_func(field, values)
+            values = [self._bind(v.value, params) for v in value.values]
+            criterion = operator_func(field, values)
         else:
             raise ValueError(f"Unexpected value type: {type(value)}")
-
-def translate_query(query_str: str) -> Tuple[str, List[Any]]:
-    """Helper function to parse and translate an AQL query to SQL"""
-    from ..parser.parser import parse
+        
+        if builder.semi_joins and builder.is_multi_valued(condition.field.name):
+            return builder.semi_join(condition.field.name, criterion)
+        return criterion
     
-    ast = parse(query_str)
-    translator = QueryTranslator()
-    return translator.translate(ast)
+    def _bind(self, value: Any, params: List[Any]) -> Any:
+        """Record a literal as a parameter and return the term to embed in the SQL"""
+        params.append(value)
+        if self.param_style is None:
+            return value
+        return Parameter(self.param_style.placeholder(len(params)))
+
+# Translation backends: 'direct' writes SQL text in one AST walk,
+# 'pypika' builds the query through pypika and is the reference
+BACKENDS = ('direct', 'pypika')
+
+def create_translator(
+    backend: str = 'direct',
+    param_style: Optional[ParamStyle] = None,
+    semi_joins: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    large_sets: Optional[SetStyle] = None
+):
+    """Create a translator for the given backend"""
+    if backend == 'direct':
+        from .sql_codegen import SQLGenerator
+        return SQLGenerator(param_style, semi_joins, columns, large_sets)
+    if backend == 'pypika':
+        return QueryTranslator(param_style, semi_joins, columns, large_sets)
+    raise ValueError(f"Unknown backend: {backend}")
+
+def translate_query(
+    query_str: str,
+    use_cache: bool = True,
+    param_style: Optional[ParamStyle] = None,
+    semi_joins: bool = False,
+    backend: str = 'direct',
+    optimize: bool = False,
+    columns: Optional[Sequence[str]] = None,
+    large_sets: Optional[SetStyle] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Helper function to parse and translate an AQL query to SQL.
+    Queries are served from the shared plan cache unless use_cache is False.
+    With a param_style the SQL contains placeholders instead of inlined literals.
+    With semi_joins, SKILLS/EDUCATION predicates become EXISTS subqueries.
+    With optimize, the AST is rewritten by aql.optimizer first. Its rewrites
+    depend on literal values, so optimized queries bypass the plan cache.
+    With columns, only those resumes columns are selected.
+    With large_sets, IN sets above LARGE_SET_THRESHOLD values bind as one
+    parameter, so their SQL no longer grows with the set.
+    """
+    trace = start_trace(query_str)
+    if use_cache and not optimize:
+        from .plan_cache import get_plan_cache
+        sql, params = get_plan_cache().translate(
+            query_str, param_style, semi_joins, backend, columns, large_sets, trace
+        )
+    else:
+        from ..parser.lexer import tokenize, LexerError
+        from ..parser.parser import Parser, ParserError
+        
+        try:
+            tokens = timed(trace, 'lex', tokenize, query_str)
+        except LexerError as e:
+            raise ParserError(str(e))
+        ast = timed(trace, 'parse', Parser(tokens).parse)
+        try:
+            ast = coerce_query(ast)
+        except ValueError as e:
+            raise ParserError(str(e))
+        if optimize:
+            from ..optimizer import QueryOptimizer
+            ast = timed(trace, 'optimize', QueryOptimizer().optimize, ast)
+        translator = create_translator(backend, param_style, semi_joins, columns, large_sets)
+        sql, params = timed(trace, 'translate', translator.translate, ast)
+        if trace is not None:
+            from .plan_cache import fingerprint, shape_digest
+            trace.fingerprint = shape_digest(fingerprint(query_str, large_sets)[0])
+            trace.token_count = len(tokens)
+            trace.node_count = count_nodes(ast)
+    if trace is not None:
+        trace.set_sql(sql)
+        trace.finish()
+    return sql, params
 
 if __name__ == "__main__":
     # Test the translator with some sample queries
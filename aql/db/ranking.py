@@ -0,0 +1,144 @@
+from typing import List, Any, Tuple, Optional, Sequence, Union
+from ..parser.ast import Query, ComparisonCondition, Value, SetLiteral, ComparisonOperator
+from ..scoring import ScoreSpec, Closeness, score_terms
+from .facets import HITS_CTE
+from .query_translator import create_translator
+from .sql_builder import ParamStyle, check_projection
+from .sql_codegen import FIELD_COLUMNS, COMPARISON_SQL, sql_literal
+
+# Column holding the relevance score, after the resume columns
+SCORE_COLUMN = 'aql_score'
+
+# Correlated subqueries counting a resume's values that satisfy a condition
+VALUE_COUNTS = {
+    'SKILLS': (
+        '(SELECT COUNT(DISTINCT "skills"."name") FROM "resume_skills"'
+        ' JOIN "skills" ON "resume_skills"."skill_id"="skills"."id"'
+        f' WHERE "resume_skills"."resume_id"="{HITS_CTE}"."id" AND ',
+        ')'
+    ),
+    'EDUCATION': (
+        '(SELECT COUNT(DISTINCT "education"."degree") FROM "education"'
+        f' WHERE "education"."resume_id"="{HITS_CTE}"."id" AND ',
+        ')'
+    ),
+}
+
+class _ScoreWriter:
+    """Writes the score expression, binding literals in text order"""
+    def __init__(self, param_style: Optional[ParamStyle], params: List[Any]):
+        self.param_style = param_style
+        self.params = params
+
+    def bind(self, value: Any) -> str:
+        self.params.append(value)
+        if self.param_style is None:
+            return sql_literal(value)
+        return self.param_style.placeholder(len(self.params))
+
+    def bind_score(self, value: float) -> str:
+        """
+        Bind a weight, target or scale as a float. Drivers that prepare
+        statements server-side, such as asyncpg, would otherwise type the
+        parameter from its integer operand and truncate or reject it.
+        """
+        return f'CAST({self.bind(float(value))} AS double precision)'
+
+    def condition(self, condition: ComparisonCondition, weight: float) -> Optional[str]:
+        name = condition.field.name
+        table, column = FIELD_COLUMNS[name]
+        value = condition.value
+        if condition.operator == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            if not value.values:
+                # An empty set matches nothing, and IN () is not valid SQL
+                return None
+        elif not isinstance(value, Value):
+            raise ValueError(f"Unexpected value type: {type(value)}")
+
+        if name in VALUE_COUNTS:
+            head, tail = VALUE_COUNTS[name]
+            weight_sql = self.bind_score(weight)
+            return f'{weight_sql}*{head}{self._comparison(table, column, condition)}{tail}'
+        test = self._comparison(HITS_CTE, column, condition)
+        return f'CASE WHEN {test} THEN {self.bind_score(weight)} ELSE 0.0 END'
+
+    def closeness(self, closeness: Closeness) -> str:
+        _, column = FIELD_COLUMNS[closeness.field]
+        ref = f'"{HITS_CTE}"."{column}"'
+        # NULLs make the CASE NULL, which scores zero
+        return (
+            f'COALESCE(CASE WHEN ABS({ref}-{self.bind_score(closeness.target)})>={self.bind_score(closeness.scale)}'
+            f' THEN 0.0 ELSE {self.bind_score(closeness.weight)}*(1.0-ABS({ref}-{self.bind_score(closeness.target)})'
+            f'/{self.bind_score(closeness.scale)}) END,0.0)'
+        )
+
+    def _comparison(self, table: str, column: str, condition: ComparisonCondition) -> str:
+        ref = f'"{table}"."{column}"'
+        if condition.operator == ComparisonOperator.IN:
+            return f"{ref} IN ({','.join(self.bind(v.value) for v in condition.value.values)})"
+        return f'{ref}{COMPARISON_SQL[condition.operator]}{self.bind(condition.value.value)}'
+
+def translate_top_k(
+    query: Union[str, Query],
+    k: int,
+    spec: Optional[ScoreSpec] = None,
+    param_style: Optional[ParamStyle] = None,
+    backend: str = 'direct',
+    columns: Optional[Sequence[str]] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Translate an AQL query into SQL returning its k best matches under a
+    ScoreSpec: the resume columns (or the projection) followed by the score
+    in an aql_score column, by decreasing score and then increasing id.
+    The database keeps only the best k rows while sorting. ORDER BY and
+    LIMIT of the query itself are ignored.
+    Returns: (query_string, parameters)
+    """
+    if k <= 0:
+        raise ValueError("k must be positive")
+    if isinstance(query, str):
+        from ..parser.parser import parse
+        query = parse(query)
+    spec = spec or ScoreSpec()
+    terms = score_terms(query.expression, spec)
+
+    hits_columns = None
+    if columns is not None:
+        columns = check_projection(columns)
+        # The CTE also carries the id and the columns the score reads
+        needed = ['id'] + [FIELD_COLUMNS[condition.field.name][1] for condition, _ in terms
+                           if condition.field.name not in VALUE_COUNTS]
+        needed += [FIELD_COLUMNS[closeness.field][1] for closeness in spec.closeness]
+        hits_columns = list(dict.fromkeys([*columns, *needed]))
+    translator = create_translator(backend, param_style, True, hits_columns)
+    hits_sql, params = translator.translate(Query(query.expression))
+
+    writer = _ScoreWriter(param_style, params)
+    parts = [writer.condition(condition, weight) for condition, weight in terms]
+    parts += [writer.closeness(closeness) for closeness in spec.closeness]
+    score = '+'.join(part for part in parts if part is not None) or '0.0'
+
+    if columns is None:
+        select_list = f'"{HITS_CTE}".*'
+    else:
+        select_list = ','.join(f'"{HITS_CTE}"."{column}"' for column in columns)
+    return (
+        f'WITH "{HITS_CTE}" AS ({hits_sql}) SELECT {select_list},{score} AS "{SCORE_COLUMN}"'
+        f' FROM "{HITS_CTE}" ORDER BY "{SCORE_COLUMN}" DESC,"{HITS_CTE}"."id" LIMIT {writer.bind(k)}'
+    ), params
+
+def execute_top_k(
+    cursor: Any,
+    query: Union[str, Query],
+    k: int,
+    spec: Optional[ScoreSpec] = None,
+    param_style: ParamStyle = ParamStyle.FORMAT,
+    backend: str = 'direct',
+    columns: Optional[Sequence[str]] = None
+) -> List[Tuple[Any, ...]]:
+    """Run a top-k query on a DB-API cursor; each row ends with its score"""
+    sql, params = translate_top_k(query, k, spec, param_style, backend, columns)
+    cursor.execute(sql, params)
+    return [tuple(row) for row in cursor.fetchall()]
@@ -0,0 +1,210 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Callable, Hashable, Iterable, Mapping
+
+Row = Tuple[Any, ...]
+
+DEFAULT_MAX_BYTES = 64 << 20
+DEFAULT_TTL = 300.0
+
+# Reads the versions maintained by the triggers of schema.sql
+VERSIONS_SQL = "SELECT table_name, version FROM aql_table_versions"
+
+class TableVersions:
+    """
+    Write version of each table, as seen by this process. Versions only
+    grow: a change observed in aql_table_versions bumps the local version,
+    so explicit bumps and database versions can be mixed.
+    """
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        # Last version read from the database, per table
+        self._observed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *tables: str) -> None:
+        """Record a write to the tables"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def observe(self, database_versions: Mapping[str, int]) -> None:
+        """Bump the tables whose database version changed since last observed"""
+        with self._lock:
+            for table, version in database_versions.items():
+                if self._observed.get(table) != version:
+                    self._observed[table] = version
+                    self._versions[table] = self._versions.get(table, 0) + 1
+
+    def current(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Versions of the tables, in the order given"""
+        versions = self._versions
+        return tuple(versions.get(table, 0) for table in tables)
+
+def read_table_versions(connection: Any) -> Dict[str, int]:
+    """Versions from the aql_table_versions table, on a DB-API connection"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(VERSIONS_SQL)
+        return {table: version for table, version in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def estimate_size(rows: List[Row]) -> int:
+    """Approximate bytes held by a result: the list, its tuples and their values"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+def _freeze(params: List[Any]) -> Tuple[Hashable, ...]:
+    # Set members are bound as lists
+    return tuple(tuple(value) if isinstance(value, list) else value for value in params)
+
+@dataclass(frozen=True)
+class ResultCacheStats:
+    hits: int
+    misses: int
+    # Entries dropped because a table they read was written
+    invalidations: int
+    expirations: int
+    # Entries dropped to stay within max_bytes
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class _Entry:
+    __slots__ = ('rows', 'tables', 'versions', 'expires', 'size')
+
+    def __init__(self, rows: List[Row], tables: Tuple[str, ...], versions: Tuple[int, ...],
+                 expires: float, size: int):
+        self.rows = rows
+        self.tables = tables
+        self.versions = versions
+        self.expires = expires
+        self.size = size
+
+class ResultCache:
+    """
+    Cache of query results in front of execution, keyed by translated SQL
+    and bound parameters. Entries are bounded by max_bytes, evicted least
+    recently used first, and expire after ttl seconds. Results larger than
+    max_entry_bytes, a quarter of the cache by default, are not stored.
+
+    Each entry remembers the versions of the tables its SQL reads, as they
+    were before the query ran. A write to one of those tables bumps its
+    version, and the entry is dropped on its next lookup while results
+    over other tables stay cached.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: Optional[float] = DEFAULT_TTL,
+                 versions: Optional[TableVersions] = None, max_entry_bytes: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self.ttl = ttl
+        self.versions = versions or TableVersions()
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def lookup(self, sql: str, params: List[Any],
+               tables: Iterable[str]) -> Tuple[Optional[List[Row]], Tuple[int, ...]]:
+        """
+        Cached rows of a query, or None, with the current versions of the
+        tables it reads. On a miss, pass those versions to put once the
+        query has run: a write made while it ran then invalidates the result.
+        """
+        tables = tuple(sorted(tables))
+        versions = self.versions.current(tables)
+        key = (sql, _freeze(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.versions != versions:
+                    self.invalidations += 1
+                    self._remove(key)
+                elif entry.expires <= self.clock():
+                    self.expirations += 1
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.rows, versions
+            self.misses += 1
+            return None, versions
+
+    def put(self, sql: str, params: List[Any], tables: Iterable[str],
+            versions: Tuple[int, ...], rows: List[Row]) -> bool:
+        """Store a result read at the given table versions; False if it is too large"""
+        tables = tuple(sorted(tables))
+        size = estimate_size(rows) + sys.getsizeof(sql)
+        if size > self.max_entry_bytes:
+            return False
+        expires = self.clock() + self.ttl if self.ttl is not None else float('inf')
+        key = (sql, _freeze(params))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(rows, tables, versions, expires, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        Bump the versions of tables written by this process and drop the
+        entries reading them now, rather than on their next lookup.
+        Returns the number of entries dropped.
+        """
+        self.versions.bump(*tables)
+        written = set(tables)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if written.intersection(entry.tables)]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def _remove(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> ResultCacheStats:
+        return ResultCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            invalidations=self.invalidations,
+            expirations=self.expirations,
+            evictions=self.evictions,
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_bytes=self.max_bytes
+        )
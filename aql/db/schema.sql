@@ -101,4 +101,44 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_resumes_updated_at
     BEFORE UPDATE ON resumes
     FOR EACH ROW
-    EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+    EXECUTE FUNCTION update_updated_at_column(); 
+
+-- Result cache invalidation
+
+-- Write version of each table that AQL queries read. The result cache
+-- compares versions to drop cached results of tables that have changed.
+CREATE TABLE aql_table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Create a function to bump the write version of the table a statement changed
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO aql_table_versions (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = aql_table_versions.version + 1;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Create triggers to bump the versions of the tables AQL queries read
+CREATE TRIGGER bump_resumes_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON resumes
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER bump_skills_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON skills
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER bump_resume_skills_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON resume_skills
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER bump_education_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON education
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,289 @@
+import fcntl
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Hashable, Optional, Tuple
+from ..parser.parser import ParserError
+from .plan_cache import CompiledPlan, PlanCache, get_plan_cache
+from .sql_builder import SetStyle
+
+# The file is an open-addressing hash table over an append-only data area:
+#   header   MAGIC, slot count, entry count, data start, bytes used, code tag
+#   slots    (key hash, record offset, record length), 16 bytes each
+#   data     records: key length, payload length, CRC-32, key, payload
+MAGIC = b'AQLPLAN1'
+HEADER = struct.Struct('<8sIIQQ32s')
+SLOT = struct.Struct('<QII')
+RECORD = struct.Struct('<III')
+# Header fields a writer updates, and the two halves of a slot
+_ENTRIES = struct.Struct('<I')
+_ENTRIES_OFFSET = 12
+_USED = struct.Struct('<Q')
+_USED_OFFSET = 24
+_SLOT_HASH = struct.Struct('<Q')
+_SLOT_LOCATION = struct.Struct('<II')
+
+DEFAULT_SIZE = 64 << 20
+# Record offsets and lengths are 32-bit
+MAX_SIZE = (1 << 32) - 1
+# Fraction of slots that may be filled before stores are refused
+MAX_LOAD = 0.75
+
+def code_tag() -> bytes:
+    """
+    Digest of the aql sources, schema.sql, the Python version and the
+    marshal format. Plans compiled by other code may be stale, and another
+    interpreter may not read them: keys include the tag, and a file
+    written under another tag is reset on open.
+    """
+    root = Path(__file__).resolve().parent.parent
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(repr((sys.version_info[:2], marshal.version)).encode())
+    for path in sorted(root.rglob('*.py')) + [root / 'db' / 'schema.sql']:
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.digest()
+
+def plan_key(key: Hashable) -> bytes:
+    """Bytes of a PlanCache key, the same in every process running the same code"""
+    backend, semi_joins, columns, large_sets, shape = key
+    # Token types by number, so that no identifier can stand for one
+    shape = tuple(element.value if hasattr(element, 'value') else element for element in shape)
+    options = (backend, semi_joins, columns, large_sets.value if large_sets is not None else None)
+    return repr((options, shape)).encode()
+
+def encode_plan(plan: CompiledPlan) -> bytes:
+    """Serialize a plan: its SQL fragments, query skeleton and example query"""
+    try:
+        return marshal.dumps((plan.fragments, plan.ordered, plan.skeleton, plan.source))
+    except ValueError:
+        # Nested beyond what marshal writes; the skeleton is the only deep part
+        return marshal.dumps((plan.fragments, plan.ordered, None, plan.source))
+
+def decode_plan(payload: bytes) -> CompiledPlan:
+    fragments, ordered, skeleton, source = marshal.loads(payload)
+    return CompiledPlan(fragments, ordered, skeleton, source)
+
+def _hash(key: bytes) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+@dataclass(frozen=True)
+class SharedCacheStats:
+    """Lookups by this process, and the fill of the shared file"""
+    hits: int
+    misses: int
+    stores: int
+    rejected: int
+    entries: int
+    slots: int
+    bytes_used: int
+    size: int
+
+class SharedPlanCache:
+    """
+    Memory-mapped table of compiled plans keyed by PlanCache key, shared by
+    every process on a host so that a pool of workers compiles each query
+    shape once. Attach it to a PlanCache, e.g.
+    get_plan_cache().shared = SharedPlanCache(path), before forking workers
+    or in each worker. Once the file is full, new plans stay in the local
+    caches only.
+
+    Records are never modified or freed, and a slot is filled once, its
+    hash written last. Readers therefore take no lock: they accept a record
+    only if its key and checksum match, so a slot caught mid-write reads as
+    a miss. Writers serialize on a lock of the file.
+    """
+    def __init__(self, path: str, size: int = DEFAULT_SIZE, slots: Optional[int] = None,
+                 tag: Optional[bytes] = None):
+        self.path = path
+        self.tag = (code_tag() if tag is None else tag).ljust(32, b'\0')[:32]
+        # Writers in this process take the thread lock, then the file lock
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                self._open(size, slots)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+
+    def _open(self, size: int, slots: Optional[int]) -> None:
+        existing = os.fstat(self._fd).st_size
+        if size > MAX_SIZE:
+            raise ValueError(f"size must not exceed {MAX_SIZE} bytes")
+        if existing >= HEADER.size:
+            # An existing table keeps its size, which other processes have mapped
+            size = existing
+        else:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        magic, slot_count, _, data_start, _, tag = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or tag != self.tag:
+            if slots is None:
+                # About one slot per KiB of file, a power of two for masking
+                slots = 1 << max(size // 1024 - 1, 1).bit_length()
+            slot_count = slots
+            data_start = HEADER.size + slot_count * SLOT.size
+            if data_start >= size or slot_count & (slot_count - 1):
+                raise ValueError("slots must be a power of two and fit in the file")
+            self._map[HEADER.size:data_start] = bytes(data_start - HEADER.size)
+            # The magic goes in last, once the slots are cleared
+            HEADER.pack_into(self._map, 0, b'\0' * 8, slot_count, 0, data_start, data_start, self.tag)
+            self._map[0:8] = MAGIC
+        self.size = size
+        self.slot_count = slot_count
+        self._mask = slot_count - 1
+        self._data_start = data_start
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Payload stored under key, read without taking a lock"""
+        shared = self._map
+        wanted = _hash(key)
+        index = wanted & self._mask
+        for _ in range(self.slot_count):
+            slot_hash, offset, length = SLOT.unpack_from(shared, HEADER.size + index * SLOT.size)
+            if slot_hash == 0:
+                break
+            if slot_hash == wanted and offset:
+                record = shared[offset:offset + length]
+                if len(record) >= RECORD.size:
+                    key_length, payload_length, checksum = RECORD.unpack_from(record)
+                    body = record[RECORD.size:]
+                    if (len(body) == key_length + payload_length and zlib.crc32(body) == checksum
+                            and body[:key_length] == key):
+                        self.hits += 1
+                        return body[key_length:]
+            index = (index + 1) & self._mask
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, payload: bytes) -> bool:
+        """Store a payload unless the key is present; False if the table is full"""
+        body = key + payload
+        record = RECORD.pack(len(key), len(payload), zlib.crc32(body)) + body
+        wanted = _hash(key)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                shared = self._map
+                _, _, entries, _, used, _ = HEADER.unpack_from(shared, 0)
+                if entries >= self.slot_count * MAX_LOAD or used + len(record) > self.size:
+                    self.rejected += 1
+                    return False
+                index = wanted & self._mask
+                while True:
+                    position = HEADER.size + index * SLOT.size
+                    slot_hash, offset, length = SLOT.unpack_from(shared, position)
+                    if slot_hash == 0:
+                        break
+                    if slot_hash == wanted and shared[offset + RECORD.size:offset + RECORD.size + len(key)] == key:
+                        return True
+                    index = (index + 1) & self._mask
+                # Record, then its location, then the hash that publishes it
+                shared[used:used + len(record)] = record
+                _ENTRIES.pack_into(shared, _ENTRIES_OFFSET, entries + 1)
+                _USED.pack_into(shared, _USED_OFFSET, used + len(record))
+                _SLOT_LOCATION.pack_into(shared, position + _SLOT_HASH.size, used, len(record))
+                _SLOT_HASH.pack_into(shared, position, wanted)
+                self.stores += 1
+                return True
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def load(self, key: Hashable) -> Optional[CompiledPlan]:
+        """The plan stored under a PlanCache key by the same code, if any"""
+        payload = self.get(self.tag + plan_key(key))
+        if payload is None:
+            return None
+        try:
+            return decode_plan(payload)
+        except (ValueError, EOFError, TypeError):
+            # Intact but unreadable, e.g. written by another build; counted as a miss
+            self.hits -= 1
+            self.misses += 1
+            return None
+
+    def store(self, key: Hashable, plan: CompiledPlan) -> bool:
+        return self.put(self.tag + plan_key(key), encode_plan(plan))
+
+    def warm(self, snapshot_path: str) -> int:
+        """
+        Compile the shapes of a snapshot written by save_snapshot into the
+        table, skipping those already stored. Snapshots hold example queries
+        rather than plans, so they stay valid across code changes. Returns
+        the number of shapes now available.
+        """
+        cache = PlanCache(shared=self)
+        warmed = 0
+        with open(snapshot_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                large_sets = SetStyle(entry['large_sets']) if entry['large_sets'] else None
+                try:
+                    cache.plan(entry['query'], entry['semi_joins'], entry['backend'], entry['columns'], large_sets)
+                except (ValueError, ParserError):
+                    # No longer valid, e.g. a field that was removed
+                    continue
+                warmed += 1
+        return warmed
+
+    def stats(self) -> SharedCacheStats:
+        _, slot_count, entries, _, used, _ = HEADER.unpack_from(self._map, 0)
+        return SharedCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            stores=self.stores,
+            rejected=self.rejected,
+            entries=entries,
+            slots=slot_count,
+            bytes_used=used,
+            size=self.size
+        )
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def __enter__(self) -> 'SharedPlanCache':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+def save_snapshot(path: str, cache: Optional[PlanCache] = None, limit: int = 1000) -> int:
+    """
+    Write the example queries of a plan cache's hottest shapes, one JSON
+    object per line, for SharedPlanCache.warm. Returns the number written.
+    """
+    cache = cache or get_plan_cache()
+    written = 0
+    with open(path, 'w') as f:
+        for (backend, semi_joins, columns, large_sets, _), plan in cache.hottest(limit):
+            if plan.source is None:
+                continue
+            f.write(json.dumps({
+                'backend': backend,
+                'semi_joins': semi_joins,
+                'columns': list(columns) if columns is not None else None,
+                'large_sets': large_sets.value if large_sets is not None else None,
+                'query': plan.source,
+                'hits': plan.hits,
+            }) + '\n')
+            written += 1
+    return written
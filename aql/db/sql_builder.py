@@ -1,10 +1,76 @@
-from typing import List, Any, Optional, Union
+import json
+from enum import Enum
+from typing import List, Any, Optional, Union, Sequence, Tuple
 from pypika import Query, Table, Field, Order, JoinType
 from pypika.queries import QueryBuilder
-from pypika.terms import Criterion, Function, ValueWrapper
+from pypika.terms import Criterion, ExistsCriterion, Function, ValueWrapper, Term
+from ..fields import FIELDS, SCHEMA, MULTI_VALUED_FIELDS, get_field_spec
+
+class ParamStyle(Enum):
+    """Placeholder syntax for bound parameters, selected per database driver"""
+    DOLLAR = '$'    # PostgreSQL PREPARE / asyncpg: $1, $2, ...
+    FORMAT = '%s'   # psycopg2, pymysql: %s
+    QMARK = '?'     # sqlite3: ?
+    
+    def placeholder(self, index: int) -> str:
+        """Return the placeholder for the 1-based parameter index"""
+        if self is ParamStyle.DOLLAR:
+            return f"${index}"
+        return self.value
+
+# IN sets with more distinct values than this are bound as a single
+# parameter when a SetStyle is given, instead of one parameter per value
+LARGE_SET_THRESHOLD = 32
+
+class SetStyle(Enum):
+    """How a large IN set is bound, selected per database"""
+    ARRAY = 'array'  # PostgreSQL: "col"=ANY($1::text[]) with a list parameter
+    JSON = 'json'    # SQLite: "col" IN (SELECT "value" FROM json_each(?)) with a JSON array parameter
+    
+    def parameter(self, values: Sequence[Any]) -> Any:
+        """The single parameter holding a set's values"""
+        if self is SetStyle.JSON:
+            return json.dumps(list(values), separators=(',', ':'))
+        return list(values)
+    
+    def members(self, parameter: Any) -> List[Any]:
+        """The set values bound in a parameter, inverting parameter()"""
+        if self is SetStyle.JSON:
+            return json.loads(parameter)
+        return list(parameter)
+    
+    def membership_sql(self, field_name: str, value_sql: str) -> str:
+        """SQL following the column that tests membership in the bound set"""
+        if self is SetStyle.JSON:
+            return f' IN (SELECT "value" FROM json_each({value_sql}))'
+        return f'=ANY({value_sql}::{get_field_spec(field_name).type.value}[])'
+
+def is_large_set(values: Sequence[Any], large_sets: Optional[SetStyle]) -> bool:
+    """Whether an IN set is bound as a single parameter"""
+    return large_sets is not None and len(values) > LARGE_SET_THRESHOLD
+
+# Columns of the resumes table in schema.sql, which a projection may select
+RESUME_COLUMNS = tuple(SCHEMA['resumes'].columns)
+
+def check_projection(columns: Sequence[str]) -> Tuple[str, ...]:
+    """Validate a projection of resumes columns and return it as a tuple"""
+    columns = tuple(columns)
+    if not columns:
+        raise ValueError("A projection needs at least one column")
+    for column in columns:
+        if column not in RESUME_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+    return columns
 
 class AQLQueryBuilder:
-    def __init__(self):
+    # AQL fields stored in one-to-many tables, i.e. several rows per resume
+    MULTI_VALUED_FIELDS = MULTI_VALUED_FIELDS
+    
+    def __init__(self, semi_joins: bool = False, columns: Optional[Sequence[str]] = None):
+        # With semi_joins, predicates on multi-valued fields become EXISTS
+        # subqueries instead of LEFT JOINs that fan out one row per value
+        self.semi_joins = semi_joins
+        
         # Define our main tables
         self.resumes = Table('resumes')
         self.skills = Table('skills')
@@ -14,59 +80,86 @@ class AQLQueryBuilder:
         self.projects = Table('projects')
         self.certifications = Table('certifications')
         
-        # Start with base query
-        self.query = Query.from_(self.resumes).select(self.resumes.star)
+        # AQL field -> column, from the field registry
+        tables = {'resumes': self.resumes, 'skills': self.skills, 'education': self.education}
+        self.fields = {name: tables[spec.table].field(spec.column) for name, spec in FIELDS.items()}
+        
+        # Start with base query, selecting every resumes column unless a
+        # projection names the ones to return
+        if columns is None:
+            self.query = Query.from_(self.resumes).select(self.resumes.star)
+        else:
+            self.query = Query.from_(self.resumes).select(
+                *[self.resumes.field(column) for column in check_projection(columns)]
+            )
         
         # Track which joins we've already added
         self.added_joins = set()
     
     def add_join_if_needed(self, field: str) -> None:
-        """Add necessary joins based on the field being queried"""
-        if field.startswith('SKILLS'):
-            if 'skills' not in self.added_joins:
-                self.query = (
-                    self.query
-                    .left_join(self.resume_skills)
-                    .on(self.resumes.id == self.resume_skills.resume_id)
-                    .left_join(self.skills)
-                    .on(self.resume_skills.skill_id == self.skills.id)
-                )
-                self.added_joins.add('skills')
-        
-        elif field.startswith('EDUCATION'):
-            if 'education' not in self.added_joins:
-                self.query = (
-                    self.query
-                    .left_join(self.education)
-                    .on(self.resumes.id == self.education.resume_id)
-                )
-                self.added_joins.add('education')
+        """Join the table a field is stored in, unless it is on resumes"""
+        spec = get_field_spec(field)
+        if not spec.multi_valued or (self.semi_joins and self.is_multi_valued(field)):
+            return
+        if spec.table in self.added_joins:
+            return
         
-        elif field.startswith('EXPERIENCE'):
-            if 'work_experience' not in self.added_joins:
-                self.query = (
-                    self.query
-                    .left_join(self.work_experience)
-                    .on(self.resumes.id == self.work_experience.resume_id)
-                )
-                self.added_joins.add('work_experience')
+        if spec.table == 'skills':
+            self.query = (
+                self.query
+                .left_join(self.resume_skills)
+                .on(self.resumes.id == self.resume_skills.resume_id)
+                .left_join(self.skills)
+                .on(self.resume_skills.skill_id == self.skills.id)
+            )
+        elif spec.table == 'education':
+            self.query = (
+                self.query
+                .left_join(self.education)
+                .on(self.resumes.id == self.education.resume_id)
+            )
+        else:
+            raise ValueError(f"No join path to table: {spec.table}")
+        self.added_joins.add(spec.table)
     
     def get_field(self, field_name: str) -> Field:
         """Get the appropriate field based on the AQL field name"""
-        field_mappings = {
-            'YOE': self.resumes.years_of_experience,
-            'LOCATION': self.resumes.location,
-            'SALARY': self.resumes.current_salary,
-            'EXPERIENCE': self.resumes.experience_level,
-            'EDUCATION': self.education.degree,
-            'SKILLS': self.skills.name
-        }
-        
-        if field_name not in field_mappings:
-            raise ValueError(f"Unknown field: {field_name}")
-            
         self.add_join_if_needed(field_name)
-        return field_mappings[field_name]
+        return self.fields[field_name]
+    
+    def get_sort_field(self, field_name: str) -> Field:
+        """Get the resumes column to sort by; sort keys never add joins"""
+        if get_field_spec(field_name).multi_valued:
+            raise ValueError(f"Cannot sort by multi-valued field: {field_name}")
+        return self.fields[field_name]
+    
+    def is_multi_valued(self, field_name: str) -> bool:
+        """Check whether an AQL field can hold several values per resume"""
+        return field_name in self.MULTI_VALUED_FIELDS
+    
+    def semi_join(self, field_name: str, criterion: Criterion) -> Criterion:
+        """
+        Wrap a predicate on a multi-valued field in a correlated EXISTS subquery,
+        so it tests whether any of the resume's values matches
+        """
+        if field_name == 'SKILLS':
+            subquery = (
+                Query.from_(self.resume_skills)
+                .join(self.skills)
+                .on(self.resume_skills.skill_id == self.skills.id)
+                .select(1)
+                .where((self.resume_skills.resume_id == self.resumes.id) & criterion)
+            )
+        elif field_name == 'EDUCATION':
+            subquery = (
+                Query.from_(self.education)
+                .select(1)
+                .where((self.education.resume_id == self.resumes.id) & criterion)
+            )
+        else:
+            raise ValueError(f"Field is not multi-valued: {field_name}")
+        
+        return ExistsCriterion(subquery)
     
     def add_where(self, criterion: Criterion) -> 'AQLQueryBuilder':
         """Add a WHERE clause to the query"""
@@ -83,10 +176,50 @@ class AQLQueryBuilder:
         self.query = self.query | criterion
         return self
     
+    def add_order_by(self, field: Field, descending: bool = False) -> 'AQLQueryBuilder':
+        """Add a sort key to the ORDER BY clause"""
+        if descending:
+            self.query = self.query.orderby(field, order=Order.desc)
+        else:
+            self.query = self.query.orderby(field)
+        return self
+    
+    def set_limit(self, limit: Any) -> 'AQLQueryBuilder':
+        """Cap the number of rows returned"""
+        self.query = self.query.limit(limit)
+        return self
+    
     def build(self) -> str:
         """Build and return the final SQL query"""
         return str(self.query)
 
+class BooleanCriterion(Criterion):
+    """A constant TRUE or FALSE condition"""
+    def __init__(self, value: bool):
+        super().__init__()
+        self.value = value
+    
+    def get_sql(self, **kwargs: Any) -> str:
+        return 'TRUE' if self.value else 'FALSE'
+
+class LargeSetCriterion(Criterion):
+    """Membership of a field in a set bound as one parameter, see SetStyle"""
+    def __init__(self, field: Field, value: Any, style: SetStyle, field_name: str):
+        super().__init__()
+        self.field = field
+        self.value = value
+        self.style = style
+        self.field_name = field_name
+    
+    def get_sql(self, **kwargs: Any) -> str:
+        if isinstance(self.value, Term):
+            value_sql = self.value.get_sql(**kwargs)
+        elif isinstance(self.value, list):
+            value_sql = 'ARRAY[' + ','.join(ValueWrapper(v).get_sql() for v in self.value) + ']'
+        else:
+            value_sql = ValueWrapper(self.value).get_sql()
+        return self.field.get_sql(**kwargs) + self.style.membership_sql(self.field_name, value_sql)
+
 class Operators:
     @staticmethod
     def equals(field: Field, value: Any) -> Criterion:
@@ -115,6 +248,14 @@ class Operators:
     @staticmethod
     def in_list(field: Field, values: List[Any]) -> Criterion:
         return field.isin(values)
+    
+    @staticmethod
+    def large_set(field: Field, value: Any, style: SetStyle, field_name: str) -> Criterion:
+        return LargeSetCriterion(field, value, style, field_name)
+    
+    @staticmethod
+    def constant(value: bool) -> Criterion:
+        return BooleanCriterion(value)
 
 # Example usage:
 # builder = AQLQueryBuilder()
@@ -0,0 +1,221 @@
+from typing import List, Any, Tuple, Optional, Dict, Sequence
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+from ..fields import FIELDS, get_field_spec, coerce_value
+from .sql_builder import ParamStyle, SetStyle, check_projection, is_large_set
+
+# AQL field -> (table, column), from the field registry
+FIELD_COLUMNS = {name: (spec.table, spec.column) for name, spec in FIELDS.items()}
+
+# Table of a multi-valued field -> LEFT JOIN clauses, mirroring AQLQueryBuilder.add_join_if_needed.
+# Fields on resumes need no join.
+TABLE_JOINS = {
+    'skills': (
+        ' LEFT JOIN "resume_skills" ON "resumes"."id"="resume_skills"."resume_id"'
+        ' LEFT JOIN "skills" ON "resume_skills"."skill_id"="skills"."id"'
+    ),
+    'education': ' LEFT JOIN "education" ON "resumes"."id"="education"."resume_id"',
+}
+
+# Correlated EXISTS subquery heads for multi-valued fields, mirroring AQLQueryBuilder.semi_join
+SEMI_JOINS = {
+    'SKILLS': (
+        'EXISTS (SELECT 1 FROM "resume_skills" JOIN "skills" ON "resume_skills"."skill_id"="skills"."id"'
+        ' WHERE ',
+        '"resume_skills"."resume_id"="resumes"."id" AND '
+    ),
+    'EDUCATION': (
+        'EXISTS (SELECT 1 FROM "education" WHERE ',
+        '"education"."resume_id"="resumes"."id" AND '
+    ),
+}
+
+def sort_column(field_name: str) -> str:
+    """Column of the resumes table that a sort key orders by"""
+    spec = get_field_spec(field_name)
+    if spec.multi_valued:
+        raise ValueError(f"Cannot sort by multi-valued field: {field_name}")
+    return spec.column
+
+COMPARISON_SQL = {
+    ComparisonOperator.EQUALS: '=',
+    ComparisonOperator.NOT_EQUALS: '<>',
+    ComparisonOperator.GREATER_THAN: '>',
+    ComparisonOperator.LESS_THAN: '<',
+    ComparisonOperator.GREATER_EQUAL: '>=',
+    ComparisonOperator.LESS_EQUAL: '<=',
+}
+
+def sql_literal(value: Any) -> str:
+    """Render a literal the way pypika inlines it"""
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, list):
+        # A large set bound in SetStyle.ARRAY
+        return 'ARRAY[' + ','.join(sql_literal(v) for v in value) + ']'
+    return str(value)
+
+class _FieldRef:
+    """A column reference whose table prefix is decided once all joins are known"""
+    __slots__ = ('qualified', 'bare')
+
+    def __init__(self, table: str, column: str):
+        self.qualified = f'"{table}"."{column}"'
+        self.bare = f'"{column}"'
+
+class SQLGenerator:
+    """
+    Translates an AQL AST straight into SQL text in a single walk.
+    Produces the same SQL and parameters as QueryTranslator, which builds
+    the query through pypika and stays available as the reference backend.
+    """
+    def __init__(self, param_style: Optional[ParamStyle] = None, semi_joins: bool = False,
+                 columns: Optional[Sequence[str]] = None, large_sets: Optional[SetStyle] = None):
+        self.param_style = param_style
+        self.semi_joins = semi_joins
+        self.columns = check_projection(columns) if columns is not None else None
+        self.large_sets = large_sets
+        self._field_refs: Dict[str, _FieldRef] = {
+            name: _FieldRef(table, column) for name, (table, column) in FIELD_COLUMNS.items()
+        }
+
+    def translate(self, ast: Query) -> Tuple[str, List[Any]]:
+        """
+        Translate an AQL AST into a SQL query with parameters
+        Returns: (query_string, parameters)
+        """
+        params: List[Any] = []
+        parts: List[Any] = []
+        joins: Dict[str, str] = {}
+
+        self._write_node(ast.expression, parts, params, joins, False)
+        for index, key in enumerate(ast.order_by):
+            # Sort keys are resumes columns, so they never add joins
+            sort_column(key.field.name)
+            parts.append(',' if index else ' ORDER BY ')
+            parts.append(self._field_refs[key.field.name])
+            if key.descending:
+                parts.append(' DESC')
+        if ast.limit is not None:
+            parts.append(' LIMIT ')
+            parts.append(self._bind(ast.limit, params))
+
+        # Columns are prefixed with their table only once the query has joins
+        qualify = bool(joins)
+        where = ''.join(
+            part if isinstance(part, str) else (part.qualified if qualify else part.bare)
+            for part in parts
+        )
+        if self.columns is not None:
+            prefix = '"resumes".' if qualify else ''
+            select_list = ','.join(f'{prefix}"{column}"' for column in self.columns)
+            select = f'SELECT {select_list} FROM "resumes"'
+        elif qualify:
+            select = 'SELECT "resumes".* FROM "resumes"'
+        else:
+            select = 'SELECT * FROM "resumes"'
+        return f"{select}{''.join(joins.values())} WHERE {where}", params
+
+    def _write_node(self, node: Node, parts: List[Any], params: List[Any],
+                    joins: Dict[str, str], subcriterion: bool) -> None:
+        """Append the SQL for a node to parts, bracketing it when subcriterion is set"""
+        # Work items are either SQL text or (node, subcriterion) pairs. An explicit
+        # stack keeps deeply nested queries clear of the recursion limit.
+        stack: List[Any] = [(node, subcriterion)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            
+            node, subcriterion = item
+            if isinstance(node, ComparisonCondition):
+                self._write_comparison(node, parts, params, joins, subcriterion)
+            elif isinstance(node, Constant):
+                parts.append('TRUE' if node.value else 'FALSE')
+            elif isinstance(node, LogicalExpression):
+                if node.operator == LogicalOperator.NOT:
+                    parts.append('NOT ')
+                    stack.append((node.left, True))
+                    continue
+                
+                keyword = ' AND ' if node.operator == LogicalOperator.AND else ' OR '
+                if subcriterion:
+                    parts.append('(')
+                    stack.append(')')
+                operands = node.operands
+                for index in range(len(operands) - 1, -1, -1):
+                    operand = operands[index]
+                    # Nested AND/OR groups are bracketed only when their operator differs
+                    needs_brackets = (
+                        isinstance(operand, LogicalExpression)
+                        and operand.operator != LogicalOperator.NOT
+                        and operand.operator != node.operator
+                    )
+                    stack.append((operand, needs_brackets))
+                    if index:
+                        stack.append(keyword)
+            else:
+                raise ValueError(f"Unexpected node type: {type(node)}")
+
+    def _write_comparison(self, condition: ComparisonCondition, parts: List[Any], params: List[Any],
+                          joins: Dict[str, str], subcriterion: bool) -> None:
+        field_name = condition.field.name
+        if field_name not in FIELD_COLUMNS:
+            raise ValueError(f"Unknown field: {field_name}")
+
+        semi_join = self.semi_joins and field_name in SEMI_JOINS
+        if semi_join:
+            head, correlation = SEMI_JOINS[field_name]
+            parts.append(head)
+            if subcriterion:
+                parts.append('(')
+            parts.append(correlation)
+            table, column = FIELD_COLUMNS[field_name]
+            # Subqueries over two tables always qualify their columns
+            parts.append(f'"{table}"."{column}"')
+        else:
+            self._add_join_if_needed(field_name, joins)
+            parts.append(self._field_refs[field_name])
+
+        operator = condition.operator
+        value = coerce_value(field_name, condition.value)
+        if operator == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            if is_large_set(value.values, self.large_sets):
+                value_sql = self._bind(self.large_sets.parameter([v.value for v in value.values]), params)
+                parts.append(self.large_sets.membership_sql(field_name, value_sql))
+            else:
+                parts.append(' IN (')
+                parts.append(','.join([self._bind(v.value, params) for v in value.values]))
+                parts.append(')')
+        elif operator in COMPARISON_SQL:
+            if not isinstance(value, Value):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            parts.append(COMPARISON_SQL[operator])
+            parts.append(self._bind(value.value, params))
+        else:
+            raise ValueError(f"Unknown operator: {operator}")
+
+        if semi_join:
+            parts.append('))' if subcriterion else ')')
+
+    def _add_join_if_needed(self, field_name: str, joins: Dict[str, str]) -> None:
+        table = FIELD_COLUMNS[field_name][0]
+        if table in TABLE_JOINS and table not in joins:
+            joins[table] = TABLE_JOINS[table]
+
+    def _bind(self, value: Any, params: List[Any]) -> str:
+        """Record a literal as a parameter and return its SQL text"""
+        params.append(value)
+        if self.param_style is None:
+            return sql_literal(value)
+        return self.param_style.placeholder(len(params))
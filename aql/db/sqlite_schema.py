@@ -0,0 +1,48 @@
+import re
+import sqlite3
+from pathlib import Path
+from typing import List, Optional
+
+SCHEMA_PATH = Path(__file__).with_name('schema.sql')
+
+# PostgreSQL-only parts of schema.sql: the plpgsql updated_at function and its trigger
+_POSTGRES_ONLY = [
+    re.compile(r"CREATE OR REPLACE FUNCTION.*?\$\$.*?\$\$[^;]*;", re.DOTALL | re.IGNORECASE),
+    re.compile(r"CREATE TRIGGER.*?;", re.DOTALL | re.IGNORECASE),
+]
+
+# Tables whose write versions schema.sql bumps, from its bump_<table>_version triggers
+_VERSION_TRIGGER = re.compile(r"CREATE TRIGGER bump_\w+_version\s+AFTER [A-Z ]+ ON (\w+)", re.IGNORECASE)
+
+def versioned_tables(schema_path: Path = SCHEMA_PATH) -> List[str]:
+    return _VERSION_TRIGGER.findall(schema_path.read_text())
+
+def _version_triggers(tables: List[str]) -> str:
+    """SQLite triggers bumping aql_table_versions; SQLite triggers run once per row"""
+    triggers = []
+    for table in tables:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            triggers.append(
+                f"CREATE TRIGGER bump_{table}_version_{event.lower()} AFTER {event} ON {table} BEGIN\n"
+                f"    INSERT INTO aql_table_versions (table_name, version) VALUES ('{table}', 1)\n"
+                f"    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;\n"
+                f"END;\n"
+            )
+    return ''.join(triggers)
+
+def sqlite_schema_sql(schema_path: Path = SCHEMA_PATH) -> str:
+    """Rewrite schema.sql into SQLite DDL with the same tables, indexes and version triggers"""
+    sql = schema_path.read_text()
+    for pattern in _POSTGRES_ONLY:
+        sql = pattern.sub('', sql)
+    # SQLite assigns rowids to INTEGER PRIMARY KEY columns, like SERIAL
+    sql = re.sub(r"\bSERIAL PRIMARY KEY\b", "INTEGER PRIMARY KEY", sql)
+    return sql + '\n' + _version_triggers(versioned_tables(schema_path))
+
+def create_sqlite_database(path: str = ':memory:', schema_path: Path = SCHEMA_PATH,
+                           connection: Optional[sqlite3.Connection] = None) -> sqlite3.Connection:
+    """Open a SQLite database and create the AQL tables in it, for tests and benchmarks"""
+    if connection is None:
+        connection = sqlite3.connect(path)
+    connection.executescript(sqlite_schema_sql(schema_path))
+    return connection
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from .fields import FIELDS, NUMERIC_FIELDS
+
+# Fields that can be faceted: every AQL field
+FACET_FIELDS = tuple(FIELDS)
+
+# A numeric bucket as (lower, upper): lower <= value < upper, None for unbounded
+Bucket = Tuple[Optional[float], Optional[float]]
+
+@dataclass(frozen=True)
+class Facet:
+    """
+    A histogram to compute over the resumes a query matches. YOE and SALARY
+    are counted in buckets between increasing edges; other fields count
+    each value, optionally keeping only the limit most frequent ones.
+    """
+    field: str
+    edges: Optional[Tuple[float, ...]] = None
+    limit: Optional[int] = None
+
+    def __post_init__(self):
+        if self.field not in FACET_FIELDS:
+            raise ValueError(f"Unknown field: {self.field}")
+        if self.field in NUMERIC_FIELDS:
+            if not self.edges:
+                raise ValueError(f"Facet on {self.field} needs bucket edges")
+            if any(a >= b for a, b in zip(self.edges, self.edges[1:])):
+                raise ValueError("Bucket edges must be increasing")
+            if self.limit is not None:
+                raise ValueError(f"Bucketed facet on {self.field} cannot take a limit")
+            object.__setattr__(self, 'edges', tuple(self.edges))
+        elif self.edges is not None:
+            raise ValueError(f"Facet on {self.field} cannot take bucket edges")
+        if self.limit is not None and self.limit <= 0:
+            raise ValueError("Facet limit must be positive")
+
+    @property
+    def buckets(self) -> List[Bucket]:
+        """Buckets in edge order, from below the first edge to above the last"""
+        bounds = [None, *self.edges, None]
+        return list(zip(bounds, bounds[1:]))
+
+@dataclass
+class FacetCounts:
+    """Number of matching resumes, and per facet the count of each value or bucket"""
+    total: int
+    facets: Dict[str, Dict[Any, int]] = field(default_factory=dict)
+
+def check_facets(facets: Iterable[Facet]) -> List[Facet]:
+    """Validate a facet spec: a list of Facets with distinct fields"""
+    facets = list(facets)
+    names = [facet.field for facet in facets]
+    if len(set(names)) != len(names):
+        raise ValueError("Each field can be faceted once")
+    return facets
+
+def top_values(counts: Dict[Any, int], limit: Optional[int]) -> Dict[Any, int]:
+    """
+    The limit most frequent values, by decreasing count and then by value
+    with NULL last, in that order. Zero counts are dropped.
+    """
+    ranked = sorted(
+        ((value, count) for value, count in counts.items() if count),
+        key=lambda item: (-item[1], item[0] is None, item[0] if item[0] is not None else '')
+    )
+    if limit is not None:
+        ranked = ranked[:limit]
+    return dict(ranked)
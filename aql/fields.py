@@ -0,0 +1,213 @@
+import math
+import re
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union, Optional
+from .db.sqlite_schema import SCHEMA_PATH
+from .parser.ast import Node, Query, LogicalExpression, ComparisonCondition, Value, SetLiteral
+from .parser.parser import set_member_key
+
+class FieldType(Enum):
+    """Type family of a column, which decides how literals are coerced"""
+    TEXT = 'text'
+    NUMERIC = 'numeric'
+
+# SQL type names in schema.sql -> type family; other types cannot back a field
+SQL_TYPES = {
+    'VARCHAR': FieldType.TEXT,
+    'TEXT': FieldType.TEXT,
+    'DECIMAL': FieldType.NUMERIC,
+    'NUMERIC': FieldType.NUMERIC,
+    'INTEGER': FieldType.NUMERIC,
+    'SERIAL': FieldType.NUMERIC,
+}
+
+@dataclass(frozen=True)
+class TableSchema:
+    """Columns of a schema.sql table in declaration order, and those an index leads with"""
+    name: str
+    columns: Dict[str, str]
+    indexed: frozenset
+
+_TABLE = re.compile(r"CREATE TABLE (\w+) \((.*?)\n\);", re.DOTALL | re.IGNORECASE)
+_COLUMN = re.compile(r"^\s*(\w+)\s+([A-Z]+)(.*)$", re.IGNORECASE)
+_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX \w+ ON (\w+)\s*\((\w+)", re.IGNORECASE)
+_CONSTRAINTS = ('PRIMARY', 'FOREIGN', 'UNIQUE', 'CHECK', 'CONSTRAINT')
+
+def read_schema(schema_path: Path = SCHEMA_PATH) -> Dict[str, TableSchema]:
+    """Tables of schema.sql with their column types and indexed columns"""
+    sql = re.sub(r"--[^\n]*", '', schema_path.read_text())
+    index_columns = {(table, column) for table, column in _INDEX.findall(sql)}
+    tables = {}
+    for name, body in _TABLE.findall(sql):
+        columns: Dict[str, str] = {}
+        indexed = set()
+        for line in body.split('\n'):
+            match = _COLUMN.match(line)
+            if match is None or match.group(1).upper() in _CONSTRAINTS:
+                # A table constraint: PRIMARY KEY (a, b) leads with a
+                primary = re.match(r"\s*PRIMARY KEY\s*\((\w+)", line, re.IGNORECASE)
+                if primary:
+                    indexed.add(primary.group(1))
+                continue
+            column, sql_type, rest = match.groups()
+            columns[column] = sql_type.upper()
+            if re.search(r"\b(PRIMARY KEY|UNIQUE)\b", rest, re.IGNORECASE):
+                indexed.add(column)
+        indexed |= {column for table, column in index_columns if table == name}
+        tables[name] = TableSchema(name, columns, frozenset(indexed))
+    return tables
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    Where an AQL field is stored. Fields on resumes hold one value per
+    resume; fields in other tables hold several, reached by a join.
+    """
+    name: str
+    table: str
+    column: str
+    type: FieldType
+    indexed: bool
+
+    @property
+    def multi_valued(self) -> bool:
+        return self.table != 'resumes'
+
+    @property
+    def numeric(self) -> bool:
+        return self.type is FieldType.NUMERIC
+
+    @property
+    def attribute(self) -> str:
+        """CandidateRecord attribute: the column, or the table for a set of values"""
+        return self.table if self.multi_valued else self.column
+
+# AQL field -> (table, column). Types and indexes are read from schema.sql.
+FIELD_DECLARATIONS = {
+    'SKILLS': ('skills', 'name'),
+    'EDUCATION': ('education', 'degree'),
+    'LOCATION': ('resumes', 'location'),
+    'EXPERIENCE': ('resumes', 'experience_level'),
+    'YOE': ('resumes', 'years_of_experience'),
+    'SALARY': ('resumes', 'current_salary'),
+}
+
+def build_registry(tables: Dict[str, TableSchema]) -> Dict[str, FieldSpec]:
+    """Check every declared field against the schema and describe it"""
+    fields = {}
+    for name, (table, column) in FIELD_DECLARATIONS.items():
+        if table not in tables or column not in tables[table].columns:
+            raise ValueError(f"schema.sql has no column {table}.{column} for field {name}")
+        sql_type = tables[table].columns[column]
+        if sql_type not in SQL_TYPES:
+            raise ValueError(f"Field {name} cannot be stored in a {sql_type} column")
+        fields[name] = FieldSpec(name, table, column, SQL_TYPES[sql_type], column in tables[table].indexed)
+    return fields
+
+SCHEMA = read_schema()
+FIELDS = build_registry(SCHEMA)
+
+NUMERIC_FIELDS = frozenset(name for name, spec in FIELDS.items() if spec.numeric)
+MULTI_VALUED_FIELDS = frozenset(name for name, spec in FIELDS.items() if spec.multi_valued)
+SINGLE_VALUED_FIELDS = frozenset(FIELDS) - MULTI_VALUED_FIELDS
+
+def get_field_spec(name: str) -> FieldSpec:
+    """Look up an AQL field"""
+    spec = FIELDS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown field: {name}")
+    return spec
+
+Literal = Union[int, float, str, bool]
+
+def coerce_literal(field_name: Optional[str], value: Literal) -> Literal:
+    """
+    Convert a literal to the type of its field's column, so that the
+    database compares like with like and can use the column's index.
+    Numeric fields take numbers: strings are parsed and TRUE/FALSE become
+    1/0. Text fields take strings. Literals of unknown fields are left alone.
+    """
+    spec = FIELDS.get(field_name)
+    if spec is None:
+        return value
+    if spec.numeric:
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, str):
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                raise ValueError(f"{field_name} needs a number, got {value!r}")
+            return int(number) if number.is_integer() else number
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if not isinstance(value, str):
+        return str(value)
+    return value
+
+def coerce_value(field_name: Optional[str], value: Union[Value, SetLiteral]) -> Union[Value, SetLiteral]:
+    """
+    Coerce the value or set compared with a field, dropping set members
+    that become repeats, like 5 and '5' on a text field. Returns value
+    itself when nothing changes.
+    """
+    if isinstance(value, Value):
+        literal = coerce_literal(field_name, value.value)
+        return value if set_member_key(literal) == set_member_key(value.value) else Value(literal)
+    values = []
+    seen = set()
+    changed = False
+    for member in value.values:
+        literal = coerce_literal(field_name, member.value)
+        key = set_member_key(literal)
+        if key in seen:
+            changed = True
+        else:
+            seen.add(key)
+            changed = changed or key != set_member_key(member.value)
+            values.append(Value(literal))
+    return SetLiteral(values) if changed else value
+
+def coerce_query(query: Query) -> Query:
+    """
+    Coerce every literal of a parsed query to its field's column type.
+    Unchanged subtrees are shared with the input. Works with an explicit
+    stack, so machine-generated queries can nest to any depth.
+    """
+    # Tasks are ('visit', node) or ('combine', node, operand_count)
+    tasks: List[Tuple[Any, ...]] = [('visit', query.expression)]
+    results: List[Node] = []
+    while tasks:
+        task = tasks.pop()
+        if task[0] == 'combine':
+            _, node, count = task
+            operands = results[len(results) - count:]
+            del results[len(results) - count:]
+            if any(new is not old for new, old in zip(operands, node.operands)):
+                if node.right is None:
+                    node = LogicalExpression(node.operator, operands[0])
+                else:
+                    node = LogicalExpression.of(node.operator, operands)
+            results.append(node)
+            continue
+
+        node = task[1]
+        if isinstance(node, ComparisonCondition):
+            value = coerce_value(node.field.name, node.value)
+            if value is not node.value:
+                node = ComparisonCondition(node.field, node.operator, value)
+            results.append(node)
+        elif isinstance(node, LogicalExpression):
+            operands = node.operands
+            tasks.append(('combine', node, len(operands)))
+            tasks.extend(('visit', operand) for operand in reversed(operands))
+        else:
+            results.append(node)
+    if results[0] is query.expression:
+        return query
+    return Query(results[0], query.order_by, query.limit)
@@ -0,0 +1,296 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Iterable, TypeVar
+from .parser.ast import Node, visit_ast
+
+# Pipeline stages in order; each trace also records their sum as 'total'
+STAGES = ('lex', 'parse', 'optimize', 'translate', 'execute')
+
+T = TypeVar('T')
+
+@dataclass(frozen=True)
+class HistogramSnapshot:
+    """Summary of a latency histogram, in seconds"""
+    count: int
+    min: float
+    max: float
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    p999: float
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in nanoseconds. Buckets are linear
+    below 2**precision_bits and split every further power of two into
+    2**(precision_bits - 1) buckets, so a recorded value is known within a
+    relative error of 2**-(precision_bits - 1) at any magnitude. Memory
+    grows with the number of distinct buckets hit, not with the count.
+    """
+    def __init__(self, precision_bits: int = 7):
+        if precision_bits < 2:
+            raise ValueError("precision_bits must be at least 2")
+        self.precision_bits = precision_bits
+        self._linear = 1 << precision_bits
+        self._half = self._linear >> 1
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _index(self, value: int) -> int:
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self._linear + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _upper(self, index: int) -> int:
+        """Largest value that falls in a bucket"""
+        if index < self._linear:
+            return index
+        shift, offset = divmod(index - self._linear, self._half)
+        shift += 1
+        return ((offset + self._half + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        """Record one latency in nanoseconds"""
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """Latency in nanoseconds that percent of the recorded values do not exceed"""
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Add the values of a histogram with the same precision"""
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Cannot merge histograms of different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def snapshot(self) -> HistogramSnapshot:
+        scale = 1e-9
+        return HistogramSnapshot(
+            count=self.count,
+            min=(self.min or 0) * scale,
+            max=(self.max or 0) * scale,
+            mean=(self.total / self.count if self.count else 0) * scale,
+            p50=self.percentile(50) * scale,
+            p90=self.percentile(90) * scale,
+            p99=self.percentile(99) * scale,
+            p999=self.percentile(99.9) * scale
+        )
+
+def count_joins(sql: str) -> int:
+    """Tables joined onto resumes in translated SQL, counting each semi-join subquery as one"""
+    return sql.count(' JOIN ') + sql.count('EXISTS (')
+
+def count_nodes(ast: Node) -> int:
+    """Nodes in a parsed query, the query itself included"""
+    nodes = []
+    visit_ast(ast, nodes.append)
+    return len(nodes)
+
+class QueryTrace:
+    """
+    One query's trip through the pipeline: what was run, how large it was,
+    and the nanoseconds spent in each stage. node_count stays None when the
+    plan cache served the query without parsing it.
+    """
+    __slots__ = ('query', 'fingerprint', 'token_count', 'node_count', 'join_count',
+                 'sql', 'timings', '_instrumentation')
+
+    def __init__(self, query: str, instrumentation: 'Instrumentation'):
+        self.query = query
+        self.fingerprint: Optional[str] = None
+        self.token_count: Optional[int] = None
+        self.node_count: Optional[int] = None
+        self.join_count: Optional[int] = None
+        self.sql: Optional[str] = None
+        self.timings: Dict[str, int] = {}
+        self._instrumentation = instrumentation
+
+    def add(self, stage: str, nanoseconds: int) -> None:
+        self.timings[stage] = self.timings.get(stage, 0) + nanoseconds
+
+    @property
+    def total(self) -> int:
+        return sum(self.timings.values())
+
+    def set_sql(self, sql: str) -> None:
+        self.sql = sql
+        self.join_count = count_joins(sql)
+
+    def finish(self) -> None:
+        """Hand the trace to its instrumentation once the query is done"""
+        self._instrumentation.finish(self)
+
+def timed(trace: Optional[QueryTrace], stage: str, function: Callable[..., T], *args: Any) -> T:
+    """Call a function, adding its duration to a stage of the trace if there is one"""
+    if trace is None:
+        return function(*args)
+    start = time.perf_counter_ns()
+    try:
+        return function(*args)
+    finally:
+        trace.add(stage, time.perf_counter_ns() - start)
+
+@dataclass(frozen=True)
+class SlowQuery:
+    """A query whose total time reached the slow-query threshold"""
+    query: str
+    sql: Optional[str]
+    fingerprint: Optional[str]
+    timings: Dict[str, float]
+    total: float
+
+class Exporter:
+    """
+    Receives what Instrumentation collects. Subclass it to feed a metrics
+    stack; every method does nothing by default.
+    """
+    def on_trace(self, trace: QueryTrace) -> None:
+        """Called for every finished trace"""
+
+    def on_slow_query(self, slow_query: SlowQuery) -> None:
+        """Called for every slow query that is sampled into the log"""
+
+    def export(self, snapshots: Dict[str, HistogramSnapshot]) -> None:
+        """Called by Instrumentation.export with a snapshot of every histogram"""
+
+class LoggingExporter(Exporter):
+    """Writes slow queries and histogram snapshots to a logger"""
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger('aql')
+
+    def on_slow_query(self, slow_query: SlowQuery) -> None:
+        stages = ' '.join(f"{stage}={seconds * 1000:.3f}ms" for stage, seconds in slow_query.timings.items())
+        self.logger.warning("Slow AQL query (%.3fms): %s | %s | SQL: %s",
+                            slow_query.total * 1000, slow_query.query, stages, slow_query.sql)
+
+    def export(self, snapshots: Dict[str, HistogramSnapshot]) -> None:
+        for stage, snapshot in snapshots.items():
+            self.logger.info("aql.%s count=%d p50=%.3fms p99=%.3fms max=%.3fms", stage, snapshot.count,
+                             snapshot.p50 * 1000, snapshot.p99 * 1000, snapshot.max * 1000)
+
+class Instrumentation:
+    """
+    Aggregates query traces into one latency histogram per stage, plus one
+    for the total, and keeps a log of slow queries. Queries whose total
+    time reaches slow_query_threshold seconds are logged with probability
+    slow_query_sample_rate, keeping the latest slow_query_log_size.
+    """
+    def __init__(
+        self,
+        exporters: Iterable[Exporter] = (),
+        slow_query_threshold: Optional[float] = None,
+        slow_query_sample_rate: float = 1.0,
+        slow_query_log_size: int = 100,
+        precision_bits: int = 7,
+        seed: Optional[int] = None
+    ):
+        if not 0 <= slow_query_sample_rate <= 1:
+            raise ValueError("slow_query_sample_rate must be between 0 and 1")
+        self.exporters: List[Exporter] = list(exporters)
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_query_sample_rate = slow_query_sample_rate
+        self.slow_queries: 'deque[SlowQuery]' = deque(maxlen=slow_query_log_size)
+        self.precision_bits = precision_bits
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def trace(self, query_str: str) -> QueryTrace:
+        return QueryTrace(query_str, self)
+
+    def finish(self, trace: QueryTrace) -> None:
+        """Record a finished trace"""
+        total = trace.total
+        slow_query = None
+        with self._lock:
+            for stage, nanoseconds in [*trace.timings.items(), ('total', total)]:
+                histogram = self.histograms.get(stage)
+                if histogram is None:
+                    histogram = self.histograms[stage] = LatencyHistogram(self.precision_bits)
+                histogram.record(nanoseconds)
+            if (self.slow_query_threshold is not None
+                    and total >= self.slow_query_threshold * 1e9
+                    and self._random.random() < self.slow_query_sample_rate):
+                slow_query = SlowQuery(
+                    query=trace.query,
+                    sql=trace.sql,
+                    fingerprint=trace.fingerprint,
+                    timings={stage: nanoseconds * 1e-9 for stage, nanoseconds in trace.timings.items()},
+                    total=total * 1e-9
+                )
+                self.slow_queries.append(slow_query)
+        for exporter in self.exporters:
+            exporter.on_trace(trace)
+            if slow_query is not None:
+                exporter.on_slow_query(slow_query)
+
+    def snapshot(self) -> Dict[str, HistogramSnapshot]:
+        """Summaries of the histograms, stages in pipeline order and then the total"""
+        order = {stage: index for index, stage in enumerate(STAGES + ('total',))}
+        with self._lock:
+            return {
+                stage: self.histograms[stage].snapshot()
+                for stage in sorted(self.histograms, key=lambda stage: order.get(stage, len(order)))
+            }
+
+    def export(self) -> Dict[str, HistogramSnapshot]:
+        """Send a snapshot of every histogram to the exporters and return it"""
+        snapshots = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshots)
+        return snapshots
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.slow_queries.clear()
+
+# Instrumentation receiving traces; None, the default, turns tracing off
+_active: Optional[Instrumentation] = None
+
+def install(instrumentation: Optional[Instrumentation]) -> Optional[Instrumentation]:
+    """Route traces to an Instrumentation, or stop tracing with None. Returns the previous one."""
+    global _active
+    previous, _active = _active, instrumentation
+    return previous
+
+def get_instrumentation() -> Optional[Instrumentation]:
+    return _active
+
+def start_trace(query_str: str) -> Optional[QueryTrace]:
+    """Start tracing a query, or return None when no Instrumentation is installed"""
+    if _active is None:
+        return None
+    return _active.trace(query_str)
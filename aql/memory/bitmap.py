@@ -0,0 +1,213 @@
+import sys
+from typing import Dict, Iterable, Iterator, Union
+
+# Ids are split into chunks of 2**16 by their high bits, as in Roaring bitmaps.
+# A chunk holding few ids stores their low bits in a set; a fuller chunk
+# switches to a bitset held in a Python int of at most 8KB. A set costs
+# about 60 bytes per id, so beyond ~128 ids the bitset is smaller.
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+MAX_SPARSE = 128
+# Size of the int object behind each low-bits entry of a set container
+INT_BYTES = sys.getsizeof(CHUNK_MASK)
+
+Container = Union[set, int]
+
+def _to_bitset(container: Container) -> int:
+    if isinstance(container, int):
+        return container
+    buffer = bytearray((max(container) >> 3) + 1) if container else bytearray()
+    for low in container:
+        buffer[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(buffer, 'little')
+
+# Set bit positions of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+def _to_sparse(bitset: int) -> set:
+    result = set()
+    data = bitset.to_bytes((bitset.bit_length() + 7) >> 3, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for bit in _BYTE_BITS[byte]:
+                result.add(base + bit)
+    return result
+
+def _normalize(container: Container) -> Container:
+    """Pick the cheaper representation for a container, or None when empty"""
+    if isinstance(container, int):
+        count = container.bit_count()
+        if count == 0:
+            return None
+        return _to_sparse(container) if count <= MAX_SPARSE else container
+    if not container:
+        return None
+    return _to_bitset(container) if len(container) > MAX_SPARSE else container
+
+def _intersect(a: Container, b: Container) -> Container:
+    if isinstance(a, set):
+        if isinstance(b, set):
+            return a & b
+        return {low for low in a if b >> low & 1}
+    if isinstance(b, set):
+        return {low for low in b if a >> low & 1}
+    return a & b
+
+def _union(a: Container, b: Container) -> Container:
+    if isinstance(a, set) and isinstance(b, set):
+        return a | b
+    return _to_bitset(a) | _to_bitset(b)
+
+def _difference(a: Container, b: Container) -> Container:
+    if isinstance(a, set):
+        if isinstance(b, set):
+            return a - b
+        return {low for low in a if not b >> low & 1}
+    return a & ~_to_bitset(b)
+
+class Bitmap:
+    """
+    Compressed set of non-negative integer ids. Supports &, | and - between
+    bitmaps and in-place add/discard for index maintenance.
+    """
+    __slots__ = ('chunks',)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        chunks: Dict[int, Container] = {}
+        for resume_id in ids:
+            key = resume_id >> CHUNK_BITS
+            container = chunks.get(key)
+            if container is None:
+                container = chunks[key] = set()
+            container.add(resume_id & CHUNK_MASK)
+        self.chunks = {key: _normalize(container) for key, container in chunks.items()}
+
+    def add(self, resume_id: int) -> None:
+        key, low = resume_id >> CHUNK_BITS, resume_id & CHUNK_MASK
+        container = self.chunks.get(key)
+        if container is None:
+            self.chunks[key] = {low}
+        elif isinstance(container, set):
+            container.add(low)
+            if len(container) > MAX_SPARSE:
+                self.chunks[key] = _to_bitset(container)
+        else:
+            self.chunks[key] = container | (1 << low)
+
+    def discard(self, resume_id: int) -> None:
+        key, low = resume_id >> CHUNK_BITS, resume_id & CHUNK_MASK
+        container = self.chunks.get(key)
+        if container is None:
+            return
+        if isinstance(container, set):
+            container.discard(low)
+            if not container:
+                del self.chunks[key]
+        else:
+            container &= ~(1 << low)
+            normalized = _normalize(container)
+            if normalized is None:
+                del self.chunks[key]
+            else:
+                self.chunks[key] = normalized
+
+    def __contains__(self, resume_id: int) -> bool:
+        container = self.chunks.get(resume_id >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = resume_id & CHUNK_MASK
+        if isinstance(container, set):
+            return low in container
+        return bool(container >> low & 1)
+
+    def __len__(self) -> int:
+        return sum(
+            len(c) if isinstance(c, set) else c.bit_count() for c in self.chunks.values()
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate ids in ascending order"""
+        for key in sorted(self.chunks):
+            container = self.chunks[key]
+            lows = container if isinstance(container, set) else _to_sparse(container)
+            base = key << CHUNK_BITS
+            for low in sorted(lows):
+                yield base + low
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"Bitmap({len(self)} ids)"
+
+    def copy(self) -> 'Bitmap':
+        result = Bitmap()
+        result.chunks = {
+            key: set(c) if isinstance(c, set) else c for key, c in self.chunks.items()
+        }
+        return result
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        result = Bitmap()
+        small, large = (self, other) if len(self.chunks) <= len(other.chunks) else (other, self)
+        for key, container in small.chunks.items():
+            other_container = large.chunks.get(key)
+            if other_container is not None:
+                merged = _normalize(_intersect(container, other_container))
+                if merged is not None:
+                    result.chunks[key] = merged
+        return result
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        result = self.copy()
+        for key, container in other.chunks.items():
+            existing = result.chunks.get(key)
+            if existing is None:
+                result.chunks[key] = set(container) if isinstance(container, set) else container
+            else:
+                result.chunks[key] = _normalize(_union(existing, container))
+        return result
+
+    def __sub__(self, other: 'Bitmap') -> 'Bitmap':
+        result = Bitmap()
+        for key, container in self.chunks.items():
+            other_container = other.chunks.get(key)
+            if other_container is None:
+                result.chunks[key] = set(container) if isinstance(container, set) else container
+                continue
+            remaining = _normalize(_difference(container, other_container))
+            if remaining is not None:
+                result.chunks[key] = remaining
+        return result
+
+    @classmethod
+    def union_all(cls, bitmaps: Iterable['Bitmap']) -> 'Bitmap':
+        """Union many bitmaps, merging each chunk once"""
+        merged: Dict[int, Container] = {}
+        for bitmap in bitmaps:
+            for key, container in bitmap.chunks.items():
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = set(container) if isinstance(container, set) else container
+                elif isinstance(existing, set) and isinstance(container, set):
+                    existing |= container
+                else:
+                    merged[key] = _union(existing, container)
+        result = cls()
+        result.chunks = {key: _normalize(c) for key, c in merged.items()}
+        return result
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the bitmap"""
+        total = sys.getsizeof(self.chunks)
+        for container in self.chunks.values():
+            total += INT_BYTES + sys.getsizeof(container)
+            if isinstance(container, set):
+                total += INT_BYTES * len(container)
+        return total
@@ -0,0 +1,316 @@
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Sequence, Union, Hashable
+import numpy as np
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+from ..facets import Facet, FacetCounts, check_facets, top_values
+from ..optimizer import NUMERIC_FIELDS, node_key
+from .compiler import COMPARISON_FUNCTIONS
+from .records import CandidateRecord, MULTI_VALUED_FIELDS, field_attribute
+
+# A predicate result as (true mask, false mask). Rows in neither are unknown
+# (SQL NULL); a false mask of None means no row is unknown, so it is ~true.
+MaskPair = Tuple[np.ndarray, Optional[np.ndarray]]
+
+class StringDictionary:
+    """Assigns dense integer codes to distinct strings"""
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: Optional[str]) -> int:
+        """Get the code for a value, adding it if new. None encodes as -1."""
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Any) -> int:
+        """Get the code for a value without adding it, or -1 if it never occurs"""
+        if not isinstance(value, str):
+            return -1
+        return self.codes.get(value, -1)
+
+    def membership_table(self, values: Iterable[Any]) -> np.ndarray:
+        """
+        Boolean table indexed by code marking the given values. A trailing
+        False entry makes code -1 never match.
+        """
+        table = np.zeros(len(self.values) + 1, dtype=bool)
+        for value in values:
+            code = self.lookup(value)
+            if code >= 0:
+                table[code] = True
+        return table
+
+    def comparison_table(self, comparison: ComparisonOperator, value: Any) -> np.ndarray:
+        """Compare every dictionary value with a literal once, giving a table like membership_table"""
+        compare = COMPARISON_FUNCTIONS[comparison]
+        table = np.zeros(len(self.values) + 1, dtype=bool)
+        table[:-1] = [compare(v, value) for v in self.values]
+        return table
+
+class CategoricalColumn:
+    """A single-valued string column stored as dictionary codes, -1 for NULL"""
+    def __init__(self, values: Sequence[Optional[str]]):
+        self.dictionary = StringDictionary()
+        self.codes = np.fromiter(
+            (self.dictionary.encode(v) for v in values), dtype=np.int32, count=len(values)
+        )
+        known = self.codes >= 0
+        self.known: Optional[np.ndarray] = None if known.all() else known
+
+class MultiValuedColumn:
+    """
+    A set-valued string column in CSR layout: the codes of row i are
+    values[offsets[i]:offsets[i + 1]]. owners maps each entry back to its row.
+    """
+    def __init__(self, value_sets: Sequence[Iterable[str]]):
+        self.dictionary = StringDictionary()
+        lengths = np.zeros(len(value_sets), dtype=np.int64)
+        codes: List[int] = []
+        for row, value_set in enumerate(value_sets):
+            before = len(codes)
+            codes.extend(self.dictionary.encode(v) for v in value_set)
+            lengths[row] = len(codes) - before
+        self.offsets = np.zeros(len(value_sets) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.values = np.array(codes, dtype=np.int32)
+        self.owners = np.repeat(np.arange(len(value_sets), dtype=np.int32), lengths)
+
+    def row_values(self, row: int) -> List[str]:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return [self.dictionary.values[code] for code in self.values[start:end]]
+
+class ColumnarSnapshot:
+    """
+    Column-oriented copy of a set of candidate records. YOE and SALARY are
+    float arrays with NaN for NULL, LOCATION and EXPERIENCE are dictionary
+    encoded, and SKILLS and EDUCATION are CSR code lists.
+    """
+    def __init__(self, records: Sequence[CandidateRecord]):
+        self.size = len(records)
+        self.ids = np.fromiter((r.id for r in records), dtype=np.int64, count=self.size)
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.numeric_known: Dict[str, Optional[np.ndarray]] = {}
+        self.categorical: Dict[str, CategoricalColumn] = {}
+        self.multi_valued: Dict[str, MultiValuedColumn] = {}
+
+        for field_name in ('YOE', 'SALARY', 'LOCATION', 'EXPERIENCE', 'EDUCATION', 'SKILLS'):
+            attribute = field_attribute(field_name)
+            values = [getattr(r, attribute) for r in records]
+            if field_name in MULTI_VALUED_FIELDS:
+                self.multi_valued[field_name] = MultiValuedColumn(values)
+            elif field_name in NUMERIC_FIELDS:
+                column = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+                known = ~np.isnan(column)
+                self.numeric[field_name] = column
+                self.numeric_known[field_name] = None if known.all() else known
+            else:
+                self.categorical[field_name] = CategoricalColumn(values)
+
+    @classmethod
+    def from_records(cls, records: Iterable[CandidateRecord]) -> 'ColumnarSnapshot':
+        return cls(list(records))
+
+    def nbytes(self) -> int:
+        """Memory held by the column arrays"""
+        arrays = [self.ids] + list(self.numeric.values())
+        arrays += [c.codes for c in self.categorical.values()]
+        for column in self.multi_valued.values():
+            arrays += [column.offsets, column.values, column.owners]
+        return sum(a.nbytes for a in arrays)
+
+class ColumnarExecutor:
+    """
+    Evaluates queries over a ColumnarSnapshot as boolean masks. Comparisons
+    become vectorized array operations, with string fields compared by
+    integer code, and AND/OR/NOT become &, | and ~ over the masks. NULLs
+    and SKILLS/EDUCATION follow the same semantics as PredicateCompiler.
+    """
+    def __init__(self, snapshot: ColumnarSnapshot, max_memo_bytes: int = 256 * 1024 * 1024):
+        self.snapshot = snapshot
+        self.max_memo_bytes = max_memo_bytes
+
+    def mask(self, query: Union[str, Query]) -> np.ndarray:
+        """Boolean mask of the rows matching a query"""
+        return self._evaluate(self._parse(query).expression, None)[0]
+
+    def filter_ids(self, query: Union[str, Query]) -> np.ndarray:
+        """Resume ids of the rows matching a query"""
+        return self.snapshot.ids[self.mask(query)]
+
+    def count(self, query: Union[str, Query]) -> int:
+        return int(np.count_nonzero(self.mask(query)))
+
+    def count_many(self, queries: Iterable[Union[str, Query]]) -> List[int]:
+        """
+        Count the matches of many queries, e.g. a batch of saved searches.
+        Masks of comparisons shared between queries are computed once.
+        """
+        memo: Dict[Hashable, MaskPair] = {}
+        return [
+            int(np.count_nonzero(self._evaluate(self._parse(q).expression, memo)[0]))
+            for q in queries
+        ]
+
+    def facets(self, query: Union[str, Query], facets: Sequence[Facet]) -> FacetCounts:
+        """
+        Count the matches of a query and histogram them per facet, from one
+        mask. Values are counted by code with np.bincount, and numeric
+        fields are bucketed with np.searchsorted.
+        """
+        facets = check_facets(facets)
+        mask = self.mask(query)
+        result = FacetCounts(total=int(np.count_nonzero(mask)))
+        snapshot = self.snapshot
+        for facet in facets:
+            name = facet.field
+            if facet.edges is not None:
+                values = snapshot.numeric[name][mask]
+                known = ~np.isnan(values)
+                # Bucket i holds edges[i-1] <= value < edges[i]
+                positions = np.searchsorted(np.asarray(facet.edges, dtype=np.float64),
+                                            values[known], side='right')
+                counts = np.bincount(positions, minlength=len(facet.edges) + 1)
+                histogram: Dict[Any, int] = {
+                    bucket: int(count) for bucket, count in zip(facet.buckets, counts) if count
+                }
+                unknown = len(values) - int(np.count_nonzero(known))
+                if unknown:
+                    histogram[None] = unknown
+                result.facets[name] = histogram
+                continue
+
+            if name in snapshot.multi_valued:
+                column = snapshot.multi_valued[name]
+                codes = column.values[mask[column.owners]]
+                counts = np.bincount(codes, minlength=len(column.dictionary.values))
+                values = column.dictionary.values
+            else:
+                column = snapshot.categorical[name]
+                # Shift codes by one so NULL (-1) lands in bin 0
+                counts = np.bincount(column.codes[mask] + 1, minlength=len(column.dictionary.values) + 1)
+                values = [None] + column.dictionary.values
+            result.facets[name] = top_values(
+                {value: int(count) for value, count in zip(values, counts) if count}, facet.limit
+            )
+        return result
+
+    def _parse(self, query: Union[str, Query]) -> Query:
+        if isinstance(query, str):
+            from ..parser.parser import parse
+            return parse(query)
+        return query
+
+    def _evaluate(self, node: Node, memo: Optional[Dict[Hashable, MaskPair]]) -> MaskPair:
+        # Post-order walk over an explicit stack, so deep queries stay clear
+        # of the recursion limit
+        results: List[MaskPair] = []
+        stack: List[Tuple[Node, bool]] = [(node, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, ComparisonCondition):
+                results.append(self._memo_comparison(node, memo))
+            elif isinstance(node, Constant):
+                results.append((np.full(self.snapshot.size, node.value, dtype=bool), None))
+            elif not isinstance(node, LogicalExpression):
+                raise ValueError(f"Unexpected node type: {type(node)}")
+            elif not expanded:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in reversed(node.operands))
+            elif node.operator == LogicalOperator.NOT:
+                true, false = results.pop()
+                results.append((~true, None) if false is None else (false, true))
+            else:
+                count = len(node.operands)
+                operands = results[-count:]
+                del results[-count:]
+                results.append(self._combine(node.operator, operands))
+        return results[0]
+
+    def _combine(self, logical: LogicalOperator, operands: List[MaskPair]) -> MaskPair:
+        """AND is true when all operands are true and false when any is false; OR is the dual"""
+        if logical == LogicalOperator.AND:
+            reduce_true, reduce_false = np.logical_and.reduce, np.logical_or.reduce
+        else:
+            reduce_true, reduce_false = np.logical_or.reduce, np.logical_and.reduce
+        true = reduce_true([t for t, _ in operands])
+        if all(f is None for _, f in operands):
+            return true, None
+        false = reduce_false([~t if f is None else f for t, f in operands])
+        return true, false
+
+    def _memo_comparison(self, condition: ComparisonCondition,
+                         memo: Optional[Dict[Hashable, MaskPair]]) -> MaskPair:
+        if memo is None:
+            return self._compare(condition)
+        key = node_key(condition)
+        result = memo.get(key)
+        if result is None:
+            result = self._compare(condition)
+            # Each entry holds up to two masks of one byte per row
+            if len(memo) * 2 * self.snapshot.size < self.max_memo_bytes:
+                memo[key] = result
+        return result
+
+    def _compare(self, condition: ComparisonCondition) -> MaskPair:
+        name = condition.field.name
+        field_attribute(name)  # rejects unknown fields
+        comparison = condition.operator
+        value = condition.value
+
+        if comparison == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            literals = [v.value for v in value.values]
+        elif comparison in COMPARISON_FUNCTIONS:
+            if not isinstance(value, Value):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            literals = [value.value]
+        else:
+            raise ValueError(f"Unknown operator: {comparison}")
+
+        snapshot = self.snapshot
+        if name in snapshot.multi_valued:
+            column = snapshot.multi_valued[name]
+            entries = self._match_codes(column.values, column.dictionary, comparison, literals)
+            # A row matches when any of its entries does; never unknown
+            true = np.zeros(snapshot.size, dtype=bool)
+            true[column.owners[entries]] = True
+            return true, None
+
+        if name in snapshot.numeric:
+            column = snapshot.numeric[name]
+            known = snapshot.numeric_known[name]
+            if comparison == ComparisonOperator.IN:
+                numbers = [v for v in literals if isinstance(v, (int, float))]
+                matches = np.isin(column, np.array(numbers, dtype=np.float64))
+            else:
+                matches = COMPARISON_FUNCTIONS[comparison](column, literals[0])
+        else:
+            categorical = snapshot.categorical[name]
+            known = categorical.known
+            matches = self._match_codes(categorical.codes, categorical.dictionary, comparison, literals)
+
+        if known is None:
+            return matches, None
+        return matches & known, known & ~matches
+
+    def _match_codes(self, codes: np.ndarray, dictionary: StringDictionary,
+                     comparison: ComparisonOperator, literals: List[Any]) -> np.ndarray:
+        """Compare dictionary codes against literals without touching the strings per row"""
+        # Table lookups are a gather over the codes, far cheaper than np.isin
+        if comparison == ComparisonOperator.IN:
+            return dictionary.membership_table(literals)[codes]
+        if comparison == ComparisonOperator.EQUALS:
+            return codes == dictionary.lookup(literals[0])
+        if comparison == ComparisonOperator.NOT_EQUALS:
+            return codes != dictionary.lookup(literals[0])
+        return dictionary.comparison_table(comparison, literals[0])[codes]
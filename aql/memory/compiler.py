@@ -0,0 +1,183 @@
+import operator
+from functools import lru_cache
+from typing import List, Any, Tuple, Callable, Iterable, Union
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+from .records import CandidateRecord, MULTI_VALUED_FIELDS, field_attribute
+
+Predicate = Callable[[CandidateRecord], bool]
+
+COMPARISON_PYTHON = {
+    ComparisonOperator.EQUALS: '==',
+    ComparisonOperator.NOT_EQUALS: '!=',
+    ComparisonOperator.GREATER_THAN: '>',
+    ComparisonOperator.LESS_THAN: '<',
+    ComparisonOperator.GREATER_EQUAL: '>=',
+    ComparisonOperator.LESS_EQUAL: '<=',
+}
+
+COMPARISON_FUNCTIONS = {
+    ComparisonOperator.EQUALS: operator.eq,
+    ComparisonOperator.NOT_EQUALS: operator.ne,
+    ComparisonOperator.GREATER_THAN: operator.gt,
+    ComparisonOperator.LESS_THAN: operator.lt,
+    ComparisonOperator.GREATER_EQUAL: operator.ge,
+    ComparisonOperator.LESS_EQUAL: operator.le,
+}
+
+# Groups nested deeper than this in one function go into helper functions,
+# since Python's compiler rejects expressions nested much deeper
+MAX_NESTING = 50
+
+class PredicateCompiler:
+    """
+    Compiles a parsed query into one specialized Python predicate over
+    CandidateRecord. The generated source depends only on the query shape,
+    so its code object is cached per shape and each query only binds its
+    literals. IN sets are bound as frozensets. Queries nested deeper than
+    MAX_NESTING groups are split into helper functions, one per
+    MAX_NESTING levels.
+
+    Predicates follow SQL semantics: a comparison on a NULL (None) field is
+    unknown, a record matches only when the whole query is true, and
+    SKILLS/EDUCATION predicates test whether any of the candidate's values
+    matches, as in semi-join translation.
+    """
+    def compile(self, query: Query) -> Predicate:
+        params: List[Any] = []
+        helpers: List[str] = []
+        expression = self._emit(query.expression, True, params, helpers)
+        factory = _compile_source(tuple(helpers), expression, len(params))
+        return factory(params)
+
+    def _emit(self, root: Node, truth: bool, params: List[Any], helpers: List[str]) -> str:
+        """
+        Emit a Python expression that holds exactly when the node evaluates
+        to `truth` under SQL three-valued logic (so not when it is unknown).
+        Works bottom-up with an explicit stack; expressions reaching
+        MAX_NESTING levels become helpers h0, h1, ... called with the record.
+        """
+        # Tasks are ('visit', node, truth) or ('combine', joiner, operand_count)
+        tasks: List[Tuple[str, Any, Any]] = [('visit', root, truth)]
+        # Emitted expressions with their nesting depth
+        results: List[Tuple[str, int]] = []
+
+        while tasks:
+            kind, node, arg = tasks.pop()
+            if kind == 'combine':
+                operands = results[len(results) - arg:]
+                del results[len(results) - arg:]
+                expression = '(' + node.join(text for text, _ in operands) + ')'
+                nesting = 1 + max(depth for _, depth in operands)
+                if nesting >= MAX_NESTING:
+                    helpers.append(expression)
+                    expression, nesting = f"h{len(helpers) - 1}(r)", 0
+                results.append((expression, nesting))
+                continue
+
+            truth = arg
+            if isinstance(node, ComparisonCondition):
+                results.append((self._emit_comparison(node, truth, params), 0))
+            elif isinstance(node, Constant):
+                results.append(('True' if node.value == truth else 'False', 0))
+            elif not isinstance(node, LogicalExpression):
+                raise ValueError(f"Unexpected node type: {type(node)}")
+            elif node.operator == LogicalOperator.NOT:
+                tasks.append(('visit', node.left, not truth))
+            else:
+                # AND is true when all operands are true and false when any is false;
+                # OR is the dual
+                all_operands = (node.operator == LogicalOperator.AND) == truth
+                operands = node.operands
+                tasks.append(('combine', ' and ' if all_operands else ' or ', len(operands)))
+                for operand in reversed(operands):
+                    tasks.append(('visit', operand, truth))
+
+        return results[0][0]
+
+    def _emit_comparison(self, condition: ComparisonCondition, truth: bool, params: List[Any]) -> str:
+        name = condition.field.name
+        attribute = f"r.{field_attribute(name)}"
+        operator = condition.operator
+        value = condition.value
+
+        if operator == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            slot = self._bind(frozenset(v.value for v in value.values), params)
+        elif operator in COMPARISON_PYTHON:
+            if not isinstance(value, Value):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            if name in MULTI_VALUED_FIELDS and operator == ComparisonOperator.NOT_EQUALS:
+                slot = self._bind(frozenset([value.value]), params)
+            else:
+                slot = self._bind(value.value, params)
+        else:
+            raise ValueError(f"Unknown operator: {operator}")
+
+        if name in MULTI_VALUED_FIELDS:
+            # Tests whether any value matches, which is never unknown
+            if operator == ComparisonOperator.IN:
+                test = f"not {slot}.isdisjoint({attribute})"
+            elif operator == ComparisonOperator.EQUALS:
+                test = f"{slot} in {attribute}"
+            elif operator == ComparisonOperator.NOT_EQUALS:
+                test = f"not {attribute} <= {slot}"
+            else:
+                test = f"any(x {COMPARISON_PYTHON[operator]} {slot} for x in {attribute})"
+            return f"({test})" if truth else f"(not ({test}))"
+
+        # None never equals a literal or belongs to a set, so those tests
+        # need no NULL guard when they are expected to hold
+        if truth and operator == ComparisonOperator.IN:
+            return f"({attribute} in {slot})"
+        if truth and operator == ComparisonOperator.EQUALS:
+            return f"({attribute} == {slot})"
+        if not truth and operator == ComparisonOperator.NOT_EQUALS:
+            return f"({attribute} == {slot})"
+
+        if operator == ComparisonOperator.IN:
+            test = f"v in {slot}"
+        else:
+            test = f"v {COMPARISON_PYTHON[operator]} {slot}"
+        if not truth:
+            test = f"not ({test})"
+        return f"((v := {attribute}) is not None and {test})"
+
+    def _bind(self, value: Any, params: List[Any]) -> str:
+        params.append(value)
+        return f"p{len(params) - 1}"
+
+@lru_cache(maxsize=1024)
+def _compile_source(helpers: Tuple[str, ...], expression: str,
+                    param_count: int) -> Callable[[List[Any]], Predicate]:
+    """Compile a predicate factory for one query shape"""
+    source = "def factory(params):\n"
+    if param_count:
+        source += "    " + ''.join(f"p{i}, " for i in range(param_count)) + "= params\n"
+    for index, helper in enumerate(helpers):
+        source += f"    def h{index}(r):\n        return {helper}\n"
+    source += (
+        "    def predicate(r):\n"
+        f"        return {expression}\n"
+        "    return predicate\n"
+    )
+    namespace: dict = {}
+    exec(compile(source, '<aql predicate>', 'exec'), namespace)
+    return namespace['factory']
+
+_default_compiler = PredicateCompiler()
+
+def compile_predicate(query: Union[str, Query]) -> Predicate:
+    """Helper function to compile an AQL query string or AST into a record predicate"""
+    if isinstance(query, str):
+        from ..parser.parser import parse
+        query = parse(query)
+    return _default_compiler.compile(query)
+
+def filter_candidates(query: Union[str, Query], records: Iterable[CandidateRecord]) -> List[CandidateRecord]:
+    """Return the records matching an AQL query"""
+    return list(filter(compile_predicate(query), records))
@@ -0,0 +1,377 @@
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Sequence, Union
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+from ..optimizer import NUMERIC_FIELDS, QueryOptimizer, is_number, numeric_range, Range, Bound
+from .bitmap import Bitmap
+from .compiler import PredicateCompiler, COMPARISON_FUNCTIONS
+from .range_index import RangeIndex, RANGE_FIELDS
+from .records import CandidateRecord, MULTI_VALUED_FIELDS, field_attribute
+
+INDEXED_FIELDS = ('SKILLS', 'EDUCATION', 'LOCATION')
+
+RANGE_OPERATORS = frozenset({
+    ComparisonOperator.EQUALS,
+    ComparisonOperator.GREATER_THAN,
+    ComparisonOperator.LESS_THAN,
+    ComparisonOperator.GREATER_EQUAL,
+    ComparisonOperator.LESS_EQUAL,
+})
+
+# A predicate result as (ids where true, ids where false). Ids in neither are
+# unknown (SQL NULL); a false bitmap of None means it is every other live id.
+BitmapPair = Tuple[Bitmap, Optional[Bitmap]]
+
+class RangeProbe:
+    """Comparisons on one range-indexed field from a conjunction, answered by one probe"""
+    __slots__ = ('field_name', 'conditions')
+
+    def __init__(self, field_name: str, conditions: List[ComparisonCondition]):
+        self.field_name = field_name
+        self.conditions = conditions
+
+@dataclass
+class IndexFootprint:
+    records: int
+    keys: int
+    posting_bytes: int
+    live_bytes: int
+
+    @property
+    def total_bytes(self) -> int:
+        return self.posting_bytes + self.live_bytes
+
+class InvertedIndex:
+    """
+    Maps each skill name, degree and location to a bitmap of the resume ids
+    holding it. Queries evaluate as bitmap algebra: IN and OR are unions,
+    AND is an intersection and NOT a difference against the live ids.
+    YOE and SALARY comparisons are answered by RangeIndex bisection, and
+    the bounds on one of these fields within a conjunction, such as the
+    optimizer's collapsed `YOE >= 3 AND YOE < 8`, become a single probe.
+    Comparisons on fields without an index fall back to scanning the records.
+
+    Resume ids are dense SERIAL integers, so the bitmaps stay compact. The
+    index is maintained incrementally through add, update and delete.
+    """
+    def __init__(self, fields: Sequence[str] = INDEXED_FIELDS,
+                 range_fields: Sequence[str] = RANGE_FIELDS):
+        for field_name in fields:
+            field_attribute(field_name)
+        for field_name in range_fields:
+            if field_name not in NUMERIC_FIELDS:
+                raise ValueError(f"Not a numeric field: {field_name}")
+        self.postings: Dict[str, Dict[str, Bitmap]] = {name: {} for name in fields}
+        self.ranges: Dict[str, RangeIndex] = {name: RangeIndex() for name in range_fields}
+        # Ids with a non-NULL value, per single-valued indexed field
+        self.present: Dict[str, Bitmap] = {
+            name: Bitmap() for name in list(fields) + list(range_fields)
+            if name not in MULTI_VALUED_FIELDS
+        }
+        self.live = Bitmap()
+        self.records: Dict[int, CandidateRecord] = {}
+        self._compiler = PredicateCompiler()
+
+    @classmethod
+    def from_records(cls, records: Iterable[CandidateRecord],
+                     fields: Sequence[str] = INDEXED_FIELDS,
+                     range_fields: Sequence[str] = RANGE_FIELDS) -> 'InvertedIndex':
+        """Build an index in bulk, creating each bitmap and sorted array once"""
+        index = cls(fields, range_fields)
+        ids: Dict[str, Dict[str, List[int]]] = {name: {} for name in index.postings}
+        for record in records:
+            if record.id in index.records:
+                raise ValueError(f"Duplicate resume id: {record.id}")
+            index.records[record.id] = record
+            for field_name, field_ids in ids.items():
+                for value in index._values(record, field_name):
+                    field_ids.setdefault(value, []).append(record.id)
+
+        index.live = Bitmap(index.records)
+        for field_name, field_ids in ids.items():
+            index.postings[field_name] = {value: Bitmap(i) for value, i in field_ids.items()}
+            if field_name in index.present:
+                index.present[field_name] = Bitmap.union_all(index.postings[field_name].values())
+        for field_name in index.ranges:
+            attribute = field_attribute(field_name)
+            range_index = RangeIndex.from_pairs(
+                (resume_id, getattr(record, attribute)) for resume_id, record in index.records.items()
+            )
+            index.ranges[field_name] = range_index
+            index.present[field_name] = Bitmap(range_index.current)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, record: CandidateRecord) -> None:
+        """Index a resume, replacing any previous version with the same id"""
+        if record.id in self.records:
+            self.update(record)
+            return
+        self.records[record.id] = record
+        self.live.add(record.id)
+        for field_name in self.postings:
+            self._index_values(field_name, record.id, self._values(record, field_name))
+        self._set_ranges(record)
+
+    def update(self, record: CandidateRecord) -> None:
+        """Re-index a resume, touching only the postings whose values changed"""
+        previous = self.records.get(record.id)
+        if previous is None:
+            self.add(record)
+            return
+        self.records[record.id] = record
+        for field_name in self.postings:
+            old_values = self._values(previous, field_name)
+            new_values = self._values(record, field_name)
+            if old_values != new_values:
+                self._unindex_values(field_name, record.id, old_values - new_values)
+                self._index_values(field_name, record.id, new_values - old_values)
+        self._set_ranges(record)
+
+    def delete(self, resume_id: int) -> None:
+        """Remove a resume from the index; unknown ids are ignored"""
+        record = self.records.pop(resume_id, None)
+        if record is None:
+            return
+        self.live.discard(resume_id)
+        for field_name in self.postings:
+            self._unindex_values(field_name, resume_id, self._values(record, field_name))
+        for field_name, range_index in self.ranges.items():
+            range_index.remove(resume_id)
+            self.present[field_name].discard(resume_id)
+
+    def lookup(self, field_name: str, value: Any) -> Bitmap:
+        """Ids of the resumes holding a value for an indexed field"""
+        if field_name not in self.postings:
+            raise ValueError(f"Field is not indexed: {field_name}")
+        posting = self.postings[field_name].get(value)
+        return posting.copy() if posting is not None else Bitmap()
+
+    def search(self, query: Union[str, Query], optimize: bool = True) -> Bitmap:
+        """
+        Ids of the resumes matching a query. The optimizer runs first, so
+        negations reach the range indexes as plain bounds and ranges on one
+        field arrive collapsed.
+        """
+        if isinstance(query, str):
+            from ..parser.parser import parse
+            query = parse(query)
+        if optimize:
+            query = QueryOptimizer().optimize(query)
+        return self._evaluate(query.expression)[0]
+
+    def filter_records(self, query: Union[str, Query], optimize: bool = True) -> List[CandidateRecord]:
+        """Matching records in ascending id order"""
+        return [self.records[resume_id] for resume_id in self.search(query, optimize)]
+
+    def footprint(self) -> IndexFootprint:
+        """Report the memory held by the index bitmaps"""
+        posting_bytes = sum(
+            bitmap.nbytes() for postings in self.postings.values() for bitmap in postings.values()
+        )
+        posting_bytes += sum(bitmap.nbytes() for bitmap in self.present.values())
+        posting_bytes += sum(range_index.nbytes() for range_index in self.ranges.values())
+        return IndexFootprint(
+            records=len(self.records),
+            keys=sum(len(postings) for postings in self.postings.values()),
+            posting_bytes=posting_bytes,
+            live_bytes=self.live.nbytes()
+        )
+
+    def _values(self, record: CandidateRecord, field_name: str) -> frozenset:
+        value = getattr(record, field_attribute(field_name))
+        if field_name in MULTI_VALUED_FIELDS:
+            return frozenset(value)
+        return frozenset() if value is None else frozenset([value])
+
+    def _set_ranges(self, record: CandidateRecord) -> None:
+        for field_name, range_index in self.ranges.items():
+            value = getattr(record, field_attribute(field_name))
+            range_index.set(record.id, value)
+            if value is None:
+                self.present[field_name].discard(record.id)
+            else:
+                self.present[field_name].add(record.id)
+
+    def _index_values(self, field_name: str, resume_id: int, values: Iterable[str]) -> None:
+        postings = self.postings[field_name]
+        for value in values:
+            posting = postings.get(value)
+            if posting is None:
+                posting = postings[value] = Bitmap()
+            posting.add(resume_id)
+            if field_name in self.present:
+                self.present[field_name].add(resume_id)
+
+    def _unindex_values(self, field_name: str, resume_id: int, values: Iterable[str]) -> None:
+        postings = self.postings[field_name]
+        for value in values:
+            posting = postings[value]
+            posting.discard(resume_id)
+            if not posting:
+                del postings[value]
+            if field_name in self.present:
+                self.present[field_name].discard(resume_id)
+
+    def _evaluate(self, node: Node) -> BitmapPair:
+        # Post-order walk over an explicit stack, as in ColumnarExecutor. Items
+        # are nodes to evaluate or (operator, count) steps combining results.
+        results: List[BitmapPair] = []
+        stack: List[Any] = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, tuple):
+                logical, count = item
+                if logical == LogicalOperator.NOT:
+                    true, false = results.pop()
+                    results.append((self.live - true, None) if false is None else (false, true))
+                elif count > 1:
+                    operands = results[-count:]
+                    del results[-count:]
+                    results.append(self._combine(logical, operands))
+            elif isinstance(item, ComparisonCondition):
+                results.append(self._compare(item))
+            elif isinstance(item, RangeProbe):
+                results.append(self._probe(item.field_name, numeric_range(item.conditions)))
+            elif isinstance(item, Constant):
+                results.append((self.live.copy() if item.value else Bitmap(), None))
+            elif isinstance(item, LogicalExpression):
+                operands = item.operands
+                if item.operator == LogicalOperator.AND and self.ranges:
+                    operands = self._group_ranges(operands)
+                stack.append((item.operator, len(operands)))
+                stack.extend(reversed(operands))
+            else:
+                raise ValueError(f"Unexpected node type: {type(item)}")
+        return results[0]
+
+    def _group_ranges(self, operands: List[Any]) -> List[Any]:
+        """Replace the numeric bounds on each range-indexed field with one RangeProbe"""
+        groups: Dict[str, List[ComparisonCondition]] = {}
+        others: List[Any] = []
+        for operand in operands:
+            if (isinstance(operand, ComparisonCondition)
+                    and operand.field.name in self.ranges
+                    and operand.operator in RANGE_OPERATORS
+                    and isinstance(operand.value, Value)
+                    and is_number(operand.value.value)):
+                groups.setdefault(operand.field.name, []).append(operand)
+            else:
+                others.append(operand)
+        if not any(len(conditions) > 1 for conditions in groups.values()):
+            return operands
+        return [RangeProbe(name, conditions) for name, conditions in groups.items()] + others
+
+    def _combine(self, logical: LogicalOperator, operands: List[BitmapPair]) -> BitmapPair:
+        """AND is true when all operands are true and false when any is false; OR is the dual"""
+        if logical == LogicalOperator.AND:
+            true = self._intersect_all([t for t, _ in operands])
+        else:
+            true = Bitmap.union_all(t for t, _ in operands)
+        if all(f is None for _, f in operands):
+            return true, None
+
+        falses = [self.live - t if f is None else f for t, f in operands]
+        if logical == LogicalOperator.AND:
+            return true, Bitmap.union_all(falses)
+        return true, self._intersect_all(falses)
+
+    def _intersect_all(self, bitmaps: List[Bitmap]) -> Bitmap:
+        # Smallest first keeps the intermediate results small
+        bitmaps = sorted(bitmaps, key=lambda bitmap: len(bitmap.chunks))
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        return result
+
+    def _compare(self, condition: ComparisonCondition) -> BitmapPair:
+        name = condition.field.name
+        field_attribute(name)  # rejects unknown fields
+        if name in self.ranges:
+            return self._compare_range(condition)
+        if name not in self.postings:
+            return self._scan(condition)
+
+        comparison = condition.operator
+        value = condition.value
+        postings = self.postings[name]
+        if comparison == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            matching = [postings.get(v.value) for v in value.values]
+        elif comparison in COMPARISON_FUNCTIONS:
+            if not isinstance(value, Value):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            if comparison == ComparisonOperator.EQUALS:
+                matching = [postings.get(value.value)]
+            else:
+                compare = COMPARISON_FUNCTIONS[comparison]
+                literal = value.value
+                matching = [posting for key, posting in postings.items() if compare(key, literal)]
+        else:
+            raise ValueError(f"Unknown operator: {comparison}")
+
+        true = Bitmap.union_all(posting for posting in matching if posting is not None)
+        if name in MULTI_VALUED_FIELDS:
+            # A resume matches when any of its values does; never unknown
+            return true, None
+        return true, self.present[name] - true
+
+    def _compare_range(self, condition: ComparisonCondition) -> BitmapPair:
+        name = condition.field.name
+        comparison = condition.operator
+        value = condition.value
+        if comparison == ComparisonOperator.IN:
+            if not isinstance(value, SetLiteral):
+                raise ValueError(f"Unexpected value type: {type(value)}")
+            # Only numbers can equal a numeric column
+            points = [v.value for v in value.values if isinstance(v.value, (int, float))]
+            range_index = self.ranges[name]
+            true = Bitmap(
+                resume_id for point in points
+                for resume_id in range_index.range_ids(_point_range(point))
+            )
+            return true, self.present[name] - true
+        if comparison not in COMPARISON_FUNCTIONS:
+            raise ValueError(f"Unknown operator: {comparison}")
+        if not isinstance(value, Value):
+            raise ValueError(f"Unexpected value type: {type(value)}")
+
+        literal = value.value
+        if comparison in (ComparisonOperator.EQUALS, ComparisonOperator.NOT_EQUALS):
+            if isinstance(literal, (int, float)):
+                true, false = self._probe(name, _point_range(literal))
+            else:
+                true, false = Bitmap(), self.present[name].copy()
+            if comparison == ComparisonOperator.NOT_EQUALS:
+                return (self.live - true if false is None else false), true
+            return true, false
+        return self._probe(name, numeric_range([condition]))
+
+    def _probe(self, field_name: str, interval: Range) -> BitmapPair:
+        """Ids inside the interval are true; ids with a value outside it are false"""
+        range_index = self.ranges[field_name]
+        if len(range_index) == len(self.records):
+            # No NULLs, so every other live id is false
+            return range_index.probe(interval), None
+        return range_index.probe(interval), range_index.probe_outside(interval)
+
+    def _scan(self, condition: ComparisonCondition) -> BitmapPair:
+        """Evaluate a comparison on an unindexed field by testing every record"""
+        is_true = self._compiler.compile(Query(condition))
+        true = Bitmap(resume_id for resume_id, record in self.records.items() if is_true(record))
+        if condition.field.name in MULTI_VALUED_FIELDS:
+            return true, None
+        is_false = self._compiler.compile(Query(LogicalExpression(LogicalOperator.NOT, condition)))
+        false = Bitmap(resume_id for resume_id, record in self.records.items() if is_false(record))
+        return true, false
+
+def _point_range(value: Any) -> Range:
+    return Range(Bound(value, True), Bound(value, True))
@@ -0,0 +1,260 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set, Hashable, Union
+from ..parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+from ..fields import FIELDS
+from ..optimizer import NUMERIC_FIELDS, QueryOptimizer, is_number
+from .compiler import PredicateCompiler, Predicate
+from .records import CandidateRecord
+
+# An anchor is a condition a record must meet for a query to match it:
+# ('term', field, value) for an equality, ('lower', field, value, inclusive)
+# and ('upper', field, value, inclusive) for numeric bounds.
+Anchor = Tuple[Any, ...]
+
+# Anchors that are numeric bounds cost more to look up than exact terms
+RANGE_ANCHOR_COST = 64
+
+def _cost(anchors: Set[Anchor]) -> int:
+    return sum(RANGE_ANCHOR_COST if anchor[0] != 'term' else 1 for anchor in anchors)
+
+def required_anchors(root: Node) -> Optional[Set[Anchor]]:
+    """
+    Anchors of which a record must satisfy at least one for the node to be
+    true, or None when the node gives no such guarantee. An empty set means
+    the node can never be true. Works bottom-up with an explicit stack, so
+    machine-generated searches can nest to any depth.
+    """
+    # Tasks are ('visit', node) or ('combine', operator, operand_count)
+    tasks: List[Tuple[Any, ...]] = [('visit', root)]
+    results: List[Optional[Set[Anchor]]] = []
+    while tasks:
+        task = tasks.pop()
+        if task[0] == 'combine':
+            _, operator, count = task
+            operand_anchors = results[len(results) - count:]
+            del results[len(results) - count:]
+            results.append(_combine_anchors(operator, operand_anchors))
+            continue
+
+        node = task[1]
+        if isinstance(node, Constant):
+            results.append(None if node.value else set())
+        elif isinstance(node, ComparisonCondition):
+            results.append(_comparison_anchors(node))
+        elif not isinstance(node, LogicalExpression) or node.operator == LogicalOperator.NOT:
+            results.append(None)
+        else:
+            operands = node.operands
+            tasks.append(('combine', node.operator, len(operands)))
+            tasks.extend(('visit', operand) for operand in reversed(operands))
+    return results[0]
+
+def _combine_anchors(operator: LogicalOperator,
+                     operand_anchors: List[Optional[Set[Anchor]]]) -> Optional[Set[Anchor]]:
+    if operator == LogicalOperator.OR:
+        # Some operand must be true
+        if any(anchors is None for anchors in operand_anchors):
+            return None
+        return set().union(*operand_anchors)
+
+    # Every operand must be true, so the cheapest operand's anchors suffice
+    known = [anchors for anchors in operand_anchors if anchors is not None]
+    if not known:
+        return None
+    return min(known, key=_cost)
+
+def anchors_are_exact(root: Node) -> bool:
+    """Whether satisfying one of the node's anchors already makes it true"""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, LogicalExpression) and node.operator == LogicalOperator.OR:
+            stack.extend(node.operands)
+        elif not isinstance(node, ComparisonCondition) or _comparison_anchors(node) is None:
+            return False
+    return True
+
+def _comparison_anchors(condition: ComparisonCondition) -> Optional[Set[Anchor]]:
+    name = condition.field.name
+    comparison = condition.operator
+    value = condition.value
+    if comparison == ComparisonOperator.IN and isinstance(value, SetLiteral):
+        return {('term', name, v.value) for v in value.values}
+    if not isinstance(value, Value):
+        return None
+    if comparison == ComparisonOperator.EQUALS:
+        return {('term', name, value.value)}
+    if name in NUMERIC_FIELDS and is_number(value.value):
+        if comparison == ComparisonOperator.GREATER_THAN:
+            return {('lower', name, value.value, False)}
+        if comparison == ComparisonOperator.GREATER_EQUAL:
+            return {('lower', name, value.value, True)}
+        if comparison == ComparisonOperator.LESS_THAN:
+            return {('upper', name, value.value, False)}
+        if comparison == ComparisonOperator.LESS_EQUAL:
+            return {('upper', name, value.value, True)}
+    return None
+
+class BoundIndex:
+    """
+    Numeric bounds of registered queries on one field, kept sorted so the
+    bounds a value satisfies form a prefix (lower bounds) or suffix (upper
+    bounds) found by bisection.
+    """
+    def __init__(self, lower: bool):
+        self.lower = lower
+        self.keys: List[Tuple[Any, int]] = []
+        self.query_ids: List[Hashable] = []
+
+    def _key(self, value: Any, inclusive: bool) -> Tuple[Any, int]:
+        # Sorting inclusive lower bounds before exclusive ones at the same
+        # value (and the reverse for upper bounds) keeps the matches contiguous
+        return (value, int(not inclusive) if self.lower else int(inclusive))
+
+    def add(self, value: Any, inclusive: bool, query_id: Hashable) -> None:
+        key = self._key(value, inclusive)
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.query_ids.insert(position, query_id)
+
+    def remove(self, value: Any, inclusive: bool, query_id: Hashable) -> None:
+        key = self._key(value, inclusive)
+        position = bisect_left(self.keys, key)
+        while self.query_ids[position] != query_id:
+            position += 1
+        del self.keys[position]
+        del self.query_ids[position]
+
+    def satisfied_by(self, value: Any) -> List[Hashable]:
+        """Query ids whose bound the value satisfies"""
+        if self.lower:
+            return self.query_ids[:bisect_left(self.keys, (value, 1))]
+        return self.query_ids[bisect_right(self.keys, (value, 0)):]
+
+@dataclass
+class PercolatorStats:
+    queries: int
+    anchored: int
+    unanchored: int
+    terms: int
+
+class Percolator:
+    """
+    Reverse matching for saved searches: registered queries are indexed by
+    the predicates a resume must satisfy for them to match, such as a skill
+    name or a YOE threshold. A resume is then tested only against the
+    queries one of its values can satisfy, plus the few queries that have
+    no such predicate, using the compiled predicate of each candidate.
+    Queries that are nothing but their anchors match without a test.
+    """
+    def __init__(self, optimize: bool = True):
+        self.optimize = optimize
+        self.predicates: Dict[Hashable, Predicate] = {}
+        self.terms: Dict[Tuple[str, Any], Set[Hashable]] = {}
+        self.lower_bounds: Dict[str, BoundIndex] = {}
+        self.upper_bounds: Dict[str, BoundIndex] = {}
+        self.unanchored: Set[Hashable] = set()
+        self.exact: Set[Hashable] = set()
+        self._anchors: Dict[Hashable, Optional[Set[Anchor]]] = {}
+        self._compiler = PredicateCompiler()
+
+    def __len__(self) -> int:
+        return len(self.predicates)
+
+    def __contains__(self, query_id: Hashable) -> bool:
+        return query_id in self.predicates
+
+    def register(self, query_id: Hashable, query: Union[str, Query]) -> None:
+        """Store a saved search, replacing any query registered under the same id"""
+        if isinstance(query, str):
+            from ..parser.parser import parse
+            query = parse(query)
+        if self.optimize:
+            query = QueryOptimizer().optimize(query)
+        predicate = self._compiler.compile(query)
+        anchors = required_anchors(query.expression)
+
+        self.unregister(query_id)
+        self.predicates[query_id] = predicate
+        self._anchors[query_id] = anchors
+        if anchors is None:
+            self.unanchored.add(query_id)
+            return
+        if anchors_are_exact(query.expression):
+            self.exact.add(query_id)
+        for anchor in anchors:
+            if anchor[0] == 'term':
+                self.terms.setdefault((anchor[1], anchor[2]), set()).add(query_id)
+            else:
+                kind, name, value, inclusive = anchor
+                bounds = self.lower_bounds if kind == 'lower' else self.upper_bounds
+                if name not in bounds:
+                    bounds[name] = BoundIndex(lower=kind == 'lower')
+                bounds[name].add(value, inclusive, query_id)
+
+    def unregister(self, query_id: Hashable) -> None:
+        """Remove a saved search; unknown ids are ignored"""
+        if query_id not in self.predicates:
+            return
+        del self.predicates[query_id]
+        self.exact.discard(query_id)
+        anchors = self._anchors.pop(query_id)
+        if anchors is None:
+            self.unanchored.discard(query_id)
+            return
+        for anchor in anchors:
+            if anchor[0] == 'term':
+                key = (anchor[1], anchor[2])
+                self.terms[key].discard(query_id)
+                if not self.terms[key]:
+                    del self.terms[key]
+            else:
+                kind, name, value, inclusive = anchor
+                bounds = self.lower_bounds if kind == 'lower' else self.upper_bounds
+                bounds[name].remove(value, inclusive, query_id)
+
+    def candidates(self, record: CandidateRecord) -> Set[Hashable]:
+        """Ids of the queries that may match the record and need testing"""
+        found = set(self.unanchored)
+        terms = self.terms
+        for name, spec in FIELDS.items():
+            value = getattr(record, spec.attribute)
+            if value is None:
+                continue
+            values = value if spec.multi_valued else (value,)
+            for v in values:
+                query_ids = terms.get((name, v))
+                if query_ids:
+                    found.update(query_ids)
+            if spec.numeric:
+                if name in self.lower_bounds:
+                    found.update(self.lower_bounds[name].satisfied_by(value))
+                if name in self.upper_bounds:
+                    found.update(self.upper_bounds[name].satisfied_by(value))
+        return found
+
+    def match(self, record: CandidateRecord) -> Set[Hashable]:
+        """Ids of the saved searches the record satisfies"""
+        predicates = self.predicates
+        exact = self.exact
+        return {
+            query_id for query_id in self.candidates(record)
+            if query_id in exact or predicates[query_id](record)
+        }
+
+    def match_many(self, records: Iterable[CandidateRecord]) -> Dict[int, Set[Hashable]]:
+        """Matching saved searches per resume id, e.g. for a batch of inserted or updated resumes"""
+        return {record.id: self.match(record) for record in records}
+
+    def stats(self) -> PercolatorStats:
+        return PercolatorStats(
+            queries=len(self.predicates),
+            anchored=len(self.predicates) - len(self.unanchored),
+            unanchored=len(self.unanchored),
+            terms=len(self.terms)
+        )
@@ -0,0 +1,131 @@
+import sys
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set
+from ..fields import FIELDS, NUMERIC_FIELDS
+from ..optimizer import Range, Bound
+from .bitmap import Bitmap
+
+# Numeric fields given a RangeIndex by InvertedIndex
+RANGE_FIELDS = tuple(name for name in FIELDS if name in NUMERIC_FIELDS)
+
+_value_of = itemgetter(0)
+
+def _span(values: List[Any], interval: Range, key=None) -> Tuple[int, int]:
+    """Positions [start, end) of the sorted values falling in the interval"""
+    start, end = 0, len(values)
+    if interval.lower is not None:
+        find = bisect_left if interval.lower.inclusive else bisect_right
+        start = find(values, interval.lower.value, key=key)
+    if interval.upper is not None:
+        find = bisect_right if interval.upper.inclusive else bisect_left
+        end = find(values, interval.upper.value, key=key)
+    return start, max(start, end)
+
+class RangeIndex:
+    """
+    Sorted index of (value, resume id) pairs for one numeric field, answering
+    range comparisons by bisection. Updates go to a small sorted delta buffer
+    and removals of merged entries are recorded as tombstones; both are
+    folded into the main arrays once the buffer outgrows both max_delta and
+    1/16 of the main arrays, so merge costs stay amortized and a stream of
+    updates never forces a full re-sort per change. NULL values
+    are not indexed, so they match neither a range nor its complement.
+    """
+    def __init__(self, max_delta: int = 4096):
+        self.max_delta = max_delta
+        self.values: List[Any] = []
+        self.ids: List[int] = []
+        self.delta: List[Tuple[Any, int]] = []
+        self.deleted: Set[int] = set()
+        self.current: Dict[int, Any] = {}
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[int, Any]], max_delta: int = 4096) -> 'RangeIndex':
+        """Build an index from (resume id, value) pairs in one sort"""
+        index = cls(max_delta)
+        entries = sorted((value, resume_id) for resume_id, value in pairs if value is not None)
+        index.values = [value for value, _ in entries]
+        index.ids = [resume_id for _, resume_id in entries]
+        index.current = {resume_id: value for value, resume_id in entries}
+        return index
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+    def set(self, resume_id: int, value: Optional[Any]) -> None:
+        """Index a resume's value, replacing the previous one; None removes it"""
+        previous = self.current.get(resume_id)
+        if previous is not None:
+            if previous == value:
+                return
+            self.remove(resume_id)
+        if value is None:
+            return
+        self.current[resume_id] = value
+        insort(self.delta, (value, resume_id))
+        pending = len(self.delta) + len(self.deleted)
+        if pending > self.max_delta and pending > len(self.values) >> 4:
+            self.merge()
+
+    def remove(self, resume_id: int) -> None:
+        value = self.current.pop(resume_id, None)
+        if value is None:
+            return
+        position = bisect_left(self.delta, (value, resume_id))
+        if position < len(self.delta) and self.delta[position] == (value, resume_id):
+            del self.delta[position]
+        else:
+            self.deleted.add(resume_id)
+
+    def merge(self) -> None:
+        """Fold the delta buffer and tombstones into the main sorted arrays"""
+        if self.deleted:
+            deleted = self.deleted
+            kept = [(v, i) for v, i in zip(self.values, self.ids) if i not in deleted]
+        else:
+            kept = list(zip(self.values, self.ids))
+        # Timsort merges the two sorted runs in linear time
+        kept.extend(self.delta)
+        kept.sort()
+        self.values = [value for value, _ in kept]
+        self.ids = [resume_id for _, resume_id in kept]
+        self.delta = []
+        self.deleted = set()
+
+    def range_ids(self, interval: Range) -> List[int]:
+        """Ids whose value lies in the interval"""
+        if interval.is_empty:
+            return []
+        start, end = _span(self.values, interval)
+        ids = self.ids[start:end]
+        if self.deleted:
+            deleted = self.deleted
+            ids = [resume_id for resume_id in ids if resume_id not in deleted]
+        if self.delta:
+            start, end = _span(self.delta, interval, key=_value_of)
+            ids.extend(resume_id for _, resume_id in self.delta[start:end])
+        return ids
+
+    def probe(self, interval: Range) -> Bitmap:
+        """Bitmap of the ids whose value lies in the interval"""
+        return Bitmap(self.range_ids(interval))
+
+    def probe_outside(self, interval: Range) -> Bitmap:
+        """Bitmap of the ids with a non-NULL value outside the interval"""
+        ids: List[int] = []
+        if interval.is_empty:
+            return Bitmap(self.current)
+        if interval.lower is not None:
+            ids += self.range_ids(Range(upper=Bound(interval.lower.value, not interval.lower.inclusive)))
+        if interval.upper is not None:
+            ids += self.range_ids(Range(lower=Bound(interval.upper.value, not interval.upper.inclusive)))
+        return Bitmap(ids)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the sorted arrays, delta buffer and id map"""
+        total = sys.getsizeof(self.values) + sys.getsizeof(self.ids) + sys.getsizeof(self.current)
+        total += sys.getsizeof(self.delta) + sys.getsizeof(self.deleted)
+        # Values and ids are shared with the id map, so count them once
+        total += sum(sys.getsizeof(v) + sys.getsizeof(i) for i, v in self.current.items())
+        return total
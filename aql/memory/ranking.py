@@ -0,0 +1,78 @@
+import heapq
+from typing import List, Callable, Iterable, Optional, Tuple, Union
+from ..parser.ast import Query, ComparisonCondition, SetLiteral
+from ..scoring import ScoreSpec, Closeness, score_terms
+from .compiler import PredicateCompiler, COMPARISON_FUNCTIONS
+from .records import CandidateRecord, MULTI_VALUED_FIELDS, field_attribute
+
+Term = Callable[[CandidateRecord], float]
+
+class Scorer:
+    """
+    Relevance score of a record for a query under a ScoreSpec, computed the
+    way the SQL translation does: each term in query order, then closeness.
+    """
+    def __init__(self, query: Query, spec: Optional[ScoreSpec] = None):
+        spec = spec or ScoreSpec()
+        compiler = PredicateCompiler()
+        self.terms: List[Term] = [
+            self._condition_term(condition, weight, compiler)
+            for condition, weight in score_terms(query.expression, spec)
+        ]
+        self.terms += [self._closeness_term(closeness) for closeness in spec.closeness]
+
+    def __call__(self, record: CandidateRecord) -> float:
+        score = 0
+        for term in self.terms:
+            score += term(record)
+        return score
+
+    def _condition_term(self, condition: ComparisonCondition, weight: float,
+                        compiler: PredicateCompiler) -> Term:
+        name = condition.field.name
+        if name not in MULTI_VALUED_FIELDS:
+            predicate = compiler.compile(Query(condition))
+            return lambda record: weight if predicate(record) else 0
+
+        # Count the candidate's values that satisfy the condition
+        attribute = field_attribute(name)
+        value = condition.value
+        if isinstance(value, SetLiteral):
+            wanted = frozenset(v.value for v in value.values)
+            return lambda record: weight * len(wanted.intersection(getattr(record, attribute)))
+        compare = COMPARISON_FUNCTIONS[condition.operator]
+        literal = value.value
+        return lambda record: weight * sum(1 for v in getattr(record, attribute) if compare(v, literal))
+
+    def _closeness_term(self, closeness: Closeness) -> Term:
+        attribute = field_attribute(closeness.field)
+        target, scale, weight = closeness.target, float(closeness.scale), closeness.weight
+
+        def term(record: CandidateRecord) -> float:
+            value = getattr(record, attribute)
+            if value is None:
+                return 0
+            distance = abs(float(value) - target)
+            return 0 if distance >= scale else weight * (1 - distance / scale)
+        return term
+
+def top_k(
+    query: Union[str, Query],
+    records: Iterable[CandidateRecord],
+    k: int,
+    spec: Optional[ScoreSpec] = None
+) -> List[Tuple[float, CandidateRecord]]:
+    """
+    The k matching records with the highest scores, as (score, record)
+    pairs by decreasing score and then increasing id. Matches stream
+    through a heap of k entries, so the match set is never sorted.
+    """
+    if k <= 0:
+        raise ValueError("k must be positive")
+    if isinstance(query, str):
+        from ..parser.parser import parse
+        query = parse(query)
+    predicate = PredicateCompiler().compile(query)
+    scorer = Scorer(query, spec)
+    scored = ((scorer(record), record) for record in records if predicate(record))
+    return heapq.nlargest(k, scored, key=lambda item: (item[0], -item[1].id))
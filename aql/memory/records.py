@@ -0,0 +1,52 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Any, Optional, Union, FrozenSet, Iterable
+# Multi-valued fields are stored as a set of values per candidate
+from ..fields import FIELDS, MULTI_VALUED_FIELDS, get_field_spec
+
+Number = Union[int, float, Decimal]
+
+@dataclass
+class CandidateRecord:
+    """
+    In-memory mirror of a `resumes` row together with its skill names
+    (via resume_skills/skills) and degrees (from education)
+    """
+    id: int
+    name: str = ''
+    email: str = ''
+    phone: Optional[str] = None
+    location: Optional[str] = None
+    years_of_experience: Optional[Number] = None
+    current_salary: Optional[Number] = None
+    experience_level: Optional[str] = None
+    skills: FrozenSet[str] = field(default_factory=frozenset)
+    education: FrozenSet[str] = field(default_factory=frozenset)
+
+    @classmethod
+    def from_row(
+        cls,
+        row: Dict[str, Any],
+        skills: Iterable[str] = (),
+        education: Iterable[str] = ()
+    ) -> 'CandidateRecord':
+        """Build a record from a `resumes` row mapping plus its skill names and degrees"""
+        return cls(
+            id=row['id'],
+            name=row.get('name', ''),
+            email=row.get('email', ''),
+            phone=row.get('phone'),
+            location=row.get('location'),
+            years_of_experience=row.get('years_of_experience'),
+            current_salary=row.get('current_salary'),
+            experience_level=row.get('experience_level'),
+            skills=frozenset(skills),
+            education=frozenset(education)
+        )
+
+# AQL field -> CandidateRecord attribute
+FIELD_ATTRIBUTES = {name: spec.attribute for name, spec in FIELDS.items()}
+
+def field_attribute(field_name: str) -> str:
+    """Get the record attribute for an AQL field name"""
+    return get_field_spec(field_name).attribute
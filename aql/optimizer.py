@@ -0,0 +1,461 @@
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator, Hashable, Callable
+from .parser.ast import (
+    Node, Query, LogicalExpression, ComparisonCondition,
+    Identifier, Value, SetLiteral, Constant,
+    ComparisonOperator, LogicalOperator
+)
+# Numeric fields are eligible for range collapsing. Conjunctions over
+# single-valued fields can be intersected; SKILLS and EDUCATION hold
+# several values and cannot.
+from .fields import NUMERIC_FIELDS, SINGLE_VALUED_FIELDS
+
+# Comparison that holds exactly when the original does not (for a non-NULL value)
+NEGATED_OPERATORS = {
+    ComparisonOperator.EQUALS: ComparisonOperator.NOT_EQUALS,
+    ComparisonOperator.NOT_EQUALS: ComparisonOperator.EQUALS,
+    ComparisonOperator.GREATER_THAN: ComparisonOperator.LESS_EQUAL,
+    ComparisonOperator.LESS_EQUAL: ComparisonOperator.GREATER_THAN,
+    ComparisonOperator.LESS_THAN: ComparisonOperator.GREATER_EQUAL,
+    ComparisonOperator.GREATER_EQUAL: ComparisonOperator.LESS_THAN,
+}
+
+LOWER_BOUND_OPERATORS = (ComparisonOperator.GREATER_THAN, ComparisonOperator.GREATER_EQUAL)
+UPPER_BOUND_OPERATORS = (ComparisonOperator.LESS_THAN, ComparisonOperator.LESS_EQUAL)
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def literal_key(value: Any) -> Hashable:
+    """Hashable key for a literal that treats 5 and 5.0 alike but keeps TRUE apart from 1"""
+    if is_number(value):
+        return ('number', value)
+    return (type(value), value)
+
+def _leaf_key(node: Node) -> Hashable:
+    if isinstance(node, ComparisonCondition):
+        if isinstance(node.value, SetLiteral):
+            value = ('set',) + tuple(literal_key(v.value) for v in node.value.values)
+        else:
+            value = literal_key(node.value.value)
+        return (node.field.name, node.operator, value)
+    if isinstance(node, Constant):
+        return ('constant', node.value)
+    return ('node', id(node))
+
+def _postorder(root: Node, known: Callable[[Node], bool]) -> Iterator[Node]:
+    """Operands before the expressions holding them, skipping subtrees for which known(node) holds"""
+    stack: List[Tuple[Node, bool]] = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        elif not known(node):
+            stack.append((node, True))
+            if isinstance(node, LogicalExpression):
+                stack.extend((operand, False) for operand in reversed(node.operands))
+
+def node_key(node: Node) -> Hashable:
+    """Structural key for detecting repeated predicates"""
+    keys: Dict[int, Hashable] = {}
+    for current in _postorder(node, lambda n: id(n) in keys):
+        if isinstance(current, LogicalExpression):
+            keys[id(current)] = (current.operator,) + tuple(keys[id(operand)] for operand in current.operands)
+        else:
+            keys[id(current)] = _leaf_key(current)
+    return keys[id(node)]
+
+class SubtreeKeys:
+    """
+    Interned structural keys: equal subtrees get the same integer. A
+    subtree is keyed once, from the keys of its operands, so keying every
+    level of a deeply nested expression stays linear.
+    """
+    def __init__(self):
+        self._interned: Dict[Hashable, int] = {}
+        # id(node) -> (node, key); holding the node keeps its id from being reused
+        self._nodes: Dict[int, Tuple[Node, int]] = {}
+
+    def key(self, node: Node) -> int:
+        known = self._nodes.get(id(node))
+        if known is not None:
+            return known[1]
+        nodes = self._nodes
+        for current in _postorder(node, lambda n: id(n) in nodes):
+            if isinstance(current, LogicalExpression):
+                shape = (current.operator,) + tuple(nodes[id(operand)][1] for operand in current.operands)
+            else:
+                shape = _leaf_key(current)
+            nodes[id(current)] = (current, self._interned.setdefault(shape, len(self._interned)))
+        return nodes[id(node)][1]
+
+@dataclass
+class Bound:
+    """One end of a numeric range"""
+    value: Any
+    inclusive: bool
+
+    def tighter_lower(self, other: 'Bound') -> 'Bound':
+        if self.value != other.value:
+            return self if self.value > other.value else other
+        return self if not self.inclusive else other
+
+    def tighter_upper(self, other: 'Bound') -> 'Bound':
+        if self.value != other.value:
+            return self if self.value < other.value else other
+        return self if not self.inclusive else other
+
+    def looser_lower(self, other: 'Bound') -> 'Bound':
+        if self.value != other.value:
+            return self if self.value < other.value else other
+        return self if self.inclusive else other
+
+    def looser_upper(self, other: 'Bound') -> 'Bound':
+        if self.value != other.value:
+            return self if self.value > other.value else other
+        return self if self.inclusive else other
+
+@dataclass
+class Range:
+    """Numeric interval implied by comparisons on one field; None means unbounded"""
+    lower: Optional[Bound] = None
+    upper: Optional[Bound] = None
+
+    def add(self, operator: ComparisonOperator, value: Any) -> None:
+        """Intersect the range with a single comparison"""
+        if operator in LOWER_BOUND_OPERATORS:
+            bound = Bound(value, operator == ComparisonOperator.GREATER_EQUAL)
+            self.lower = bound if self.lower is None else self.lower.tighter_lower(bound)
+        elif operator in UPPER_BOUND_OPERATORS:
+            bound = Bound(value, operator == ComparisonOperator.LESS_EQUAL)
+            self.upper = bound if self.upper is None else self.upper.tighter_upper(bound)
+        elif operator == ComparisonOperator.EQUALS:
+            self.add(ComparisonOperator.GREATER_EQUAL, value)
+            self.add(ComparisonOperator.LESS_EQUAL, value)
+        else:
+            raise ValueError(f"Not a range operator: {operator}")
+
+    @property
+    def is_empty(self) -> bool:
+        if self.lower is None or self.upper is None:
+            return False
+        if self.lower.value != self.upper.value:
+            return self.lower.value > self.upper.value
+        return not (self.lower.inclusive and self.upper.inclusive)
+
+    def contains(self, value: Any) -> bool:
+        if self.lower is not None:
+            if value < self.lower.value or (value == self.lower.value and not self.lower.inclusive):
+                return False
+        if self.upper is not None:
+            if value > self.upper.value or (value == self.upper.value and not self.upper.inclusive):
+                return False
+        return True
+
+    def conditions(self, field_name: str) -> List[ComparisonCondition]:
+        """Smallest list of comparisons describing the range"""
+        if (self.lower is not None and self.upper is not None
+                and self.lower.value == self.upper.value):
+            return [comparison(field_name, ComparisonOperator.EQUALS, self.lower.value)]
+        conditions = []
+        if self.lower is not None:
+            operator = (ComparisonOperator.GREATER_EQUAL if self.lower.inclusive
+                        else ComparisonOperator.GREATER_THAN)
+            conditions.append(comparison(field_name, operator, self.lower.value))
+        if self.upper is not None:
+            operator = (ComparisonOperator.LESS_EQUAL if self.upper.inclusive
+                        else ComparisonOperator.LESS_THAN)
+            conditions.append(comparison(field_name, operator, self.upper.value))
+        return conditions
+
+def comparison(field_name: str, operator: ComparisonOperator, value: Any) -> ComparisonCondition:
+    return ComparisonCondition(Identifier(field_name), operator, Value(value))
+
+def membership(field_name: str, values: List[Any]) -> ComparisonCondition:
+    """Equality for a single value, IN for several"""
+    if len(values) == 1:
+        return comparison(field_name, ComparisonOperator.EQUALS, values[0])
+    return ComparisonCondition(
+        Identifier(field_name), ComparisonOperator.IN, SetLiteral([Value(v) for v in values])
+    )
+
+def numeric_range(conditions: Iterable[ComparisonCondition]) -> Range:
+    """Intersect numeric comparisons on one field into a single range"""
+    interval = Range()
+    for condition in conditions:
+        interval.add(condition.operator, condition.value.value)
+    return interval
+
+class QueryOptimizer:
+    """
+    Algebraic rewrites over the AST, run between parsing and translation:
+    - NOT is pushed down with De Morgan's laws, so `NOT YOE > 5` becomes `YOE <= 5`
+    - nested AND/OR are flattened and repeated predicates removed
+    - equalities on one field joined by OR are merged into a single IN
+    - comparisons on one numeric field are collapsed into one range
+    - contradictions such as `YOE > 10 AND YOE < 3` fold to Constant(False)
+
+    Rewrites keep SQL three-valued semantics: a row matches the optimized
+    query exactly when it matches the original. NOT is never pushed into
+    SKILLS/EDUCATION predicates, whose negation means "has no such value".
+    """
+    def __init__(
+        self,
+        numeric_fields: Iterable[str] = NUMERIC_FIELDS,
+        single_valued_fields: Iterable[str] = SINGLE_VALUED_FIELDS
+    ):
+        self.numeric_fields = frozenset(numeric_fields)
+        self.single_valued_fields = frozenset(single_valued_fields)
+
+    def optimize(self, query: Query) -> Query:
+        # Ordering and LIMIT apply to the result and are kept as written
+        return Query(self.optimize_node(query.expression), list(query.order_by), query.limit)
+
+    def optimize_node(self, root: Node) -> Node:
+        """Rewrite an expression bottom-up with an explicit stack"""
+        # Tasks are ('visit', node, negated) or ('combine', operator, operand_count)
+        tasks: List[Tuple[str, Any, Any]] = [('visit', root, False)]
+        results: List[Node] = []
+        keys = SubtreeKeys()
+
+        while tasks:
+            kind, node, arg = tasks.pop()
+            if kind == 'combine':
+                count = arg
+                operands = results[len(results) - count:]
+                del results[len(results) - count:]
+                results.append(self._simplify(node, operands, keys))
+                continue
+
+            negated = arg
+            if isinstance(node, LogicalExpression):
+                if node.operator == LogicalOperator.NOT:
+                    tasks.append(('visit', node.left, not negated))
+                    continue
+                operator = node.operator
+                if negated:
+                    operator = LogicalOperator.OR if operator == LogicalOperator.AND else LogicalOperator.AND
+                operands = node.operands
+                tasks.append(('combine', operator, len(operands)))
+                for operand in reversed(operands):
+                    tasks.append(('visit', operand, negated))
+            elif isinstance(node, ComparisonCondition):
+                results.append(self._negate(node) if negated else node)
+            elif isinstance(node, Constant):
+                results.append(Constant(not node.value) if negated else node)
+            else:
+                raise ValueError(f"Unexpected node type: {type(node)}")
+
+        return results[0]
+
+    def _negate(self, condition: ComparisonCondition) -> Node:
+        """Negate a comparison, inverting its operator where that is equivalent"""
+        name = condition.field.name
+        if name in self.single_valued_fields and condition.operator in NEGATED_OPERATORS:
+            return ComparisonCondition(condition.field, NEGATED_OPERATORS[condition.operator], condition.value)
+        return LogicalExpression(operator=LogicalOperator.NOT, left=condition)
+
+    def _simplify(self, operator: LogicalOperator, operands: List[Node], keys: SubtreeKeys) -> Node:
+        """Simplify one AND/OR whose operands are already simplified"""
+        absorbing = operator == LogicalOperator.OR   # TRUE absorbs OR, FALSE absorbs AND
+
+        # Flatten, fold constants and drop repeated predicates
+        flat: List[Node] = []
+        seen = set()
+        for operand in self._flatten(operator, operands):
+            if isinstance(operand, Constant):
+                if operand.value == absorbing:
+                    return operand
+                continue
+            key = keys.key(operand)
+            if key not in seen:
+                seen.add(key)
+                flat.append(operand)
+
+        if operator == LogicalOperator.OR:
+            flat = self._merge_disjunction(flat)
+        else:
+            flat = self._merge_conjunction(flat)
+            if flat is None:
+                return Constant(False)
+
+        if not flat:
+            return Constant(not absorbing)
+        if len(flat) == 1:
+            return flat[0]
+        return LogicalExpression.of(operator, flat)
+
+    def _flatten(self, operator: LogicalOperator, operands: List[Node]) -> List[Node]:
+        flat = []
+        for operand in operands:
+            if isinstance(operand, LogicalExpression) and operand.operator == operator:
+                flat.extend(operand.operands)
+            else:
+                flat.append(operand)
+        return flat
+
+    def _group_by_field(self, operands: List[Node], accept) -> Dict[str, List[int]]:
+        """Positions of the comparisons accepted by accept(condition), per field"""
+        groups: Dict[str, List[int]] = {}
+        for index, operand in enumerate(operands):
+            if isinstance(operand, ComparisonCondition) and accept(operand):
+                groups.setdefault(operand.field.name, []).append(index)
+        return groups
+
+    def _merge_disjunction(self, operands: List[Node]) -> List[Node]:
+        """Merge equalities into IN sets and keep the loosest bound per direction"""
+        replacements: Dict[int, List[Node]] = {}
+
+        def accept(condition: ComparisonCondition) -> bool:
+            operator = condition.operator
+            if operator in (ComparisonOperator.EQUALS, ComparisonOperator.IN):
+                return True
+            return (operator in LOWER_BOUND_OPERATORS + UPPER_BOUND_OPERATORS
+                    and condition.field.name in self.numeric_fields
+                    and is_number(condition.value.value))
+
+        for name, positions in self._group_by_field(operands, accept).items():
+            if len(positions) < 2:
+                continue
+            values: List[Any] = []
+            lower: Optional[Bound] = None
+            upper: Optional[Bound] = None
+            for index in positions:
+                condition = operands[index]
+                operator = condition.operator
+                if operator == ComparisonOperator.EQUALS:
+                    values.append(condition.value.value)
+                elif operator == ComparisonOperator.IN:
+                    values.extend(v.value for v in condition.value.values)
+                elif operator in LOWER_BOUND_OPERATORS:
+                    bound = Bound(condition.value.value, operator == ComparisonOperator.GREATER_EQUAL)
+                    lower = bound if lower is None else lower.looser_lower(bound)
+                else:
+                    bound = Bound(condition.value.value, operator == ComparisonOperator.LESS_EQUAL)
+                    upper = bound if upper is None else upper.looser_upper(bound)
+
+            # Values already covered by a bound add nothing to the disjunction
+            covered = [bounded for bounded in (Range(lower=lower), Range(upper=upper))
+                       if bounded.lower is not None or bounded.upper is not None]
+            kept: List[Any] = []
+            seen = set()
+            for value in values:
+                key = literal_key(value)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if is_number(value) and any(bounded.contains(value) for bounded in covered):
+                    continue
+                kept.append(value)
+
+            merged: List[Node] = []
+            if kept:
+                merged.append(membership(name, kept))
+            for bounded in covered:
+                merged.extend(bounded.conditions(name))
+            replacements[positions[0]] = merged
+            for index in positions[1:]:
+                replacements[index] = []
+
+        return self._apply(operands, replacements)
+
+    def _merge_conjunction(self, operands: List[Node]) -> Optional[List[Node]]:
+        """
+        Intersect comparisons on each single-valued field.
+        Returns None when the conjunction is a contradiction.
+        """
+        replacements: Dict[int, List[Node]] = {}
+
+        def accept(condition: ComparisonCondition) -> bool:
+            if condition.field.name not in self.single_valued_fields:
+                return False
+            operator = condition.operator
+            if operator in (ComparisonOperator.EQUALS, ComparisonOperator.NOT_EQUALS,
+                            ComparisonOperator.IN):
+                return True
+            return condition.field.name in self.numeric_fields and is_number(condition.value.value)
+
+        for name, positions in self._group_by_field(operands, accept).items():
+            if len(positions) < 2:
+                continue
+            allowed: Optional[List[Any]] = None
+            excluded = set()
+            ranges: List[ComparisonCondition] = []
+            for index in positions:
+                condition = operands[index]
+                operator = condition.operator
+                if operator in (ComparisonOperator.EQUALS, ComparisonOperator.IN):
+                    if operator == ComparisonOperator.IN:
+                        values = [v.value for v in condition.value.values]
+                    else:
+                        values = [condition.value.value]
+                    if allowed is None:
+                        allowed = values
+                    else:
+                        keys = {literal_key(v) for v in values}
+                        allowed = [v for v in allowed if literal_key(v) in keys]
+                elif operator == ComparisonOperator.NOT_EQUALS:
+                    excluded.add(literal_key(condition.value.value))
+                else:
+                    ranges.append(condition)
+
+            interval = numeric_range(ranges)
+            if interval.is_empty:
+                return None
+
+            if allowed is not None:
+                kept = []
+                seen = set()
+                undecided = False
+                for value in allowed:
+                    key = literal_key(value)
+                    if key in seen or key in excluded:
+                        continue
+                    seen.add(key)
+                    if is_number(value):
+                        if not interval.contains(value):
+                            continue
+                    elif ranges:
+                        undecided = True
+                    kept.append(value)
+                if not kept:
+                    return None
+                merged: List[Node] = [membership(name, kept)]
+                if undecided:
+                    merged.extend(interval.conditions(name))
+            else:
+                merged = interval.conditions(name)
+                for index in positions:
+                    condition = operands[index]
+                    if condition.operator != ComparisonOperator.NOT_EQUALS:
+                        continue
+                    value = condition.value.value
+                    # An excluded value outside the range is already ruled out
+                    if is_number(value) and ranges and not interval.contains(value):
+                        continue
+                    merged.append(condition)
+
+            replacements[positions[0]] = merged
+            for index in positions[1:]:
+                replacements[index] = []
+
+        return self._apply(operands, replacements)
+
+    def _apply(self, operands: List[Node], replacements: Dict[int, List[Node]]) -> List[Node]:
+        if not replacements:
+            return operands
+        result: List[Node] = []
+        for index, operand in enumerate(operands):
+            if index in replacements:
+                result.extend(replacements[index])
+            else:
+                result.append(operand)
+        return result
+
+def optimize(query: Query) -> Query:
+    """Helper function to run the default optimizer over a parsed query"""
+    return QueryOptimizer().optimize(query)
+
+def is_unsatisfiable(query: Query) -> bool:
+    """Check whether an optimized query can never match, so no database round trip is needed"""
+    return isinstance(query.expression, Constant) and not query.expression.value
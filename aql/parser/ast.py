@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Union, Optional
 from enum import Enum, auto
 
@@ -49,11 +49,39 @@ class LogicalExpression(Node):
     operator: LogicalOperator
     left: Node
     right: Optional[Node] = None  # Right is None for NOT operations
+    rest: List[Node] = field(default_factory=list)  # Operands after right in a flattened AND/OR
+    
+    @property
+    def operands(self) -> List[Node]:
+        """All operands in order; NOT has a single operand"""
+        if self.right is None:
+            return [self.left]
+        return [self.left, self.right, *self.rest]
+    
+    @classmethod
+    def of(cls, operator: LogicalOperator, operands: List[Node]) -> 'LogicalExpression':
+        """Build an n-ary AND/OR node from two or more operands"""
+        if len(operands) < 2:
+            raise ValueError(f"{operator.name} needs at least two operands")
+        return cls(operator, operands[0], operands[1], list(operands[2:]))
+
+@dataclass
+class Constant(Node):
+    """Represents a condition that is always true or always false, produced by the optimizer"""
+    value: bool
+
+@dataclass
+class SortKey(Node):
+    """Represents one ORDER BY key, a single-valued field and its direction"""
+    field: Identifier
+    descending: bool = False
 
 @dataclass
 class Query(Node):
     """Root node of the AST"""
     expression: Node
+    order_by: List[SortKey] = field(default_factory=list)
+    limit: Optional[int] = None
 
 # Example of building an AST for: YOE > 5 AND SKILLS IN {'ReactJS', 'NodeJS'}
 def create_example_ast() -> Query:
@@ -79,21 +107,25 @@ def create_example_ast() -> Query:
 
 # Helper functions for AST manipulation
 def visit_ast(node: Node, visitor_fn):
-    """Traverse the AST and apply visitor_fn to each node"""
-    visitor_fn(node)
-    
-    if isinstance(node, LogicalExpression):
-        visit_ast(node.left, visitor_fn)
-        if node.right:
-            visit_ast(node.right, visitor_fn)
-    elif isinstance(node, ComparisonCondition):
-        visit_ast(node.field, visitor_fn)
-        visit_ast(node.value, visitor_fn)
-    elif isinstance(node, SetLiteral):
-        for value in node.values:
-            visit_ast(value, visitor_fn)
-    elif isinstance(node, Query):
-        visit_ast(node.expression, visitor_fn)
+    """Traverse the AST in pre-order and apply visitor_fn to each node"""
+    # Explicit stack, so deeply nested queries cannot hit the recursion limit
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        visitor_fn(node)
+        
+        if isinstance(node, LogicalExpression):
+            stack.extend(reversed(node.operands))
+        elif isinstance(node, ComparisonCondition):
+            stack.append(node.value)
+            stack.append(node.field)
+        elif isinstance(node, SetLiteral):
+            stack.extend(reversed(node.values))
+        elif isinstance(node, SortKey):
+            stack.append(node.field)
+        elif isinstance(node, Query):
+            stack.extend(reversed(node.order_by))
+            stack.append(node.expression)
 
 def print_ast(node: Node, level: int = 0):
     """Pretty print the AST"""
@@ -101,11 +133,14 @@ def print_ast(node: Node, level: int = 0):
     if isinstance(node, Query):
         print(f"{indent}Query")
         print_ast(node.expression, level + 1)
+        for key in node.order_by:
+            print_ast(key, level + 1)
+        if node.limit is not None:
+            print(f"{indent}  Limit({node.limit})")
     elif isinstance(node, LogicalExpression):
         print(f"{indent}LogicalExpression({node.operator})")
-        print_ast(node.left, level + 1)
-        if node.right:
-            print_ast(node.right, level + 1)
+        for operand in node.operands:
+            print_ast(operand, level + 1)
     elif isinstance(node, ComparisonCondition):
         print(f"{indent}Comparison({node.operator})")
         print_ast(node.field, level + 1)
@@ -116,6 +151,10 @@ def print_ast(node: Node, level: int = 0):
         print(f"{indent}Value({node.value})")
     elif isinstance(node, SetLiteral):
         print(f"{indent}Set({[v.value for v in node.values]})")
+    elif isinstance(node, Constant):
+        print(f"{indent}Constant({node.value})")
+    elif isinstance(node, SortKey):
+        print(f"{indent}OrderBy({node.field.name} {'DESC' if node.descending else 'ASC'})")
 
 if __name__ == "__main__":
     # Test AST creation and printing
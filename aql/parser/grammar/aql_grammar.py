@@ -6,6 +6,13 @@ class TokenType(Enum):
     OR = auto()
     NOT = auto()
     
+    # Result ordering and size
+    ORDER = auto()
+    BY = auto()
+    ASC = auto()
+    DESC = auto()
+    LIMIT = auto()
+    
     # Comparisons
     EQUALS = auto()
     NOT_EQUALS = auto()
@@ -31,14 +38,20 @@ class TokenType(Enum):
 # Grammar Rules in EBNF notation:
 """
 # Top level query
-query := expression
+query := expression order_clause? limit_clause?
+
+# Result ordering and size. Only single-valued fields can be sort keys.
+order_clause := ORDER BY sort_key (',' sort_key)*
+sort_key := identifier (ASC | DESC)?
+limit_clause := LIMIT number
 
-# Expression can be a single condition or multiple conditions joined by logical operators
-expression := condition
-            | expression AND expression
-            | expression OR expression
-            | NOT expression
-            | '(' expression ')'
+# Expression can be a single condition or multiple conditions joined by logical operators.
+# NOT binds tightest, then AND, then OR.
+expression := and_expression (OR and_expression)*
+and_expression := unary (AND unary)*
+unary := NOT unary
+       | '(' expression ')'
+       | condition
 
 # Basic conditions for resume filtering
 condition := identifier comparison_op value
@@ -62,6 +75,7 @@ YOE > 5
 SKILLS IN {'Python', 'Java', 'SQL'}
 YOE >= 3 AND SKILLS IN {'ReactJS', 'NodeJS'}
 LOCATION = 'San Francisco' AND (YOE > 5 OR SKILLS IN {'Rust', 'Go'})
+SKILLS = 'Python' ORDER BY YOE DESC, SALARY LIMIT 20
 """
 
 # Token patterns (to be used with lexer)
@@ -70,6 +84,11 @@ PATTERNS = {
     'OR': r'OR\b',
     'NOT': r'NOT\b',
     'IN': r'IN\b',
+    'ORDER': r'ORDER\b',
+    'BY': r'BY\b',
+    'ASC': r'ASC\b',
+    'DESC': r'DESC\b',
+    'LIMIT': r'LIMIT\b',
     'NUMBER': r'\d+(\.\d*)?',
     'STRING': r"'[^']*'|\"[^\"]*\"",
     'BOOLEAN': r'TRUE|FALSE',
@@ -1,13 +1,23 @@
 import re
-from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Iterator, Optional, Tuple
 from .grammar.aql_grammar import TokenType, PATTERNS
 
-@dataclass
 class Token:
-    type: TokenType
-    value: str
-    position: int
+    """A lexeme with its type and start position in the query string"""
+    __slots__ = ('type', 'value', 'position')
+    
+    def __init__(self, type: TokenType, value: str, position: int):
+        self.type = type
+        self.value = value
+        self.position = position
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Token):
+            return NotImplemented
+        return (self.type, self.value, self.position) == (other.type, other.value, other.position)
+    
+    def __repr__(self) -> str:
+        return f"Token(type={self.type}, value={self.value!r}, position={self.position})"
 
 class LexerError(Exception):
     def __init__(self, message: str, position: int):
@@ -15,45 +25,86 @@ class LexerError(Exception):
         self.position = position
         super().__init__(f"{message} at position {position}")
 
+# Alternatives are tried in this order. Literals and punctuation have
+# distinct leading characters, so trying them first changes no result but
+# skips the keyword alternatives for most lexemes. Letter-led patterns
+# (keywords, BOOLEAN, IDENTIFIER) and '>=' / '<=' keep their PATTERNS order.
+SCAN_ORDER = [
+    'STRING', 'COMMA', 'NUMBER',
+    'LBRACE', 'RBRACE', 'LPAREN', 'RPAREN',
+    'GREATER_EQUAL', 'LESS_EQUAL', 'EQUALS', 'NOT_EQUALS', 'GREATER_THAN', 'LESS_THAN',
+    'AND', 'OR', 'NOT', 'IN', 'ORDER', 'BY', 'ASC', 'DESC', 'LIMIT',
+    'BOOLEAN', 'IDENTIFIER',
+]
+
+# Combine all patterns into a single regex, compiled once per process.
+# Leading whitespace is consumed by the same match, so skipping it never
+# costs a separate pass through the alternation.
+TOKEN_REGEX = '(?:{ws})?(?:{tokens})'.format(
+    ws=PATTERNS['WHITESPACE'],
+    tokens='|'.join(f'(?P<{name}>{PATTERNS[name]})' for name in SCAN_ORDER)
+)
+TOKEN_PATTERN = re.compile(TOKEN_REGEX)
+WHITESPACE_PATTERN = re.compile(PATTERNS['WHITESPACE'])
+
+# Index of each named group -> TokenType, looked up with match.lastindex.
+# Named groups enclose any nested groups, so the named group closes last.
+GROUP_TYPES: List[Optional[TokenType]] = [None] * (TOKEN_PATTERN.groups + 1)
+for _name, _index in TOKEN_PATTERN.groupindex.items():
+    GROUP_TYPES[_index] = TokenType[_name]
+
+def _check_end(text: str, position: int) -> None:
+    """Raise unless only whitespace remains after the last token"""
+    if position < len(text):
+        ws = WHITESPACE_PATTERN.match(text, position)
+        if ws is not None:
+            position = ws.end()
+        if position < len(text):
+            raise LexerError("Invalid character sequence", position)
+
+def scan(text: str) -> Tuple[List[TokenType], List[int], List[int]]:
+    """
+    Scan a query string into parallel arrays without allocating tokens.
+    Returns: (token_types, start_offsets, end_offsets)
+    """
+    group_types = GROUP_TYPES
+    types: List[TokenType] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    
+    for m in iter(TOKEN_PATTERN.scanner(text).match, None):
+        index = m.lastindex
+        types.append(group_types[index])
+        starts.append(m.start(index))
+        ends.append(m.end())
+    
+    _check_end(text, ends[-1] if ends else 0)
+    return types, starts, ends
+
+def iter_tokens(text: str) -> Iterator[Token]:
+    """Lazily scan a query string, yielding tokens on demand"""
+    group_types = GROUP_TYPES
+    position = 0
+    
+    for m in iter(TOKEN_PATTERN.scanner(text).match, None):
+        index = m.lastindex
+        position = m.end()
+        yield Token(group_types[index], m.group(index), m.start(index))
+    
+    _check_end(text, position)
+
 class Lexer:
     def __init__(self):
-        # Combine all patterns into a single regex
-        self.token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in PATTERNS.items())
-        self.pattern = re.compile(self.token_regex)
+        # The combined pattern is shared by every lexer
+        self.token_regex = TOKEN_REGEX
+        self.pattern = TOKEN_PATTERN
         
     def tokenize(self, text: str) -> List[Token]:
-        tokens = []
-        position = 0
-        
-        while position < len(text):
-            match = self.pattern.match(text, position)
-            if match is None:
-                raise LexerError(f"Invalid character sequence", position)
-            
-            position = match.end()
-            
-            # Get the name of the matched pattern
-            token_type = match.lastgroup
-            value = match.group()
-            
-            # Skip whitespace
-            if token_type == 'WHITESPACE':
-                continue
-                
-            # Convert string token type to enum
-            try:
-                token_enum = TokenType[token_type]
-            except KeyError:
-                raise LexerError(f"Unknown token type: {token_type}", position)
-            
-            tokens.append(Token(token_enum, value, position - len(value)))
-        
-        return tokens
+        return list(iter_tokens(text))
 
 def tokenize(query: str) -> List[Token]:
     """Helper function to tokenize a query string."""
-    lexer = Lexer()
-    return lexer.tokenize(query)
+    return list(iter_tokens(query))
 
 # Example usage:
 if __name__ == "__main__":
@@ -64,4 +115,4 @@ if __name__ == "__main__":
         for token in tokens:
             print(f"Token(type={token.type}, value='{token.value}', pos={token.position})")
     except LexerError as e:
-        print(f"Error: {e}") 
\ No newline at end of file
+        print(f"Error: {e}")
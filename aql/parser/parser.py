@@ -1,8 +1,8 @@
-from typing import List, Optional, Union
+from typing import List, Optional, Union, Iterable, Tuple
 from .lexer import Token, TokenType, tokenize, LexerError
 from .ast import (
     Node, Query, LogicalExpression, ComparisonCondition,
-    Identifier, Value, SetLiteral,
+    Identifier, Value, SetLiteral, SortKey,
     ComparisonOperator, LogicalOperator
 )
 
@@ -13,43 +13,138 @@ class ParserError(Exception):
         position_info = f" at position {token.position}" if token else ""
         super().__init__(f"{message}{position_info}")
 
+# Token types that carry a literal value
+LITERAL_TYPES = frozenset({TokenType.NUMBER, TokenType.STRING, TokenType.BOOLEAN})
+
+def convert_literal(token_type: TokenType, text: str) -> Union[int, float, str, bool]:
+    """Convert the text of a NUMBER, STRING or BOOLEAN lexeme into its Python value"""
+    if token_type == TokenType.STRING:
+        # Remove quotes
+        return text[1:-1]
+    if token_type == TokenType.NUMBER:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+    if token_type == TokenType.BOOLEAN:
+        return text.upper() == "TRUE"
+    raise ValueError(f"Not a literal token: {token_type}")
+
+def literal_value(token: Token) -> Union[int, float, str, bool]:
+    """Convert a NUMBER, STRING or BOOLEAN token into its Python value"""
+    if token.type not in LITERAL_TYPES:
+        raise ParserError("Expected value", token)
+    try:
+        return convert_literal(token.type, token.value)
+    except ValueError:
+        raise ParserError("Invalid number", token)
+
+def set_member_key(value: Union[int, float, str, bool]) -> Tuple[type, Union[int, float, str, bool]]:
+    """Key under which repeated set members are dropped; keeps TRUE apart from 1"""
+    return (type(value), value)
+
+def convert_limit(value: Union[int, float, str, bool]) -> int:
+    """Check that a LIMIT literal is a row count"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"LIMIT must be a whole number: {value!r}")
+    return value
+
+# Binding strength of logical operators on the parser's operator stack
+PRECEDENCE = {
+    LogicalOperator.OR: 1,
+    LogicalOperator.AND: 2,
+    LogicalOperator.NOT: 3,
+}
+
+# Operator stack marker for an open parenthesis
+_GROUP = None
+
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
+    def __init__(self, tokens: Iterable[Token]):
+        # Tokens may be a list or a lazy stream such as iter_tokens(query);
+        # they are pulled on demand and buffered for look-behind
+        self._source = iter(tokens)
+        self.tokens: List[Token] = []
         self.current = 0
     
     def parse(self) -> Query:
         """Parse the tokens into an AST"""
         expression = self.parse_expression()
+        order_by = self.parse_order_by() if self.match(TokenType.ORDER) else []
+        limit = self.parse_limit() if self.match(TokenType.LIMIT) else None
         if not self.is_at_end():
             raise ParserError("Expected end of input", self.peek())
-        return Query(expression)
+        return Query(expression, order_by, limit)
     
     def parse_expression(self) -> Node:
-        """Parse a logical expression or condition"""
-        expr = self.parse_condition()
+        """
+        Parse a logical expression with explicit operand and operator stacks.
+        NOT binds tighter than AND, and AND binds tighter than OR. Chains of
+        the same operator are flattened into one n-ary LogicalExpression, so
+        stack depth stays bounded however long or deeply nested the query is.
+        """
+        operands: List[Node] = []
+        operators: List[Optional[LogicalOperator]] = []
+        open_groups = 0
         
-        while (
-            self.match(TokenType.AND) or 
-            self.match(TokenType.OR)
-        ):
-            operator = LogicalOperator.AND if self.previous().type == TokenType.AND else LogicalOperator.OR
-            right = self.parse_condition()
-            expr = LogicalExpression(operator=operator, left=expr, right=right)
+        while True:
+            # Operand position: any run of NOT and '(' followed by a condition
+            while True:
+                if self.match(TokenType.NOT):
+                    operators.append(LogicalOperator.NOT)
+                elif self.match(TokenType.LPAREN):
+                    operators.append(_GROUP)
+                    open_groups += 1
+                else:
+                    break
+            operands.append(self.parse_condition())
+            
+            # Operator position: close groups, then continue on AND/OR
+            while open_groups and self.match(TokenType.RPAREN):
+                while operators[-1] is not _GROUP:
+                    self._reduce(operators.pop(), operands)
+                operators.pop()
+                open_groups -= 1
+            
+            if self.match(TokenType.AND):
+                operator = LogicalOperator.AND
+            elif self.match(TokenType.OR):
+                operator = LogicalOperator.OR
+            else:
+                break
+            
+            while operators and operators[-1] is not _GROUP and (
+                PRECEDENCE[operators[-1]] >= PRECEDENCE[operator]
+            ):
+                self._reduce(operators.pop(), operands)
+            operators.append(operator)
+        
+        if open_groups:
+            self.consume(TokenType.RPAREN, "Expected ')' after expression")
+        while operators:
+            self._reduce(operators.pop(), operands)
+        return operands[0]
+    
+    def _reduce(self, operator: LogicalOperator, operands: List[Node]) -> None:
+        """Apply an operator to the top of the operand stack"""
+        if operator == LogicalOperator.NOT:
+            operands.append(LogicalExpression(operator=operator, left=operands.pop()))
+            return
         
-        return expr
+        right = operands.pop()
+        left = operands.pop()
+        if isinstance(left, LogicalExpression) and left.operator == operator:
+            # Extend the existing n-ary node in place
+            if isinstance(right, LogicalExpression) and right.operator == operator:
+                left.rest.extend(right.operands)
+            else:
+                left.rest.append(right)
+            operands.append(left)
+        elif isinstance(right, LogicalExpression) and right.operator == operator:
+            operands.append(LogicalExpression.of(operator, [left] + right.operands))
+        else:
+            operands.append(LogicalExpression(operator=operator, left=left, right=right))
     
     def parse_condition(self) -> Node:
         """Parse a comparison condition"""
-        if self.match(TokenType.NOT):
-            expr = self.parse_condition()
-            return LogicalExpression(operator=LogicalOperator.NOT, left=expr)
-        
-        if self.match(TokenType.LPAREN):
-            expr = self.parse_expression()
-            self.consume(TokenType.RPAREN, "Expected ')' after expression")
-            return expr
-        
         # Parse identifier
         if not self.match(TokenType.IDENTIFIER):
             raise ParserError("Expected identifier", self.peek())
@@ -91,30 +186,15 @@ class Parser:
         if self.match(TokenType.LBRACE):
             return self.parse_set_literal()
         
-        if self.match(TokenType.NUMBER):
-            # Convert string to number
-            try:
-                value = float(self.previous().value)
-                if value.is_integer():
-                    value = int(value)
-                return Value(value)
-            except ValueError:
-                raise ParserError("Invalid number", self.previous())
-        
-        if self.match(TokenType.STRING):
-            # Remove quotes
-            value = self.previous().value[1:-1]
-            return Value(value)
-        
-        if self.match(TokenType.BOOLEAN):
-            value = self.previous().value.upper() == "TRUE"
-            return Value(value)
+        if self.match(TokenType.NUMBER, TokenType.STRING, TokenType.BOOLEAN):
+            return Value(literal_value(self.previous()))
         
         raise ParserError("Expected value", self.peek())
     
     def parse_set_literal(self) -> SetLiteral:
-        """Parse a set literal like {'value1', 'value2'}"""
+        """Parse a set literal like {'value1', 'value2'}, dropping repeated values"""
         values = []
+        seen = set()
         
         # Handle empty set
         if self.match(TokenType.RBRACE):
@@ -125,19 +205,11 @@ class Parser:
                 raise ParserError("Unclosed set literal - expected '}'")
             
             if self.match(TokenType.NUMBER, TokenType.STRING, TokenType.BOOLEAN):
-                token = self.previous()
-                if token.type == TokenType.STRING:
-                    values.append(Value(token.value[1:-1]))
-                elif token.type == TokenType.NUMBER:
-                    try:
-                        value = float(token.value)
-                        if value.is_integer():
-                            value = int(value)
-                        values.append(Value(value))
-                    except ValueError:
-                        raise ParserError("Invalid number in set", token)
-                else:  # BOOLEAN
-                    values.append(Value(token.value.upper() == "TRUE"))
+                value = literal_value(self.previous())
+                key = set_member_key(value)
+                if key not in seen:
+                    seen.add(key)
+                    values.append(Value(value))
             else:
                 raise ParserError("Expected value in set", self.peek())
             
@@ -152,20 +224,44 @@ class Parser:
         
         return SetLiteral(values)
     
+    def parse_order_by(self) -> List[SortKey]:
+        """Parse the sort keys after ORDER, like BY YOE DESC, SALARY"""
+        self.consume(TokenType.BY, "Expected 'BY' after 'ORDER'")
+        keys = []
+        while True:
+            if not self.match(TokenType.IDENTIFIER):
+                raise ParserError("Expected identifier", self.peek())
+            identifier = Identifier(self.previous().value)
+            descending = False
+            if self.match(TokenType.DESC):
+                descending = True
+            else:
+                self.match(TokenType.ASC)
+            keys.append(SortKey(identifier, descending))
+            if not self.match(TokenType.COMMA):
+                return keys
+    
+    def parse_limit(self) -> int:
+        """Parse the row count after LIMIT"""
+        token = self.consume(TokenType.NUMBER, "Expected number after 'LIMIT'")
+        try:
+            return convert_limit(literal_value(token))
+        except ValueError as e:
+            raise ParserError(str(e), token)
+    
     # Helper methods
     def match(self, *types: TokenType) -> bool:
         """Check if current token matches any of the given types"""
-        for type in types:
-            if self.check(type):
-                self.advance()
-                return True
-        return False
+        if self.is_at_end() or self.tokens[self.current].type not in types:
+            return False
+        self.current += 1
+        return True
     
     def check(self, type: TokenType) -> bool:
         """Check if current token is of given type without advancing"""
         if self.is_at_end():
             return False
-        return self.peek().type == type
+        return self.tokens[self.current].type == type
     
     def advance(self) -> Token:
         """Move to next token and return previous"""
@@ -175,7 +271,13 @@ class Parser:
     
     def is_at_end(self) -> bool:
         """Check if we've reached end of tokens"""
-        return self.current >= len(self.tokens)
+        if self.current < len(self.tokens):
+            return False
+        token = next(self._source, None)
+        if token is None:
+            return True
+        self.tokens.append(token)
+        return False
     
     def peek(self) -> Token:
         """Return current token without advancing"""
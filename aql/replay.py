@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Sequence
+from .db.plan_cache import get_plan_cache
+from .db.sql_builder import ParamStyle, SetStyle
+from .instrumentation import Instrumentation, Exporter, QueryTrace, LatencyHistogram, timed
+
+# Bytes of log handed to a worker at a time: large enough to amortize
+# scheduling, small enough to balance the load near the end of the file
+CHUNK_BYTES = 4 << 20
+
+# Longest example query kept per shape
+EXAMPLE_LENGTH = 200
+
+# Shapes a replay keeps statistics for; the cheapest are dropped beyond it
+MAX_SHAPES = 10_000
+
+@dataclass
+class ShapeStats:
+    """Latency of every query sharing one fingerprint"""
+    fingerprint: str
+    example: str
+    count: int = 0
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def total(self) -> float:
+        """Seconds spent on the shape"""
+        return self.histogram.total * 1e-9
+
+    def merge(self, other: 'ShapeStats') -> None:
+        self.count += other.count
+        self.histogram.merge(other.histogram)
+
+class _ShapeExporter(Exporter):
+    """Groups finished traces by fingerprint"""
+    def __init__(self):
+        self.shapes: Dict[str, ShapeStats] = {}
+
+    def on_trace(self, trace: QueryTrace) -> None:
+        shape = self.shapes.get(trace.fingerprint)
+        if shape is None:
+            shape = self.shapes[trace.fingerprint] = ShapeStats(trace.fingerprint, trace.query[:EXAMPLE_LENGTH])
+        shape.count += 1
+        shape.histogram.record(trace.total)
+
+@dataclass
+class ReplayStats:
+    """What one chunk, or the whole replay, measured"""
+    queries: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    stages: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    shapes: Dict[str, ShapeStats] = field(default_factory=dict)
+    # Shapes, and their queries, dropped by trim
+    trimmed_shapes: int = 0
+    trimmed_queries: int = 0
+
+    def merge(self, other: 'ReplayStats') -> None:
+        self.queries += other.queries
+        self.trimmed_shapes += other.trimmed_shapes
+        self.trimmed_queries += other.trimmed_queries
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+        for stage, histogram in other.stages.items():
+            if stage in self.stages:
+                self.stages[stage].merge(histogram)
+            else:
+                self.stages[stage] = histogram
+        for fingerprint, shape in other.shapes.items():
+            if fingerprint in self.shapes:
+                self.shapes[fingerprint].merge(shape)
+            else:
+                self.shapes[fingerprint] = shape
+
+    def top_shapes(self, n: int) -> List[ShapeStats]:
+        """The n shapes with the most total time"""
+        return sorted(self.shapes.values(), key=lambda shape: shape.histogram.total, reverse=True)[:n]
+
+    def trim(self, max_shapes: int) -> None:
+        """
+        Keep the max_shapes shapes with the most total time. A dropped
+        shape that comes back later starts over, so only shapes near the
+        cut can be undercounted.
+        """
+        if len(self.shapes) <= max_shapes:
+            return
+        kept = self.top_shapes(max_shapes)
+        self.trimmed_shapes += len(self.shapes) - len(kept)
+        self.trimmed_queries += sum(shape.count for shape in self.shapes.values()) - sum(shape.count for shape in kept)
+        self.shapes = {shape.fingerprint: shape for shape in kept}
+
+def chunk_ranges(path: str, chunk_bytes: int = CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    """Split a file into byte ranges; each line belongs to the range it starts in"""
+    size = os.path.getsize(path)
+    for start in range(0, size, chunk_bytes):
+        yield start, min(start + chunk_bytes, size)
+
+def read_lines(path: str, start: int, end: int) -> Iterator[str]:
+    """Non-blank log lines starting within [start, end)"""
+    with open(path, 'rb') as f:
+        if start:
+            # Finish the line in progress at start; it belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            text = line.decode('utf-8', errors='replace').strip()
+            if text:
+                yield text
+
+def log_query(line: str) -> str:
+    """The query of a log line"""
+    if line.startswith('{'):
+        return json.loads(line)['query']
+    return line
+
+# Per-process replay state, set up by _init_worker
+_connection: Optional[sqlite3.Connection] = None
+_large_sets: Optional[SetStyle] = SetStyle.JSON
+
+def _init_worker(database: Optional[str], large_sets: Optional[SetStyle]) -> None:
+    global _connection, _large_sets
+    _large_sets = large_sets
+    # Read-only, so a replay can never change the data it measures
+    _connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True) if database is not None else None
+
+def _execute(sql: str, params: List[Any]) -> List[Any]:
+    return _connection.execute(sql, params).fetchall()
+
+def replay_chunk(path: str, start: int, end: int) -> ReplayStats:
+    """Translate, and run if there is a database, every query of a byte range"""
+    shapes = _ShapeExporter()
+    instrumentation = Instrumentation([shapes])
+    cache = get_plan_cache()
+    stats = ReplayStats()
+    for line in read_lines(path, start, end):
+        stats.queries += 1
+        try:
+            query_str = log_query(line)
+            trace = instrumentation.trace(query_str)
+            sql, params = cache.translate(query_str, ParamStyle.QMARK, True, large_sets=_large_sets, trace=trace)
+            if _connection is not None:
+                timed(trace, 'execute', _execute, sql, params)
+        except Exception as e:
+            error = type(e).__name__
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+            continue
+        trace.set_sql(sql)
+        trace.finish()
+    stats.stages = instrumentation.histograms
+    stats.shapes = shapes.shapes
+    return stats
+
+def replay(path: str, workers: Optional[int] = None, database: Optional[str] = None,
+           large_sets: Optional[SetStyle] = SetStyle.JSON, chunk_bytes: int = CHUNK_BYTES,
+           max_shapes: int = MAX_SHAPES) -> ReplayStats:
+    """
+    Replay a query log on a pool of processes, optionally running each
+    query against a SQLite database. The log holds one query per line, as
+    plain text or as a JSON object with a "query" key. Workers read their
+    own byte ranges of the file. At most two chunks per worker are in
+    flight, results are merged as they arrive, and at most 2 * max_shapes
+    shapes are held, so memory stays flat however long the log.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = ReplayStats()
+
+    def add(stats: ReplayStats) -> None:
+        total.merge(stats)
+        if len(total.shapes) > 2 * max_shapes:
+            total.trim(max_shapes)
+
+    if workers == 1:
+        _init_worker(database, large_sets)
+        for start, end in chunk_ranges(path, chunk_bytes):
+            add(replay_chunk(path, start, end))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(database, large_sets)) as pool:
+            pending = set()
+            for start, end in chunk_ranges(path, chunk_bytes):
+                pending.add(pool.submit(replay_chunk, path, start, end))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        add(future.result())
+            for future in pending:
+                add(future.result())
+    total.trim(max_shapes)
+    return total
+
+def report(stats: ReplayStats, elapsed: float, top: int) -> Dict[str, Any]:
+    """Summary of a replay, ready for JSON"""
+    def milliseconds(histogram: LatencyHistogram, percent: float) -> float:
+        return histogram.percentile(percent) / 1e6
+
+    return {
+        'queries': stats.queries,
+        'errors': stats.errors,
+        'seconds': elapsed,
+        'queries_per_second': stats.queries / elapsed if elapsed else 0.0,
+        'shapes': len(stats.shapes) + stats.trimmed_shapes,
+        'trimmed_shapes': stats.trimmed_shapes,
+        'trimmed_queries': stats.trimmed_queries,
+        'stages': {
+            stage: {
+                'count': histogram.count,
+                'p50_ms': milliseconds(histogram, 50),
+                'p99_ms': milliseconds(histogram, 99),
+            }
+            for stage, histogram in stats.stages.items()
+        },
+        'top_shapes': [
+            {
+                'fingerprint': shape.fingerprint,
+                'count': shape.count,
+                'total_s': shape.total,
+                'mean_ms': shape.total * 1000 / shape.count,
+                'p50_ms': milliseconds(shape.histogram, 50),
+                'p99_ms': milliseconds(shape.histogram, 99),
+                'example': shape.example,
+            }
+            for shape in stats.top_shapes(top)
+        ],
+    }
+
+def print_report(summary: Dict[str, Any]) -> None:
+    errors = sum(summary['errors'].values())
+    print(f"{summary['queries']:,} queries in {summary['seconds']:.2f}s"
+          f" ({summary['queries_per_second']:,.0f}/s), {summary['shapes']:,} shapes, {errors:,} errors")
+    for error, count in summary['errors'].items():
+        print(f"  {error}: {count:,}")
+    if summary['trimmed_shapes']:
+        print(f"  {summary['trimmed_shapes']:,} cheapest shapes ({summary['trimmed_queries']:,} queries) not kept")
+    for stage, latency in summary['stages'].items():
+        print(f"  {stage:9} p50 {latency['p50_ms']:9.3f} ms  p99 {latency['p99_ms']:9.3f} ms")
+    print(f"\nTop {len(summary['top_shapes'])} shapes by total time")
+    for shape in summary['top_shapes']:
+        print(f"  {shape['fingerprint']}  {shape['total_s']:9.3f}s  {shape['count']:>9,}x"
+              f"  p50 {shape['p50_ms']:8.3f} ms  p99 {shape['p99_ms']:8.3f} ms  {shape['example'][:60]}")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m aql.replay',
+        description="Replay a log of AQL queries on a pool of worker processes, and report "
+                    "throughput and the most expensive query shapes."
+    )
+    parser.add_argument('log', help="query log, one query per line")
+    parser.add_argument('--workers', '-j', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--database', help="SQLite database to run the queries against, opened read-only")
+    parser.add_argument('--inline-sets', action='store_true', help="inline large IN sets instead of binding them as JSON")
+    parser.add_argument('--max-shapes', type=int, default=MAX_SHAPES, help="shapes to keep statistics for")
+    parser.add_argument('--top', type=int, default=10, help="shapes to report")
+    parser.add_argument('--output', '-o', help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = replay(args.log, args.workers, args.database, None if args.inline_sets else SetStyle.JSON,
+                   max_shapes=args.max_shapes)
+    summary = report(stats, time.perf_counter() - start, args.top)
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
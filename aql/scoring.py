@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple, Optional, Mapping
+from .parser.ast import Node, LogicalExpression, ComparisonCondition, LogicalOperator
+from .fields import FIELDS, NUMERIC_FIELDS
+from .optimizer import node_key
+
+# Fields whose conditions can be weighted
+SCORE_FIELDS = tuple(FIELDS)
+
+@dataclass(frozen=True)
+class Closeness:
+    """
+    Score for a numeric field near a target: weight at the target, falling
+    linearly to zero at scale away from it. NULL values score zero.
+    """
+    field: str
+    target: float
+    scale: float
+    weight: float = 1.0
+
+    def __post_init__(self):
+        if self.field not in NUMERIC_FIELDS:
+            raise ValueError(f"Closeness needs a numeric field: {self.field}")
+        if self.scale <= 0:
+            raise ValueError("Closeness scale must be positive")
+
+@dataclass(frozen=True)
+class ScoreSpec:
+    """
+    How relevance is scored. Every condition of the query that is not under
+    a NOT adds the weight of its field when it holds; on SKILLS/EDUCATION
+    it adds the weight once per value that satisfies it, so SKILLS IN {...}
+    counts the requested skills a candidate has. Fields without a weight
+    use default_weight, and closeness terms are added on top.
+    """
+    weights: Mapping[str, float] = field(default_factory=dict)
+    default_weight: float = 1.0
+    closeness: Tuple[Closeness, ...] = ()
+
+    def __post_init__(self):
+        for name in self.weights:
+            if name not in SCORE_FIELDS:
+                raise ValueError(f"Unknown field: {name}")
+        object.__setattr__(self, 'closeness', tuple(self.closeness))
+
+    def weight(self, field_name: str) -> float:
+        return self.weights.get(field_name, self.default_weight)
+
+# A condition and the weight it adds to the score
+ScoreTerm = Tuple[ComparisonCondition, float]
+
+def score_terms(expression: Node, spec: Optional[ScoreSpec] = None) -> List[ScoreTerm]:
+    """
+    Weighted conditions of an expression in query order. Conditions under a
+    NOT only match by failing, so they add nothing, and a condition that
+    appears twice is counted once.
+    """
+    spec = spec or ScoreSpec()
+    terms: List[ScoreTerm] = []
+    seen = set()
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ComparisonCondition):
+            key = node_key(node)
+            weight = spec.weight(node.field.name)
+            if key not in seen and weight:
+                seen.add(key)
+                terms.append((node, weight))
+        elif isinstance(node, LogicalExpression) and node.operator != LogicalOperator.NOT:
+            stack.extend(reversed(node.operands))
+    return terms
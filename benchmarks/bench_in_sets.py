@@ -0,0 +1,35 @@
+"""
+Translation and planning time of large IN sets, inlined vs bound as one parameter.
+
+Run from the repository root:
+    python -m benchmarks.bench_in_sets
+"""
+from aql.db.plan_cache import PlanCache
+from aql.db.sql_builder import ParamStyle, SetStyle
+from aql.db.sqlite_schema import create_sqlite_database
+from benchmarks.bench_parser import measure
+
+def skills_query(size: int) -> str:
+    values = ', '.join(f"'skill{i}'" for i in range(size))
+    return f"SKILLS IN {{{values}}} AND YOE > 3"
+
+def bench(size: int, connection):
+    query_str = skills_query(size)
+    print(f"SKILLS IN {{...}} with {size:,} values")
+    for label, large_sets in [('inline', None), ('json_each', SetStyle.JSON)]:
+        cache = PlanCache()
+        sql, params = cache.translate(query_str, ParamStyle.QMARK, True, large_sets=large_sets)
+        # Translation as served by the plan cache, after the first query of the shape
+        translate_time = measure(lambda: cache.translate(query_str, ParamStyle.QMARK, True, large_sets=large_sets))
+        # EXPLAIN QUERY PLAN prepares and plans the statement without running it
+        plan_time = measure(lambda: connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall())
+        print(f"  {label:9}  SQL: {len(sql):8,} chars, {len(params):6,} params"
+              f"  translate: {translate_time * 1000:7.3f} ms  plan: {plan_time * 1000:7.3f} ms")
+
+def main():
+    connection = create_sqlite_database()
+    for size in (10, 100, 1_000, 10_000):
+        bench(size, connection)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Parser throughput on large machine-generated queries.
+
+Run from the repository root:
+    python -m benchmarks.bench_parser
+"""
+import sys
+import time
+from typing import Callable
+from aql.parser.lexer import tokenize
+from aql.parser.parser import Parser
+from aql.parser.ast import visit_ast
+from aql.db.sql_codegen import SQLGenerator
+
+def or_chain(terms: int) -> str:
+    return ' OR '.join(f"SKILLS = 'skill{i}'" for i in range(terms))
+
+def mixed_chain(terms: int) -> str:
+    return ' OR '.join(
+        f"(YOE > {i % 20} AND LOCATION = 'city{i}')" if i % 3 else f"NOT SALARY < {i}"
+        for i in range(terms)
+    )
+
+def nested_groups(depth: int) -> str:
+    query = "YOE > 1"
+    for i in range(depth):
+        operator = 'AND' if i % 2 else 'OR'
+        query = f"(LOCATION = 'city{i}' {operator} {query})"
+    return query
+
+def measure(fn: Callable[[], object], min_time: float = 0.5) -> float:
+    """Return the mean seconds per call over at least min_time"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+def bench(label: str, query: str, terms: int):
+    tokens = tokenize(query)
+    ast = Parser(tokens).parse()
+    nodes = []
+    visit_ast(ast, nodes.append)
+
+    parse_time = measure(lambda: Parser(tokens).parse())
+    translate_time = measure(lambda: SQLGenerator().translate(ast))
+
+    print(f"{label}")
+    print(f"  tokens: {len(tokens)}, AST nodes: {len(nodes)}")
+    print(f"  parse:     {parse_time * 1000:8.2f} ms  ({terms / parse_time:,.0f} terms/s)")
+    print(f"  translate: {translate_time * 1000:8.2f} ms  ({terms / translate_time:,.0f} terms/s)")
+
+def main():
+    print(f"Recursion limit: {sys.getrecursionlimit()}")
+    for terms in (1_000, 10_000):
+        bench(f"OR chain, {terms:,} terms", or_chain(terms), terms)
+        bench(f"Mixed AND/OR/NOT, {terms:,} terms", mixed_chain(terms), terms)
+    bench("Nested groups, depth 2,000", nested_groups(2_000), 2_001)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Translation latency right after a process starts, with and without a
+warmed shared plan cache, against a process whose plan cache is warm.
+
+Run from the repository root:
+    python -m benchmarks.bench_shared_cache
+"""
+import os
+import random
+import tempfile
+import time
+from aql.db.plan_cache import PlanCache
+from aql.db.shared_cache import SharedPlanCache, save_snapshot
+from aql.instrumentation import LatencyHistogram
+from benchmarks.workload import generate
+
+def traffic(queries, count: int, seed: int = 0):
+    """Requests drawn from the queries with Zipf-like popularity"""
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(queries) + 1)]
+    return rng.choices(queries, weights, k=count)
+
+def serve(cache: PlanCache, requests) -> LatencyHistogram:
+    histogram = LatencyHistogram()
+    for query_str in requests:
+        start = time.perf_counter_ns()
+        cache.translate(query_str)
+        histogram.record(time.perf_counter_ns() - start)
+    return histogram
+
+def report(label: str, histogram: LatencyHistogram):
+    snapshot = histogram.snapshot()
+    print(f"{label:32} p50 {snapshot.p50 * 1e6:8.1f} us  p99 {snapshot.p99 * 1e6:8.1f} us"
+          f"  max {snapshot.max * 1e6:9.1f} us")
+
+def main():
+    queries = generate('dashboard', 2_000, seed=1)
+    requests = traffic(queries, 5_000)
+    with tempfile.TemporaryDirectory() as directory:
+        # A worker that has served traffic for a while
+        steady = PlanCache(maxsize=4096)
+        serve(steady, traffic(queries, 50_000, seed=1))
+        report("steady state", serve(steady, requests))
+
+        report("cold, local cache only", serve(PlanCache(maxsize=4096), requests))
+
+        # A new deploy: the snapshot of the old workers' hottest shapes warms the shared file once
+        snapshot = os.path.join(directory, 'hot-shapes.jsonl')
+        save_snapshot(snapshot, steady, limit=4096)
+        path = os.path.join(directory, 'plans')
+        start = time.perf_counter()
+        with SharedPlanCache(path) as shared:
+            warmed = shared.warm(snapshot)
+        print(f"warmed {warmed} shapes in {time.perf_counter() - start:.2f}s")
+
+        # Each worker opens the file and starts with an empty local cache
+        with SharedPlanCache(path) as shared:
+            report("cold, warmed shared cache", serve(PlanCache(maxsize=4096, shared=shared), requests))
+            print(shared.stats())
+
+if __name__ == "__main__":
+    main()
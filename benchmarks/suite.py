@@ -0,0 +1,226 @@
+"""
+Benchmark suite over the seeded workload of benchmarks.workload:
+microbenchmarks of each pipeline stage per size class, and end-to-end
+runs against a seeded SQLite database. Results are saved as JSON so that
+two runs, e.g. before and after a change, can be compared.
+
+Run from the repository root:
+    python -m benchmarks.suite run --output before.json
+    python -m benchmarks.suite run --output after.json
+    python -m benchmarks.suite compare before.json after.json
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Callable, Optional, Sequence
+from aql.parser.lexer import tokenize
+from aql.parser.parser import Parser
+from aql.parser.ast import visit_ast
+from aql.db.query_translator import translate_query
+from aql.db.plan_cache import get_plan_cache
+from aql.db.sql_builder import ParamStyle, SetStyle
+from aql.instrumentation import LatencyHistogram
+from benchmarks.workload import SIZE_CLASSES, generate, create_workload_database
+
+# Bumped when the result format changes
+FORMAT_VERSION = 1
+
+# Queries generated per size class. Large queries are slow to generate and
+# a handful of them already takes the whole measuring time.
+QUERY_COUNTS = {'single': 50, 'dashboard': 50, 'or_chain_1k': 5, 'in_set_10k': 5, 'nested_200': 20}
+
+# Translation as the service runs it against SQLite
+TRANSLATE_OPTIONS = dict(param_style=ParamStyle.QMARK, semi_joins=True, large_sets=SetStyle.JSON)
+
+@dataclass
+class Result:
+    """One benchmark: a stage run over the queries of one size class"""
+    name: str
+    runs: int
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    # Peak bytes traced by tracemalloc while one query runs, averaged over a few queries
+    alloc_bytes: Optional[int]
+    error: Optional[str] = None
+
+def sample(fn: Callable[[Any], object], inputs: Sequence[Any], min_time: float, min_runs: int = 5) -> LatencyHistogram:
+    """Time fn on the inputs in turn, until both min_time seconds and min_runs calls have passed"""
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+    deadline = clock() + int(min_time * 1e9)
+    runs = 0
+    while runs < min_runs or clock() < deadline:
+        item = inputs[runs % len(inputs)]
+        start = clock()
+        fn(item)
+        histogram.record(clock() - start)
+        runs += 1
+    return histogram
+
+def peak_allocation(fn: Callable[[Any], object], inputs: Sequence[Any], limit: int = 5) -> int:
+    """Mean peak of memory allocated while fn runs, over the first inputs"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for item in inputs[:limit]:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(item)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return round(sum(peaks) / len(peaks))
+
+def bench(name: str, fn: Callable[[Any], object], inputs: Sequence[Any], min_time: float) -> Result:
+    try:
+        for item in inputs:
+            fn(item)
+    except sqlite3.Error as e:
+        # e.g. SQLite's expression depth limit; recorded so that compare shows it
+        return Result(name, 0, 0.0, 0.0, 0.0, None, str(e))
+    histogram = sample(fn, inputs, min_time)
+    return Result(
+        name=name,
+        runs=histogram.count,
+        ops_per_sec=histogram.count / (histogram.total * 1e-9),
+        p50_us=histogram.percentile(50) / 1000,
+        p99_us=histogram.percentile(99) / 1000,
+        alloc_bytes=peak_allocation(fn, inputs)
+    )
+
+def micro_benchmarks(size_class: str, queries: List[str], min_time: float) -> List[Result]:
+    """Each pipeline stage alone, on inputs prepared by the stages before it"""
+    tokens = [tokenize(query_str) for query_str in queries]
+    asts = [Parser(query_tokens).parse() for query_tokens in tokens]
+    cache = get_plan_cache()
+    cache.clear()
+    return [
+        bench(f"tokenize/{size_class}", tokenize, queries, min_time),
+        bench(f"parse/{size_class}", lambda query_tokens: Parser(query_tokens).parse(), tokens, min_time),
+        bench(f"visit_ast/{size_class}", lambda ast: visit_ast(ast, lambda node: None), asts, min_time),
+        bench(f"translate_query/{size_class}",
+              lambda query_str: translate_query(query_str, use_cache=False, **TRANSLATE_OPTIONS), queries, min_time),
+        # Warmed by bench itself, so every timed call is a plan cache hit
+        bench(f"translate_query_cached/{size_class}",
+              lambda query_str: translate_query(query_str, **TRANSLATE_OPTIONS), queries, min_time),
+    ]
+
+def end_to_end(size_class: str, queries: List[str], connection: sqlite3.Connection, min_time: float) -> Result:
+    """Translate, run and fetch each query against SQLite"""
+    def run(query_str: str):
+        # Optimized, so that OR chains merge into IN sets and fit SQLite's expression depth limit
+        sql, params = translate_query(query_str, optimize=True, **TRANSLATE_OPTIONS)
+        return connection.execute(sql, params).fetchall()
+    return bench(f"sqlite/{size_class}", run, queries, min_time)
+
+def run_suite(size_classes: Sequence[str], seed: int = 0, min_time: float = 0.5,
+              resumes: int = 2_000) -> Dict[str, Any]:
+    """Run every benchmark and return the results document"""
+    connection = create_workload_database(resumes=resumes, seed=seed)
+    results: List[Result] = []
+    for size_class in size_classes:
+        queries = generate(size_class, QUERY_COUNTS[size_class], seed)
+        for result in micro_benchmarks(size_class, queries, min_time) + [
+            end_to_end(size_class, queries, connection, min_time)
+        ]:
+            print_result(result)
+            results.append(result)
+    connection.close()
+    return {
+        'format': FORMAT_VERSION,
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+            'seed': seed,
+            'min_time': min_time,
+            'resumes': resumes,
+        },
+        'results': [asdict(result) for result in results],
+    }
+
+def print_result(result: Result) -> None:
+    if result.error is not None:
+        print(f"{result.name:38} error: {result.error}")
+        return
+    print(f"{result.name:38} {result.ops_per_sec:12,.1f} ops/s  p50 {result.p50_us:11,.1f} us"
+          f"  p99 {result.p99_us:11,.1f} us  {result.alloc_bytes:>11,} B")
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path) as f:
+        document = json.load(f)
+    if document.get('format') != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a format {FORMAT_VERSION} results file")
+    return {result['name']: result for result in document['results']}
+
+def compare(before_path: str, after_path: str, threshold: float = 0.1) -> List[str]:
+    """
+    Print the change of every benchmark between two runs and return the
+    names of those whose p50 grew by more than threshold, or that failed.
+    """
+    before = load_results(before_path)
+    after = load_results(after_path)
+    regressions = []
+    print(f"{'benchmark':38} {'p50 before':>14} {'p50 after':>14} {'change':>8}  {'alloc change':>12}")
+    for name in list(before) + [name for name in after if name not in before]:
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            print(f"{name:38} only in {'after' if old is None else 'before'}")
+            continue
+        if new['error'] is not None or old['error'] is not None:
+            if new['error'] is not None and old['error'] is None:
+                regressions.append(name)
+            print(f"{name:38} before: {old['error'] or 'ok'}  after: {new['error'] or 'ok'}")
+            continue
+        change = new['p50_us'] / old['p50_us'] - 1 if old['p50_us'] else 0.0
+        alloc_change = new['alloc_bytes'] / old['alloc_bytes'] - 1 if old['alloc_bytes'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  slower'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:38} {old['p50_us']:11,.1f} us {new['p50_us']:11,.1f} us {change:+8.1%}"
+              f"  {alloc_change:+12.1%}{flag}")
+    return regressions
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the suite")
+    run.add_argument('--output', '-o', help="write the results to this JSON file")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--min-time', type=float, default=0.5, help="seconds to time each benchmark for")
+    run.add_argument('--resumes', type=int, default=2_000, help="resumes in the SQLite database")
+    run.add_argument('--classes', nargs='+', choices=list(SIZE_CLASSES), default=list(SIZE_CLASSES))
+    diff = commands.add_parser('compare', help="compare two result files")
+    diff.add_argument('before')
+    diff.add_argument('after')
+    diff.add_argument('--threshold', type=float, default=0.1,
+                      help="relative p50 growth reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        document = run_suite(args.classes, args.seed, args.min_time, args.resumes)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(document, f, indent=2)
+            print(f"Results written to {args.output}")
+        return 0
+
+    regressions = compare(args.before, args.after, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
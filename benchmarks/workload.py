@@ -0,0 +1,171 @@
+"""
+Seeded synthetic AQL workload: queries in several size classes, and a
+SQLite database of resumes for them to run against.
+
+The same seed always yields the same queries and the same rows, so runs
+of the benchmark suite on different commits measure identical work.
+"""
+import random
+import sqlite3
+from typing import List, Dict, Callable, Optional
+from aql.db.sqlite_schema import create_sqlite_database
+
+SKILLS = [
+    'Python', 'Go', 'Java', 'Rust', 'SQL', 'AWS', 'Docker', 'Kubernetes', 'ReactJS', 'NodeJS',
+    'TypeScript', 'C++', 'Scala', 'Kafka', 'Spark', 'PostgreSQL', 'Redis', 'Terraform', 'GraphQL', 'Swift',
+]
+LOCATIONS = [
+    'San Francisco', 'New York', 'Berlin', 'London', 'Toronto', 'Austin', 'Seattle', 'Paris', 'Remote', 'Singapore',
+]
+EXPERIENCE_LEVELS = ['Entry Level', 'Mid Level', 'Senior', 'Staff', 'Principal']
+DEGREES = ['Bachelor Degree', 'Master Degree', 'PhD', 'Associate Degree']
+
+def quote(value: str) -> str:
+    # Vocabulary values contain no quotes
+    return f"'{value}'"
+
+class QueryGenerator:
+    """
+    Generates AQL queries from a seed. Every size class is a method
+    returning one query; SIZE_CLASSES names them for the suite.
+    """
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+
+    def predicate(self) -> str:
+        """One comparison on a random field, with a realistic literal"""
+        choice = self.random.randrange(8)
+        if choice == 0:
+            return f"SKILLS = {quote(self.random.choice(SKILLS))}"
+        if choice == 1:
+            values = self.random.sample(SKILLS, self.random.randint(2, 4))
+            return f"SKILLS IN {{{', '.join(map(quote, values))}}}"
+        if choice == 2:
+            return f"LOCATION = {quote(self.random.choice(LOCATIONS))}"
+        if choice == 3:
+            return f"EXPERIENCE = {quote(self.random.choice(EXPERIENCE_LEVELS))}"
+        if choice == 4:
+            return f"EDUCATION = {quote(self.random.choice(DEGREES))}"
+        if choice == 5:
+            return f"SALARY >= {self.random.randrange(60, 250) * 1000}"
+        operator = self.random.choice(['>', '>=', '<', '<='])
+        return f"YOE {operator} {self.random.randint(0, 15)}"
+
+    def single(self) -> str:
+        return self.predicate()
+
+    def dashboard(self) -> str:
+        """What a recruiter dashboard sends: a few ANDed filters, an alternative, a sort"""
+        terms = [self.predicate() for _ in range(self.random.randint(2, 4))]
+        if self.random.random() < 0.5:
+            terms.append(f"({self.predicate()} OR {self.predicate()})")
+        if self.random.random() < 0.2:
+            terms.append(f"NOT {self.predicate()}")
+        query = ' AND '.join(terms)
+        if self.random.random() < 0.5:
+            key = self.random.choice(['YOE', 'SALARY'])
+            query += f" ORDER BY {key} {self.random.choice(['ASC', 'DESC'])} LIMIT {self.random.choice([20, 50, 100])}"
+        return query
+
+    def or_chain(self, terms: int = 1_000) -> str:
+        """Machine-built alternatives, e.g. one per saved search"""
+        return ' OR '.join(self.predicate() for _ in range(terms))
+
+    def in_set(self, values: int = 10_000) -> str:
+        """A SKILLS set from a skill taxonomy export, plus a filter"""
+        known = self.random.sample(SKILLS, 3)
+        start = self.random.randrange(1_000_000)
+        members = ', '.join(map(quote, known + [f"skill{start + i}" for i in range(values - len(known))]))
+        return f"SKILLS IN {{{members}}} AND YOE >= {self.random.randint(0, 10)}"
+
+    def nested(self, depth: int = 200) -> str:
+        """Groups nested depth deep, alternating AND and OR"""
+        query = self.predicate()
+        for level in range(depth):
+            operator = 'AND' if level % 2 else 'OR'
+            query = f"({self.predicate()} {operator} {query})"
+        return query
+
+# Size class -> how to generate a query of it
+SIZE_CLASSES: Dict[str, Callable[[QueryGenerator], str]] = {
+    'single': QueryGenerator.single,
+    'dashboard': QueryGenerator.dashboard,
+    'or_chain_1k': QueryGenerator.or_chain,
+    'in_set_10k': QueryGenerator.in_set,
+    'nested_200': QueryGenerator.nested,
+}
+
+def generate(size_class: str, count: int, seed: int = 0) -> List[str]:
+    """count queries of a size class"""
+    if size_class not in SIZE_CLASSES:
+        raise ValueError(f"Unknown size class: {size_class}")
+    generator = QueryGenerator(seed)
+    return [SIZE_CLASSES[size_class](generator) for _ in range(count)]
+
+# Share of each size class in a replay log: mostly small dashboard traffic
+LOG_MIX = {'single': 0.45, 'dashboard': 0.5, 'or_chain_1k': 0.001, 'in_set_10k': 0.001, 'nested_200': 0.048}
+
+def write_query_log(path: str, count: int, seed: int = 0) -> None:
+    """Write count queries, one per line, mixing the size classes as LOG_MIX does"""
+    generator = QueryGenerator(seed)
+    classes = list(LOG_MIX)
+    weights = list(LOG_MIX.values())
+    with open(path, 'w') as f:
+        for size_class in generator.random.choices(classes, weights, k=count):
+            f.write(SIZE_CLASSES[size_class](generator))
+            f.write('\n')
+
+def populate_database(connection: sqlite3.Connection, resumes: int = 5_000, seed: int = 0) -> None:
+    """Insert resumes with skills and degrees, drawn from the workload vocabulary"""
+    rng = random.Random(seed)
+    connection.executemany("INSERT INTO skills (name) VALUES (?)", [(name,) for name in SKILLS])
+    resume_rows = []
+    skill_rows = []
+    education_rows = []
+    for resume_id in range(1, resumes + 1):
+        yoe = round(rng.uniform(0, 25), 1)
+        resume_rows.append((
+            resume_id, f"Candidate {resume_id}", f"candidate{resume_id}@example.com",
+            # Some resumes leave optional fields empty
+            rng.choice(LOCATIONS) if rng.random() < 0.95 else None,
+            yoe,
+            rng.randrange(50, 300) * 1000 if rng.random() < 0.8 else None,
+            EXPERIENCE_LEVELS[min(int(yoe // 5), len(EXPERIENCE_LEVELS) - 1)],
+        ))
+        for skill_id in rng.sample(range(1, len(SKILLS) + 1), rng.randint(1, 6)):
+            skill_rows.append((resume_id, skill_id))
+        for degree in rng.sample(DEGREES, rng.choice([0, 1, 1, 2])):
+            education_rows.append((resume_id, degree))
+    connection.executemany(
+        "INSERT INTO resumes (id, name, email, location, years_of_experience, current_salary, experience_level)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        resume_rows
+    )
+    connection.executemany("INSERT INTO resume_skills (resume_id, skill_id) VALUES (?, ?)", skill_rows)
+    connection.executemany(
+        "INSERT INTO education (resume_id, degree, institution) VALUES (?, ?, 'Example University')",
+        education_rows
+    )
+    connection.commit()
+
+def create_workload_database(path: str = ':memory:', resumes: int = 5_000, seed: int = 0,
+                             connection: Optional[sqlite3.Connection] = None) -> sqlite3.Connection:
+    """Create the schema.sql tables in SQLite and fill them with seeded resumes"""
+    connection = create_sqlite_database(path, connection=connection)
+    populate_database(connection, resumes, seed)
+    connection.execute("ANALYZE")
+    return connection
+
+if __name__ == "__main__":
+    # python -m benchmarks.workload queries.log 100000 [--database resumes.db]
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.workload', description="Write a seeded query log")
+    parser.add_argument('log')
+    parser.add_argument('count', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help="also create a seeded SQLite database at this path")
+    parser.add_argument('--resumes', type=int, default=5_000)
+    args = parser.parse_args()
+    write_query_log(args.log, args.count, args.seed)
+    if args.database:
+        create_workload_database(args.database, args.resumes, args.seed).close()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from aql.db.executor import ConnectionPool, AsyncQueryExecutor
+from aql.db.result_cache import ResultCache
+from aql.db.sql_builder import ParamStyle
+from aql.db.sqlite_schema import create_sqlite_database
+from aql.instrumentation import Instrumentation, install
+from test_query_translation import load_sample_resumes
+
+# Counts to 10^8, long enough to hit any timeout below
+SLOW_SQL = (
+    "WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < 100000000) "
+    "SELECT count(*) FROM counter"
+)
+
+def create_database(path: str):
+    connection = create_sqlite_database(path)
+    load_sample_resumes(connection)
+    connection.commit()
+    connection.close()
+
+async def check_single_flight(executor: AsyncQueryExecutor):
+    print("\nSingle-flight coalescing")
+    print("-" * 50)
+    query_str = "SKILLS = 'Python' AND LOCATION = 'San Francisco'"
+    results = await asyncio.gather(*[executor.execute(query_str) for _ in range(50)])
+    print(f"50 concurrent requests -> {len(results[0])} rows each")
+    print("Stats:", executor.stats())
+    assert all(rows == results[0] for rows in results) and len(results[0]) == 1
+    assert executor.stats().executed == 1 and executor.stats().coalesced == 49
+    print("-" * 50)
+
+async def check_timeout(executor: AsyncQueryExecutor):
+    print("\nTimeouts and cancellation")
+    print("-" * 50)
+    start = time.perf_counter()
+    try:
+        await executor.execute_sql(SLOW_SQL, [], timeout=0.2)
+        raise AssertionError("expected a timeout")
+    except asyncio.TimeoutError:
+        print(f"Timed out after {time.perf_counter() - start:.2f}s")
+
+    # A cancelled caller leaves the shared execution to the remaining one
+    first = asyncio.ensure_future(executor.execute("YOE > 5"))
+    second = asyncio.ensure_future(executor.execute("YOE > 5"))
+    await asyncio.sleep(0)
+    first.cancel()
+    rows = await second
+    print(f"Remaining caller got {len(rows)} rows")
+    assert len(rows) == 2 and first.cancelled()
+    print("Stats:", executor.stats())
+    print("-" * 50)
+
+async def check_instrumentation(executor: AsyncQueryExecutor):
+    print("\nExecution tracing")
+    print("-" * 50)
+    instrumentation = Instrumentation(slow_query_threshold=0)
+    previous = install(instrumentation)
+    try:
+        for query_str in ["YOE > 5", "YOE > 5", "SKILLS = 'Python'"]:
+            await executor.execute(query_str)
+    finally:
+        install(previous)
+    snapshots = instrumentation.snapshot()
+    execute = snapshots['execute']
+    print(f"execute count={execute.count} p50={execute.p50 * 1000:.3f}ms max={execute.max * 1000:.3f}ms")
+    assert execute.count == snapshots['total'].count == 3
+    assert all('execute' in slow_query.timings for slow_query in instrumentation.slow_queries)
+    print("-" * 50)
+
+async def check_result_cache(pool: ConnectionPool, path: str):
+    print("\nResult cache")
+    print("-" * 50)
+    cache = ResultCache(max_bytes=1 << 20)
+    executor = AsyncQueryExecutor(pool, param_style=ParamStyle.QMARK, result_cache=cache, version_refresh=0)
+    skills = "SKILLS = 'Python'"
+    experience = "YOE > 5"
+    first = await executor.execute(skills)
+    await executor.execute(experience)
+    assert await executor.execute(skills) == first and executor.stats().executed == 2
+
+    # The triggers bump education only, which neither query reads
+    writer = sqlite3.connect(path)
+    writer.execute("INSERT INTO education (resume_id, degree, institution) VALUES (1, 'PhD', 'MIT')")
+    writer.commit()
+    await executor.execute(skills)
+    await executor.execute(experience)
+    assert executor.stats().executed == 2
+
+    # A new Python resume bumps resumes and resume_skills, invalidating both
+    resume_id = writer.execute(
+        "INSERT INTO resumes (name, email, location, years_of_experience) "
+        "VALUES ('New Hire', 'new.hire@example.com', 'Austin', 9)"
+    ).lastrowid
+    writer.execute("INSERT INTO resume_skills (resume_id, skill_id) SELECT ?, id FROM skills WHERE name = 'Python'",
+                   [resume_id])
+    writer.commit()
+    writer.close()
+    assert len(await executor.execute(skills)) == len(first) + 1
+    await executor.execute(experience)
+    assert executor.stats().executed == 4
+
+    # Explicit invalidation drops entries eagerly
+    assert cache.invalidate('skills') == 1 and len(cache) == 1
+    stats = cache.stats()
+    print("Stats:", stats, f"hit rate {stats.hit_rate:.0%}")
+    assert stats.hits == 3 and stats.invalidations == 3 and 0 < stats.bytes <= stats.max_bytes
+
+    # TTL and the byte bound, on a clock the check controls
+    now = [0.0]
+    cache = ResultCache(max_bytes=16384, ttl=10.0, clock=lambda: now[0])
+    rows = [(i, f"resume {i}") for i in range(10)]
+    for i in range(20):
+        assert cache.put("SELECT ?", [i], ['resumes'], cache.versions.current(['resumes']), rows)
+    assert cache.stats().evictions > 0 and cache.stats().bytes <= 16384
+    assert not cache.put("SELECT ?", [-1], ['resumes'], (0,), rows * 10)
+    assert cache.lookup("SELECT ?", [19], ['resumes'])[0] == rows
+    now[0] = 10.0
+    assert cache.lookup("SELECT ?", [19], ['resumes'])[0] is None and cache.stats().expirations == 1
+    print("Stats:", cache.stats())
+    print("-" * 50)
+
+async def run_checks(path: str):
+    pool = ConnectionPool(lambda: sqlite3.connect(path), max_size=4)
+    executor = AsyncQueryExecutor(pool, param_style=ParamStyle.QMARK)
+    try:
+        await check_single_flight(executor)
+        await check_timeout(executor)
+        await check_instrumentation(executor)
+        await check_result_cache(pool, path)
+        assert pool.size <= pool.max_size
+    finally:
+        await pool.close()
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'aql.db')
+        create_database(path)
+        asyncio.run(run_checks(path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import re
+import time
+from aql import parse
+from aql.memory.records import CandidateRecord
+from aql.memory.compiler import filter_candidates
+from aql.memory.columnar import ColumnarSnapshot, ColumnarExecutor
+from aql.memory.inverted_index import InvertedIndex
+from aql.memory.percolator import Percolator
+from aql.facets import Facet
+from aql.db.facets import execute_facets
+from aql.db.ranking import execute_top_k, translate_top_k
+from aql.memory.ranking import top_k
+from aql.scoring import ScoreSpec, Closeness
+from aql.db.sql_builder import ParamStyle
+from test_pagination import create_database
+
+CANDIDATES = [
+    CandidateRecord(1, location='San Francisco', years_of_experience=7, current_salary=180000,
+                    experience_level='Senior', skills=frozenset({'Python', 'Go'}),
+                    education=frozenset({'Master Degree'})),
+    CandidateRecord(2, location='New York', years_of_experience=2, current_salary=90000,
+                    experience_level='Entry Level', skills=frozenset({'Java'}),
+                    education=frozenset({'Bachelor Degree'})),
+    CandidateRecord(3, location=None, years_of_experience=None, current_salary=None,
+                    skills=frozenset({'Python', 'SQL'})),
+    CandidateRecord(4, location='Berlin', years_of_experience=12, current_salary=150000,
+                    experience_level='Senior'),
+]
+
+def check_filter(query_str: str, expected_ids: list):
+    print(f"\nAQL Query: {query_str}")
+    print("-" * 50)
+    ids = [record.id for record in filter_candidates(query_str, CANDIDATES)]
+    print("Matching ids:", ids)
+    assert ids == expected_ids, f"expected {expected_ids}"
+    columnar_ids = ColumnarExecutor(ColumnarSnapshot(CANDIDATES)).filter_ids(query_str).tolist()
+    print("Columnar ids:", columnar_ids)
+    assert columnar_ids == expected_ids, f"expected {expected_ids}"
+    indexed_ids = list(InvertedIndex.from_records(CANDIDATES).search(query_str))
+    print("Indexed ids:", indexed_ids)
+    assert indexed_ids == expected_ids, f"expected {expected_ids}"
+    print("-" * 50)
+
+def deep_query(depth: int) -> str:
+    """Groups nested depth deep that reduce to LOCATION != 'Nowhere' AND YOE > 5"""
+    query_str = "YOE > 5"
+    for level in range(depth):
+        if level % 2:
+            query_str = f"(LOCATION != 'Nowhere' AND {query_str})"
+        else:
+            query_str = f"(SKILLS = 'Cobol' OR {query_str})"
+    return query_str
+
+def check_deep_nesting(depth: int = 2000):
+    print(f"\nNesting {depth} deep")
+    print("-" * 50)
+    query = parse(deep_query(depth))
+    ids = [record.id for record in filter_candidates(query, CANDIDATES)]
+    print("Matching ids:", ids)
+    assert ids == [1, 4]
+    print("-" * 50)
+
+def check_index_maintenance():
+    print("\nInverted index maintenance")
+    print("-" * 50)
+    index = InvertedIndex.from_records(CANDIDATES)
+    index.update(CandidateRecord(2, location='Berlin', skills=frozenset({'Java', 'Rust'})))
+    index.delete(1)
+    index.add(CandidateRecord(5, location='Berlin', skills=frozenset({'Rust'})))
+    ids = list(index.search("SKILLS = 'Rust' AND LOCATION = 'Berlin'"))
+    print("Rust in Berlin:", ids)
+    assert ids == [2, 5]
+    assert list(index.search("SKILLS = 'Go'")) == []
+    rebuilt = InvertedIndex.from_records(index.records.values())
+    assert all(
+        {value: list(bitmap) for value, bitmap in index.postings[name].items()}
+        == {value: list(bitmap) for value, bitmap in rebuilt.postings[name].items()}
+        for name in index.postings
+    )
+    print("Footprint:", index.footprint())
+    print("-" * 50)
+
+def check_range_index():
+    print("\nRange index probes")
+    print("-" * 50)
+    index = InvertedIndex.from_records(CANDIDATES)
+    # Both bounds on YOE collapse into one probe
+    operands = parse("YOE >= 3 AND YOE < 8 AND LOCATION = 'Berlin'").expression.operands
+    grouped = index._group_ranges(operands)
+    print("Conjunction evaluated as:", [type(operand).__name__ for operand in grouped])
+    assert len(grouped) == 2
+    assert list(index.search("YOE >= 3 AND YOE < 8")) == [1]
+
+    for resume_id in range(5, 105):
+        index.add(CandidateRecord(resume_id, years_of_experience=resume_id % 10))
+    index.update(CandidateRecord(4, location='Berlin', years_of_experience=1))
+    index.delete(7)
+    ids = list(index.search("YOE >= 3 AND YOE < 4"))
+    print("YOE in [3, 4):", ids)
+    assert ids == [13, 23, 33, 43, 53, 63, 73, 83, 93, 103]
+    assert list(index.search("NOT YOE > 1 AND LOCATION = 'Berlin'")) == [4]
+    print("-" * 50)
+
+def check_percolator():
+    print("\nSaved-search percolator")
+    print("-" * 50)
+    percolator = Percolator()
+    saved_searches = {
+        'python': "SKILLS IN {'Python', 'Rust'}",
+        'senior': "YOE >= 5 AND SALARY < 175000",
+        'not-java': "NOT SKILLS = 'Java'",
+        'nyc-or-berlin': "LOCATION = 'New York' OR LOCATION = 'Berlin'",
+        'never': "YOE > 10 AND YOE < 3",
+    }
+    for query_id, query_str in saved_searches.items():
+        percolator.register(query_id, query_str)
+    percolator.unregister('not-java')
+    print("Stats:", percolator.stats())
+
+    matches = percolator.match_many(CANDIDATES)
+    for resume_id, query_ids in matches.items():
+        print(f"Resume {resume_id}: {sorted(query_ids)}")
+    assert matches == {1: {'python'}, 2: {'nyc-or-berlin'}, 3: {'python'}, 4: {'senior', 'nyc-or-berlin'}}
+
+    # Machine-generated searches nest hundreds of groups deep
+    for optimize in (True, False):
+        deep = Percolator(optimize=optimize)
+        deep.register('deep', deep_query(2000))
+        deep.register('python', saved_searches['python'])
+        assert 'deep' not in deep.unanchored
+        matches = deep.match_many(CANDIDATES)
+        print(f"Deep search, optimize={optimize}:", {resume_id: sorted(ids) for resume_id, ids in matches.items()})
+        assert matches == {1: {'deep', 'python'}, 2: set(), 3: {'python'}, 4: {'deep'}}
+    print("-" * 50)
+
+def load_records(connection):
+    """Read the resumes of a SQLite database into candidate records"""
+    cursor = connection.execute("SELECT * FROM resumes ORDER BY id")
+    columns = [description[0] for description in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    skills, education = {}, {}
+    for resume_id, name in connection.execute(
+        "SELECT resume_id, name FROM resume_skills JOIN skills ON skills.id = skill_id"
+    ):
+        skills.setdefault(resume_id, []).append(name)
+    for resume_id, degree in connection.execute("SELECT resume_id, degree FROM education"):
+        education.setdefault(resume_id, []).append(degree)
+    return [
+        CandidateRecord.from_row(row, skills.get(row['id'], ()), education.get(row['id'], ()))
+        for row in rows
+    ]
+
+def check_facets():
+    print("\nFacet counts: SQL vs columnar")
+    print("-" * 50)
+    connection = create_database()
+    executor = ColumnarExecutor(ColumnarSnapshot(load_records(connection)))
+    facets = [
+        Facet('SKILLS', limit=3),
+        Facet('LOCATION'),
+        Facet('EXPERIENCE'),
+        Facet('EDUCATION'),
+        Facet('YOE', edges=(2, 5, 10)),
+        Facet('SALARY', edges=(100000, 150000)),
+    ]
+    for query_str in ["YOE > 1 OR SALARY > 90000", "NOT SKILLS = 'Java'", "LOCATION = 'Atlantis'"]:
+        expected = execute_facets(connection.cursor(), query_str, facets, ParamStyle.QMARK)
+        actual = executor.facets(query_str, facets)
+        assert actual == expected, f"{query_str}\nSQL: {expected}\ncolumnar: {actual}"
+        for name in expected.facets:
+            assert list(actual.facets[name]) == list(expected.facets[name]), name
+        assert expected.total == executor.count(query_str)
+        print(f"{query_str} -> {expected.total} matches")
+        for name, counts in expected.facets.items():
+            print(f"  {name}: {counts}")
+    for facet in [lambda: Facet('YOE'), lambda: Facet('SKILLS', edges=(1,)), lambda: Facet('YOE', edges=(5, 2))]:
+        try:
+            facet()
+            raise AssertionError("expected an invalid facet")
+        except ValueError as e:
+            print("Rejected:", e)
+    print("-" * 50)
+
+def check_top_k():
+    print("\nTop-k ranking: SQL vs bounded heap")
+    print("-" * 50)
+    connection = create_database()
+    records = load_records(connection)
+    spec = ScoreSpec(
+        weights={'SKILLS': 2.0, 'EDUCATION': 1.5, 'LOCATION': 3.0},
+        closeness=(Closeness('YOE', target=6, scale=4), Closeness('SALARY', 120000, 50000, weight=0.5))
+    )
+    cases = [
+        ("SKILLS IN {'Python', 'Go', 'Rust'} OR LOCATION = 'Berlin'", spec, None),
+        ("(SKILLS = 'Python' OR EDUCATION = 'PhD') AND NOT LOCATION = 'New York'", spec, ['id', 'name']),
+        ("YOE >= 2 AND (SALARY > 100000 OR EXPERIENCE = 'Senior')", None, ['id']),
+        ("SKILLS IN {} OR YOE < 3", spec, ['id', 'years_of_experience']),
+    ]
+    for query_str, score_spec, columns in cases:
+        for k in (1, 10, 1000):
+            rows = execute_top_k(connection.cursor(), query_str, k, score_spec, ParamStyle.QMARK, columns=columns)
+            expected = top_k(query_str, records, k, score_spec)
+            assert [row[0] for row in rows] == [record.id for _, record in expected], query_str
+            for row, (score, _) in zip(rows, expected):
+                assert abs(row[-1] - score) < 1e-9, (query_str, row, score)
+        print(f"{query_str} -> {[(row[0], round(row[-1], 2)) for row in rows[:3]]}")
+
+    # Score parameters are cast, so server-side prepared statements type them as floats
+    sql, params = translate_top_k(cases[0][0], 10, spec, ParamStyle.DOLLAR)
+    cast = [int(n) for n in re.findall(r'CAST\(\$(\d+) AS double precision\)', sql)]
+    print(f"{len(cast)} score parameters cast:", [params[n - 1] for n in cast])
+    # A weight for each of the two conditions, five parameters per closeness term
+    assert len(cast) == 2 + 5 * 2 and all(isinstance(params[n - 1], float) for n in cast)
+    assert ' ELSE 0 ' not in sql and ',0)' not in sql
+    try:
+        ScoreSpec(closeness=(Closeness('LOCATION', 'Berlin', 1),))
+        raise AssertionError("expected an invalid closeness term")
+    except ValueError as e:
+        print("Rejected:", e)
+    print("-" * 50)
+
+def check_throughput(count: int = 200000):
+    records = [CANDIDATES[i % len(CANDIDATES)] for i in range(count)]
+    query_str = "YOE >= 3 AND SKILLS IN {'Python', 'Go'} AND (LOCATION = 'San Francisco' OR SALARY > 150000)"
+    start = time.perf_counter()
+    filter_candidates(query_str, records)
+    elapsed = time.perf_counter() - start
+    print(f"\nFiltered {count} records at {count / elapsed / 1e6:.2f}M records/sec")
+
+    executor = ColumnarExecutor(ColumnarSnapshot(records))
+    searches = [f"YOE >= {i % 10} AND SKILLS IN {{'Python', 'Go'}}" for i in range(100)]
+    start = time.perf_counter()
+    counts = executor.count_many(searches)
+    elapsed = time.perf_counter() - start
+    print(f"Counted {len(searches)} saved searches over {count} records in {elapsed:.3f}s (columnar)")
+    assert counts[0] == len(filter_candidates(searches[0], records))
+
+def main():
+    check_filter("YOE > 5", [1, 4])
+    check_filter("SKILLS IN {'Python', 'Rust'} AND LOCATION != 'Berlin'", [1])
+    # NULL fields never satisfy a comparison, nor its negation
+    check_filter("NOT YOE > 5", [2])
+    check_filter("NOT (YOE > 5 OR LOCATION = 'New York')", [])
+    # SKILLS/EDUCATION predicates ask whether any value matches
+    check_filter("SKILLS = 'Python' AND SKILLS = 'SQL'", [3])
+    check_filter("NOT SKILLS = 'Java'", [1, 3, 4])
+    check_filter("EDUCATION != 'Master Degree'", [2])
+    check_deep_nesting()
+    check_index_maintenance()
+    check_range_index()
+    check_percolator()
+    check_facets()
+    check_top_k()
+    check_throughput()
+
+if __name__ == "__main__":
+    main()
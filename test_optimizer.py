@@ -0,0 +1,68 @@
+from aql import parse, optimize, is_unsatisfiable
+from aql.db.query_translator import translate_query
+from aql.optimizer import SubtreeKeys
+
+def check_rewrite(query_str: str, expected_where: str):
+    print(f"\nAQL Query: {query_str}")
+    print("-" * 50)
+    sql, params = translate_query(query_str, optimize=True)
+    where = sql.split(" WHERE ", 1)[1]
+    print("Optimized WHERE:", where)
+    print("Parameters:", params)
+    assert where == expected_where, f"expected {expected_where}"
+    print("-" * 50)
+
+def nested_query(depth: int) -> str:
+    """Groups nested depth deep, alternating AND and OR"""
+    query_str = "YOE > 0"
+    for level in range(depth):
+        operator = "AND" if level % 2 else "OR"
+        query_str = f"(SKILLS = 'skill{level}' {operator} {query_str})"
+    return query_str
+
+def check_deep_nesting(depth: int = 2000):
+    print(f"\nNesting {depth} deep")
+    print("-" * 50)
+    query_str = nested_query(depth)
+    optimized = optimize(parse(query_str))
+    # Repeated subtrees are still found at any depth
+    doubled = optimize(parse(f"{query_str} OR {query_str}"))
+    keys = SubtreeKeys()
+    assert keys.key(doubled.expression) == keys.key(optimized.expression)
+    sql, params = translate_query(query_str, optimize=True)
+    print(f"{len(params)} parameters, {len(sql)} characters of SQL")
+    assert len(params) == depth + 1
+    print("-" * 50)
+
+def main():
+    # NOT pushed down so the index on years_of_experience stays usable
+    check_rewrite("NOT YOE > 5", '"years_of_experience"<=5')
+    check_rewrite("NOT (YOE > 5 OR SALARY < 1000)", '"years_of_experience"<=5 AND "current_salary">=1000')
+
+    # Equalities on one field merged into IN
+    check_rewrite(
+        "LOCATION = 'A' OR LOCATION = 'B' OR LOCATION IN {'C', 'A'}",
+        '"location" IN (\'A\',\'B\',\'C\')'
+    )
+
+    # Repeated predicates and overlapping ranges collapsed
+    check_rewrite("YOE > 3 AND YOE >= 3 AND YOE > 3", '"years_of_experience">3')
+    check_rewrite("YOE >= 3 AND YOE < 8 AND YOE > 1", '"years_of_experience">=3 AND "years_of_experience"<8')
+    check_rewrite("YOE > 3 OR YOE > 5 OR YOE = 7", '"years_of_experience">3')
+
+    # SKILLS holds several values per resume: negation is kept, AND is not intersected
+    check_rewrite(
+        "NOT SKILLS = 'Java' AND SKILLS = 'Go' AND SKILLS = 'Rust'",
+        'NOT "skills"."name"=\'Java\' AND "skills"."name"=\'Go\' AND "skills"."name"=\'Rust\''
+    )
+
+    # Contradictions need no database round trip
+    for query_str in ["YOE > 10 AND YOE < 3", "LOCATION = 'A' AND LOCATION IN {'B', 'C'}"]:
+        optimized = optimize(parse(query_str))
+        print(f"{query_str} -> unsatisfiable: {is_unsatisfiable(optimized)}")
+        assert is_unsatisfiable(optimized)
+
+    check_deep_nesting()
+
+if __name__ == "__main__":
+    main()
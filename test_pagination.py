@@ -0,0 +1,173 @@
+import random
+from functools import cmp_to_key
+from aql import parse, Query
+from aql.db.pagination import KeysetPaginator, stream_query
+from aql.db.query_translator import translate_query
+from aql.db.sql_builder import ParamStyle
+from aql.db.sql_codegen import SQLGenerator
+from aql.db.sqlite_schema import create_sqlite_database
+
+LOCATIONS = ['San Francisco', 'New York', 'Berlin', None]
+SKILLS = ['Python', 'Go', 'Java', 'Rust']
+LEVELS = ['Junior', 'Senior', None]
+DEGREES = ['Bachelor Degree', 'Master Degree', 'PhD']
+
+def create_database(count: int = 300, seed: int = 7):
+    """SQLite database of resumes with repeated and NULL sort keys, skills and degrees"""
+    rng = random.Random(seed)
+    connection = create_sqlite_database()
+    for name in SKILLS:
+        connection.execute("INSERT INTO skills (name) VALUES (?)", (name,))
+    for index in range(1, count + 1):
+        yoe = rng.choice([None, rng.randint(0, 15)])
+        salary = rng.choice([None, rng.randint(5, 20) * 10000])
+        connection.execute(
+            "INSERT INTO resumes (name, email, location, years_of_experience, current_salary,"
+            " experience_level) VALUES (?, ?, ?, ?, ?, ?)",
+            (f"Resume {index}", f"r{index}@example.com", rng.choice(LOCATIONS), yoe, salary,
+             rng.choice(LEVELS))
+        )
+        # Some resumes list the same degree twice
+        for degree in rng.choices(DEGREES, k=rng.randint(0, 2)):
+            connection.execute(
+                "INSERT INTO education (resume_id, degree, institution) VALUES (?, ?, 'Example University')",
+                (index, degree)
+            )
+        for skill in rng.sample(SKILLS, rng.randint(0, 3)):
+            connection.execute(
+                "INSERT INTO resume_skills (resume_id, skill_id) SELECT ?, id FROM skills WHERE name = ?",
+                (index, skill)
+            )
+    return connection
+
+SORT_COLUMNS = {'YOE': 'years_of_experience', 'SALARY': 'current_salary', 'LOCATION': 'location'}
+
+def expected_rows(connection, query_str: str):
+    """All rows of a query sorted in Python the way pages are: NULLs last, then by id"""
+    query = parse(query_str)
+    sql, params = SQLGenerator(ParamStyle.QMARK, semi_joins=True).translate(Query(query.expression))
+    cursor = connection.execute(sql, params)
+    columns = [description[0] for description in cursor.description]
+    positions = [(columns.index(SORT_COLUMNS[key.field.name]), key.descending) for key in query.order_by]
+
+    def compare(a, b):
+        for position, descending in positions + [(columns.index('id'), False)]:
+            x, y = a[position], b[position]
+            if x == y:
+                continue
+            if x is None or y is None:
+                return 1 if x is None else -1
+            return (-1 if x < y else 1) * (-1 if descending else 1)
+        return 0
+
+    rows = sorted(cursor.fetchall(), key=cmp_to_key(compare))
+    return rows if query.limit is None else rows[:query.limit]
+
+def check_pages(connection):
+    print("\nKeyset pagination")
+    print("-" * 50)
+    for query_str in [
+        "YOE > 1",
+        "YOE >= 0 OR SALARY > 0 ORDER BY YOE",
+        "SKILLS IN {'Go', 'Rust'} ORDER BY YOE DESC, SALARY",
+        "NOT SKILLS = 'Java' ORDER BY SALARY DESC, YOE DESC",
+        "LOCATION != 'Berlin' ORDER BY LOCATION, YOE LIMIT 55",
+        "SALARY > 100000 ORDER BY LOCATION DESC LIMIT 20",
+    ]:
+        expected = expected_rows(connection, query_str)
+        for page_size in (1, 7, 50, 1000):
+            paginator = KeysetPaginator(query_str, page_size, param_style=ParamStyle.QMARK)
+            rows, pages, cursor = [], 0, None
+            while True:
+                page = paginator.fetch_page(connection.cursor(), cursor)
+                assert len(page.rows) <= page_size
+                rows.extend(page.rows)
+                pages += 1
+                if page.cursor is None:
+                    break
+                cursor = page.cursor
+            assert rows == expected, (query_str, page_size)
+            assert list(paginator.iter_rows(connection.cursor())) == expected
+        print(f"{query_str} -> {len(expected)} rows, {pages} page(s) of {page_size}")
+    print("-" * 50)
+
+def check_cursors(connection):
+    print("\nPagination cursors")
+    print("-" * 50)
+    paginator = KeysetPaginator("YOE > 3 ORDER BY SALARY DESC", 10, param_style=ParamStyle.QMARK)
+    page = paginator.fetch_page(connection.cursor())
+    sql, params = paginator.page_sql(page.cursor)
+    print("Cursor:", page.cursor)
+    print("SQL Query:")
+    print(sql)
+    print("Parameters:", params)
+    assert ' OFFSET ' not in sql and params[-1] == 10
+
+    other = KeysetPaginator("YOE > 4 ORDER BY SALARY DESC", 10, param_style=ParamStyle.QMARK)
+    for cursor in [page.cursor[:-4], 'not a cursor', page.cursor]:
+        try:
+            other.fetch_page(connection.cursor(), cursor)
+            raise AssertionError("expected a rejected cursor")
+        except ValueError as e:
+            print(f"{cursor[:12]}... -> {e}")
+
+    dollar = KeysetPaginator("SKILLS = 'Go' ORDER BY YOE", 10, param_style=ParamStyle.DOLLAR)
+    sql, params = dollar.page_sql(dollar._encode(([4], 17)))
+    print(sql)
+    assert f"${len(params)}" in sql and "$6" not in sql, sql
+
+    # Cursors carry no row count, and no cursor reaches past the query's LIMIT
+    limited = KeysetPaginator("YOE > 1 ORDER BY YOE LIMIT 12", 5, param_style=ParamStyle.QMARK)
+    rows = list(limited.iter_rows(connection.cursor()))
+    assert len(rows) == 12
+    for last in rows[4], rows[-1]:
+        forged = limited._encode(([last[5]], last[0]))
+        following = limited.fetch_page(connection.cursor(), forged).rows
+        assert following == rows[rows.index(last) + 1:][:5], following
+    print(f"LIMIT 12 -> {len(rows)} rows, none past the limit from any cursor")
+    print("-" * 50)
+
+def check_projection(connection):
+    print("\nProjected pages")
+    print("-" * 50)
+    query_str = "SKILLS = 'Python' ORDER BY SALARY DESC"
+    columns = ['id', 'name', 'current_salary']
+    paginator = KeysetPaginator(query_str, 25, param_style=ParamStyle.QMARK, columns=columns)
+    rows = list(paginator.iter_rows(connection.cursor()))
+    expected = [(row[0], row[1], row[6]) for row in expected_rows(connection, query_str)]
+    assert rows == expected
+    print(f"{query_str} {columns} -> {len(rows)} rows, e.g. {rows[0]}")
+    try:
+        KeysetPaginator(query_str, columns=['name', 'location'])
+        raise AssertionError("expected missing pagination keys")
+    except ValueError as e:
+        print(f"['name', 'location'] -> {e}")
+    print("-" * 50)
+
+def check_streaming(connection):
+    print("\nStreaming")
+    print("-" * 50)
+    query_str = "YOE > 1 ORDER BY YOE"
+    sql, params = translate_query(query_str, param_style=ParamStyle.QMARK)
+    expected = connection.execute(sql, params).fetchall()
+    stream = stream_query(connection, query_str, batch_size=16, param_style=ParamStyle.QMARK)
+    first = next(stream)
+    rows = [first] + list(stream)
+    assert rows == expected
+    print(f"{query_str} -> {len(rows)} rows streamed in batches of 16")
+
+    # Closing the generator early closes its cursor
+    stream = stream_query(connection, query_str, batch_size=16, param_style=ParamStyle.QMARK)
+    next(stream)
+    stream.close()
+    print("-" * 50)
+
+def main():
+    connection = create_database()
+    check_pages(connection)
+    check_cursors(connection)
+    check_projection(connection)
+    check_streaming(connection)
+
+if __name__ == "__main__":
+    main()
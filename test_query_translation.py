@@ -1,4 +1,17 @@
+import multiprocessing
+import os
+import tempfile
+from aql import ParserError, parse, Value, SetLiteral
 from aql.db.query_translator import translate_query
+from aql.db.sql_codegen import SQLGenerator
+from aql.db.plan_cache import PlanCache, get_plan_cache
+from aql.db.shared_cache import SharedPlanCache, save_snapshot, plan_key
+from aql.db.sql_builder import ParamStyle, SetStyle, RESUME_COLUMNS, LARGE_SET_THRESHOLD
+from aql.db.batch import translate_many, execute_many
+from aql.db.prepared import PreparedStatementRegistry
+from aql.db.sqlite_schema import create_sqlite_database
+from aql.fields import FIELDS, FieldType, coerce_query
+from aql.instrumentation import Instrumentation, Exporter, install
 
 def test_translation(query_str: str):
     print(f"\nAQL Query: {query_str}")
@@ -12,9 +25,338 @@ def test_translation(query_str: str):
         print(f"Error: {e}")
     print("-" * 50)
 
+def check_plan_cache():
+    print("\nPlan cache")
+    print("-" * 50)
+    cache = get_plan_cache()
+    cache.clear()
+    for query_str in ["YOE > 5", "YOE > 7", "YOE > 5 AND LOCATION = 'Berlin'"]:
+        cached = translate_query(query_str)
+        assert cached == translate_query(query_str, use_cache=False), query_str
+        print(f"{query_str} -> {cached[0]}")
+    print("Stats:", cache.stats())
+    print("-" * 50)
+
+SHARED_QUERIES = [
+    "YOE > 5",
+    "NOT (YOE > 5 OR SKILLS IN {'Go', 'Go', 'Rust'}) AND LOCATION = 'Berlin' ORDER BY YOE DESC LIMIT 3",
+    "SKILLS IN {%s} AND SALARY >= '90000'" % ', '.join(f"'skill{i}'" for i in range(LARGE_SET_THRESHOLD + 5)),
+]
+
+def translate_shared(path: str, query_str: str):
+    """Translate through a shared cache in a fresh process"""
+    with SharedPlanCache(path) as shared:
+        result = PlanCache(shared=shared).translate(query_str, ParamStyle.QMARK, large_sets=SetStyle.JSON)
+        return result, shared.stats().hits
+
+def check_shared_cache():
+    print("\nShared plan cache")
+    print("-" * 50)
+    # Cached skeletons rebuild the parsed query without parsing it
+    cache = PlanCache()
+    for query_str in SHARED_QUERIES:
+        for large_sets in (None, SetStyle.JSON, SetStyle.ARRAY):
+            cache.parse(query_str, large_sets)
+            assert cache.parse(query_str, large_sets) == coerce_query(parse(query_str)), query_str
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'plans')
+        with SharedPlanCache(path, size=1 << 20) as shared:
+            first = PlanCache(shared=shared)
+            expected = [first.translate(q, ParamStyle.QMARK, large_sets=SetStyle.JSON) for q in SHARED_QUERIES]
+            print("Stats:", shared.stats())
+            assert shared.stats().entries == len(SHARED_QUERIES)
+
+            # A payload that does not decode is a miss, and the plan is compiled again
+            key = ('direct', False, None, None, ('unreadable',))
+            assert shared.put(shared.tag + plan_key(key), b'\xff')
+            hits, misses = shared.stats().hits, shared.stats().misses
+            assert shared.load(key) is None
+            assert (shared.stats().hits, shared.stats().misses) == (hits, misses + 1)
+
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                for query_str, result in zip(SHARED_QUERIES, expected):
+                    assert pool.apply(translate_shared, (path, query_str)) == (result, 1), query_str
+            print("Another process read every plan from the shared file")
+
+            snapshot = os.path.join(directory, 'hot.jsonl')
+            assert save_snapshot(snapshot, first) == len(SHARED_QUERIES)
+        # A file written by other code is reset, and warmed again from the snapshot
+        with SharedPlanCache(path, tag=b'next release') as shared:
+            assert shared.stats().entries == 0
+            assert shared.warm(snapshot) == len(SHARED_QUERIES) and shared.stats().entries == len(SHARED_QUERIES)
+        # A full table refuses new plans and leaves them to the local caches
+        with SharedPlanCache(os.path.join(directory, 'small'), size=4096, slots=4) as shared:
+            small = PlanCache(shared=shared)
+            for years in range(5):
+                small.translate(f"YOE > {years}" + " AND YOE > 1" * years)
+            assert shared.stats().entries == 3 and shared.stats().rejected == 2
+    print("-" * 50)
+
+def check_param_styles():
+    print("\nParameterized SQL")
+    print("-" * 50)
+    query_str = "LOCATION = 'San Francisco' AND (YOE > 5 OR SKILLS IN {'Rust', 'Go'})"
+    for style in ParamStyle:
+        sql, params = translate_query(query_str, param_style=style)
+        assert (sql, params) == translate_query(query_str, use_cache=False, param_style=style)
+        print(f"{style.name}: {sql}")
+        print("Parameters:", params)
+    print("-" * 50)
+
+def check_prepared_statements():
+    print("\nPrepared statements")
+    print("-" * 50)
+    registry = PreparedStatementRegistry(maxsize=2)
+
+    # The first query of a shape is prepared
+    statement, setup, params = registry.prepare_query("YOE > 5")
+    print(setup, params)
+    assert setup == [f"PREPARE {statement.name} AS {statement.sql}"] and params == [5]
+    assert statement.execute_sql() == f"EXECUTE {statement.name}(%s)"
+
+    # A repeat of the shape runs the prepared statement with no setup
+    repeat, setup, params = registry.prepare_query("YOE > 7")
+    assert repeat is statement and setup == [] and params == [7]
+
+    # A third shape evicts the least recently used one, deallocated first
+    second, setup, _ = registry.prepare_query("LOCATION = 'Berlin'")
+    registry.prepare_query("YOE > 9")
+    third, setup, _ = registry.prepare_query("SKILLS = 'Go'")
+    print(setup)
+    assert setup == [f"DEALLOCATE {second.name}", f"PREPARE {third.name} AS {third.sql}"]
+    assert registry.get(second.sql) is None and len(registry) == 2
+
+    # clear() deallocates every live statement
+    assert sorted(registry.clear()) == sorted([f"DEALLOCATE {statement.name}", f"DEALLOCATE {third.name}"])
+    assert len(registry) == 0
+    print("-" * 50)
+
+def check_semi_joins():
+    print("\nSemi-join translation")
+    print("-" * 50)
+    for query_str in [
+        "SKILLS = 'Python' AND SKILLS = 'Go'",
+        "NOT SKILLS = 'Java'",
+        "EDUCATION = 'Bachelor Degree' OR YOE > 5",
+    ]:
+        sql, params = translate_query(query_str, semi_joins=True)
+        assert "JOIN \"resumes\"" not in sql and "LEFT JOIN" not in sql, sql
+        print(f"{query_str} -> {sql}")
+    print("-" * 50)
+
+def load_sample_resumes(connection):
+    """Insert a few resumes with skills and degrees into a SQLite database"""
+    for name in ['Python', 'Go', 'Java']:
+        connection.execute("INSERT INTO skills (name) VALUES (?)", (name,))
+    resumes = [
+        ('Ada', 'San Francisco', 7, ['Python', 'Go'], 'Master Degree'),
+        ('Grace', 'New York', 2, ['Java'], 'Bachelor Degree'),
+        ('Linus', None, 12, ['Go'], 'Bachelor Degree'),
+    ]
+    for index, (name, location, yoe, skills, degree) in enumerate(resumes, start=1):
+        connection.execute(
+            "INSERT INTO resumes (name, email, location, years_of_experience) VALUES (?, ?, ?, ?)",
+            (name, f"{name.lower()}@example.com", location, yoe)
+        )
+        for skill in skills:
+            connection.execute(
+                "INSERT INTO resume_skills (resume_id, skill_id) SELECT ?, id FROM skills WHERE name = ?",
+                (index, skill)
+            )
+        connection.execute(
+            "INSERT INTO education (resume_id, degree, institution) VALUES (?, ?, 'Example University')",
+            (index, degree)
+        )
+
+def check_batch():
+    print("\nBatched execution")
+    print("-" * 50)
+    queries = [
+        "YOE > 5",
+        "SKILLS IN {'Go', 'Java'} AND LOCATION = 'New York'",
+        "EDUCATION = 'Bachelor Degree'",
+        "YOE > 5",
+        "YOE > 1 ORDER BY YOE DESC LIMIT 2",
+        "SKILLS IN {'Go', 'Python'} ORDER BY YOE",
+    ]
+    sql, params = translate_many(queries, param_style=ParamStyle.DOLLAR)
+    print("SQL Query:")
+    print(sql)
+    print("Parameters:", params)
+    assert sql.count(" UNION ALL ") == 4 and "$6" in sql
+    assert sql.endswith(' ORDER BY "aql_query","aql_row"')
+
+    connection = create_sqlite_database()
+    load_sample_resumes(connection)
+    for columns in (None, ['name']):
+        results = execute_many(connection.cursor(), queries, param_style=ParamStyle.QMARK, columns=columns)
+        for query_str, rows in zip(queries, results):
+            single_sql, single_params = translate_query(query_str, param_style=ParamStyle.QMARK, columns=columns)
+            expected = connection.execute(single_sql, single_params).fetchall()
+            if " ORDER BY " in query_str:
+                assert rows == expected, query_str
+            assert sorted(rows) == sorted(expected), query_str
+            if columns is None:
+                print(f"{query_str} -> {[row[1] for row in rows]}")
+    print("-" * 50)
+
+def check_projection():
+    print("\nProjection pushdown")
+    print("-" * 50)
+    connection = create_sqlite_database()
+    load_sample_resumes(connection)
+    schema_columns = tuple(row[1] for row in connection.execute("PRAGMA table_info(resumes)"))
+    assert schema_columns == RESUME_COLUMNS, schema_columns
+
+    columns = ['id', 'location']
+    sql, params = translate_query("LOCATION = 'New York'", param_style=ParamStyle.QMARK, columns=columns)
+    print(f"{columns} -> {sql}")
+    plan = ' '.join(row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    print("Plan:", plan)
+    assert "COVERING INDEX" in plan, plan
+    assert connection.execute(sql, params).fetchall() == [(2, 'New York')]
+
+    queries = ["SKILLS = 'Go'", "YOE > 5 ORDER BY YOE DESC LIMIT 1"]
+    results = execute_many(connection.cursor(), queries, ParamStyle.QMARK, columns=['id', 'name'])
+    print(f"{queries} -> {results}")
+    assert results == [[(1, 'Ada'), (3, 'Linus')], [(3, 'Linus')]]
+
+    for columns in [[], ['id', 'salary']]:
+        try:
+            translate_query("YOE > 5", columns=columns)
+            raise AssertionError("expected an invalid projection")
+        except ValueError as e:
+            print(f"{columns} -> {e}")
+    print("-" * 50)
+
+def check_large_sets():
+    print("\nLarge IN sets")
+    print("-" * 50)
+    sql, params = translate_query("SKILLS IN {'Go', 'Go', 'Java', 'Go'}")
+    print(f"Repeated members -> {params}")
+    assert params == ['Go', 'Java']
+
+    connection = create_sqlite_database()
+    load_sample_resumes(connection)
+    cache = get_plan_cache()
+    cache.clear()
+    for size in (LARGE_SET_THRESHOLD + 1, 10 * LARGE_SET_THRESHOLD):
+        fillers = ', '.join(f"'skill{i}'" for i in range(size))
+        query_str = f"SKILLS IN {{'Go', {fillers}, 'Go'}} OR LOCATION IN {{'New York', {fillers}}}"
+        sql, params = translate_query(query_str, param_style=ParamStyle.QMARK, large_sets=SetStyle.JSON)
+        assert len(params) == 2 and "json_each" in sql, sql
+        assert (sql, params) == translate_query(
+            query_str, use_cache=False, param_style=ParamStyle.QMARK, large_sets=SetStyle.JSON
+        )
+        expected_sql, expected_params = translate_query(query_str, use_cache=False, param_style=ParamStyle.QMARK)
+        rows = connection.execute(sql, params).fetchall()
+        assert sorted(rows) == sorted(connection.execute(expected_sql, expected_params).fetchall())
+        print(f"{size + 2} values -> {len(sql)} chars of SQL, {len(params)} parameters, "
+              f"{sorted({row[1] for row in rows})}")
+    print("Stats:", cache.stats())
+    assert cache.stats().size == 1
+
+    sql, params = translate_query(query_str, param_style=ParamStyle.DOLLAR, large_sets=SetStyle.ARRAY)
+    print(f"PostgreSQL: {sql}")
+    assert '"name"=ANY($1::text[])' in sql and params[0][:2] == ['Go', 'skill0']
+    print("-" * 50)
+
+def check_field_registry():
+    print("\nField registry")
+    print("-" * 50)
+    connection = create_sqlite_database()
+    for name, spec in FIELDS.items():
+        types = {row[1]: row[2] for row in connection.execute(f"PRAGMA table_info({spec.table})")}
+        assert spec.column in types, name
+        numeric = types[spec.column].startswith(('DECIMAL', 'INTEGER'))
+        assert (spec.type is FieldType.NUMERIC) == numeric, (name, types[spec.column])
+        leading = {
+            connection.execute(f"PRAGMA index_info({index[1]})").fetchone()[2]
+            for index in connection.execute(f"PRAGMA index_list({spec.table})")
+        }
+        assert spec.indexed == (spec.column in leading), name
+        print(f"{name}: {spec.table}.{spec.column} {spec.type.value}"
+              f"{', multi-valued' if spec.multi_valued else ''}{', indexed' if spec.indexed else ''}")
+
+    # EXPERIENCE is a resumes column, so it needs no join
+    sql, params = translate_query("EXPERIENCE = 'Senior' AND YOE > '3'", param_style=ParamStyle.QMARK)
+    print(f"EXPERIENCE = 'Senior' AND YOE > '3' -> {sql} {params}")
+    assert "JOIN" not in sql and params == ['Senior', 3]
+    sql, params = translate_query("LOCATION IN {5, '5', TRUE}", param_style=ParamStyle.QMARK)
+    assert params == ['5', 'true'], params
+    for use_cache in (True, False):
+        try:
+            translate_query("SALARY > 'high'", use_cache=use_cache)
+            raise AssertionError("expected a coercion error")
+        except ParserError as e:
+            print("Rejected:", e)
+
+    # The parser keeps literals as written; the translators coerce them
+    ast = parse("YOE > '3' AND LOCATION IN {5, '5'}")
+    assert [operand.value for operand in ast.expression.operands] == [Value('3'), SetLiteral([Value(5), Value('5')])]
+    assert SQLGenerator(ParamStyle.QMARK).translate(ast)[1] == [3, '5']
+    coerced = coerce_query(ast)
+    assert [operand.value for operand in coerced.expression.operands] == [Value(3), SetLiteral([Value('5')])]
+    assert coerce_query(coerced) is coerced
+    print("-" * 50)
+
+class RecordingExporter(Exporter):
+    def __init__(self):
+        self.traces = []
+        self.slow_queries = []
+
+    def on_trace(self, trace):
+        self.traces.append(trace)
+
+    def on_slow_query(self, slow_query):
+        self.slow_queries.append(slow_query)
+
+def check_instrumentation():
+    print("\nInstrumentation")
+    print("-" * 50)
+    exporter = RecordingExporter()
+    instrumentation = Instrumentation([exporter], slow_query_threshold=0, seed=0)
+    previous = install(instrumentation)
+    try:
+        get_plan_cache().clear()
+        for years in range(5):
+            translate_query(f"SKILLS = 'Go' AND YOE > {years}", param_style=ParamStyle.QMARK)
+        translate_query("SKILLS = 'Go' AND YOE > 3", optimize=True)
+    finally:
+        install(previous)
+    translate_query("YOE > 1")
+
+    snapshots = instrumentation.export()
+    for stage, snapshot in snapshots.items():
+        print(f"{stage:9} count={snapshot.count} p50={snapshot.p50 * 1e6:.1f}us p99={snapshot.p99 * 1e6:.1f}us")
+    assert list(snapshots) == ['lex', 'parse', 'optimize', 'translate', 'total']
+    assert snapshots['total'].count == 6 and snapshots['lex'].count == 6
+    # Only the first cached query and the optimized one were parsed
+    assert snapshots['parse'].count == 2 and snapshots['optimize'].count == 1
+
+    assert len(exporter.traces) == 6 and len(exporter.slow_queries) == 6
+    cached, hit, optimized = exporter.traces[0], exporter.traces[1], exporter.traces[-1]
+    assert cached.fingerprint == hit.fingerprint and hit.node_count is None
+    assert cached.node_count == optimized.node_count == 8 and cached.join_count == 2
+    slow_query = instrumentation.slow_queries[-1]
+    print("Slow query:", slow_query.query, "->", slow_query.sql)
+    assert slow_query.sql.startswith('SELECT') and abs(slow_query.total - sum(slow_query.timings.values())) < 1e-9
+    print("-" * 50)
+
 def main():
     # Test basic queries
     test_translation("YOE > 5")
+    check_plan_cache()
+    check_shared_cache()
+    check_param_styles()
+    check_prepared_statements()
+    check_semi_joins()
+    check_batch()
+    check_projection()
+    check_large_sets()
+    check_field_registry()
+    check_instrumentation()
     # test_translation("SKILLS IN {'Python', 'Java', 'SQL'}")
     
     # # Test compound queries with automatic join handling
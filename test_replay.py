@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+from aql.replay import replay, report, read_lines, chunk_ranges
+from aql.db.sqlite_schema import create_sqlite_database
+from test_query_translation import load_sample_resumes
+
+QUERIES = [
+    "YOE > 5",
+    "YOE > 7",
+    "SKILLS = 'Python' AND LOCATION = 'San Francisco'",
+    "SKILLS = 'Go' AND LOCATION = 'New York'",
+    "EDUCATION = 'Bachelor Degree' ORDER BY YOE DESC LIMIT 2",
+    json.dumps({'query': "YOE > 1"}),
+    "SALARY > 'high'",
+    "",
+]
+
+def write_log(path: str, repeats: int):
+    with open(path, 'w') as f:
+        for _ in range(repeats):
+            f.write('\n'.join(QUERIES) + '\n')
+
+def check_chunking(path: str):
+    print("\nChunked reading")
+    print("-" * 50)
+    whole = list(read_lines(path, 0, os.path.getsize(path)))
+    for chunk_bytes in (1, 7, 100, 1 << 20):
+        lines = [line for start, end in chunk_ranges(path, chunk_bytes) for line in read_lines(path, start, end)]
+        assert lines == whole, chunk_bytes
+    print(f"{len(whole)} lines read identically at every chunk size")
+    print("-" * 50)
+
+def check_replay(path: str, database: str, repeats: int):
+    print("\nReplay")
+    print("-" * 50)
+    single = replay(path, workers=1, database=database, chunk_bytes=256)
+    pooled = replay(path, workers=2, database=database, chunk_bytes=256)
+    for stats in (single, pooled):
+        assert stats.queries == 7 * repeats and stats.errors == {'ParserError': repeats}
+        # YOE > 5, YOE > 7 and the JSON line share a shape, as do the two SKILLS queries
+        assert sorted(shape.count for shape in stats.shapes.values()) == [repeats, 2 * repeats, 3 * repeats]
+        assert stats.stages['execute'].count == 6 * repeats
+    assert {f: s.count for f, s in single.shapes.items()} == {f: s.count for f, s in pooled.shapes.items()}
+
+    summary = report(pooled, 1.0, top=2)
+    for shape in summary['top_shapes']:
+        print(f"{shape['fingerprint']} {shape['count']}x p50={shape['p50_ms']:.3f}ms {shape['example']}")
+    assert len(summary['top_shapes']) == 2 and summary['shapes'] == 3
+
+    trimmed = replay(path, workers=1, chunk_bytes=256, max_shapes=1)
+    assert len(trimmed.shapes) == 1 and trimmed.trimmed_shapes >= 2
+    print("-" * 50)
+
+def main():
+    repeats = 20
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'queries.log')
+        database = os.path.join(directory, 'aql.db')
+        write_log(path, repeats)
+        connection = create_sqlite_database(database)
+        load_sample_resumes(connection)
+        connection.commit()
+        connection.close()
+        check_chunking(path)
+        check_replay(path, database, repeats)
+
+if __name__ == "__main__":
+    main()
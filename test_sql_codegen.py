@@ -0,0 +1,145 @@
+import random
+from typing import Optional
+from aql import parse
+from aql.parser.ast import (
+    Query, LogicalExpression, ComparisonCondition,
+    Identifier, Value, SetLiteral, Constant, SortKey,
+    ComparisonOperator, LogicalOperator
+)
+from aql.fields import NUMERIC_FIELDS
+from aql.db.query_translator import QueryTranslator
+from aql.db.sql_codegen import SQLGenerator
+from aql.db.sql_builder import ParamStyle, SetStyle, LARGE_SET_THRESHOLD
+
+CORPUS = [
+    "YOE > 5",
+    "SKILLS IN {'Python', 'Java', 'SQL'}",
+    "SKILLS IN {}",
+    "YOE >= 3 AND SKILLS IN {'ReactJS', 'NodeJS'}",
+    "LOCATION = 'San Francisco' OR LOCATION = 'New York'",
+    "LOCATION = 'San Francisco' AND (YOE > 5 OR SKILLS IN {'Rust', 'Go'})",
+    "(YOE > 3 AND SKILLS IN {'Python'}) OR (YOE > 5 AND SKILLS IN {'Java'})",
+    "SALARY >= 100000.50",
+    "EXPERIENCE != 'Entry Level'",
+    "EDUCATION = 'Bachelor Degree'",
+    "SKILLS IN {'Python'} AND EDUCATION = 'Bachelor Degree'",
+    "NOT SKILLS = 'Java'",
+    "NOT (YOE > 5 OR YOE < 2) AND NOT NOT SALARY = 1",
+    "NOT (EDUCATION = 'PhD' AND NOT LOCATION IN {'NYC', 'SF'})",
+    "YOE = TRUE OR LOCATION = \"O'Brien\"",
+    "YOE > 1 OR YOE > 2 AND SKILLS = 'Go' OR YOE > 3 OR (LOCATION = 'A' OR LOCATION = 'B')",
+    "YOE > 5 ORDER BY YOE DESC LIMIT 10",
+    "SKILLS IN {'Go'} ORDER BY LOCATION, SALARY DESC",
+    "EDUCATION = 'PhD' LIMIT 3",
+]
+
+FIELDS = ['YOE', 'SALARY', 'LOCATION', 'EXPERIENCE', 'EDUCATION', 'SKILLS']
+SORT_FIELDS = ['YOE', 'SALARY', 'LOCATION', 'EXPERIENCE']
+PROJECTIONS = [None, ('id', 'name', 'location')]
+SIZE = LARGE_SET_THRESHOLD + 1
+LARGE_SET_CORPUS = [
+    "SKILLS IN {" + ', '.join(f"'skill{i}'" for i in range(SIZE)) + "}",
+    "NOT YOE IN {" + ', '.join(str(i) for i in range(SIZE)) + "} OR LOCATION IN {'A', 'B'}",
+    "EDUCATION IN {" + ', '.join(f"'d{i % SIZE}'" for i in range(2 * SIZE)) + "} AND "
+    "SALARY IN {" + ', '.join(str(i + 0.5) for i in range(SIZE)) + "} ORDER BY YOE LIMIT 5",
+]
+SCALAR_OPERATORS = [op for op in ComparisonOperator if op != ComparisonOperator.IN]
+STRINGS = ['Python', 'Go', "O'Brien", 'San Francisco', 'Senior', 'PhD']
+
+def random_value(rng: random.Random, field_name: str) -> Value:
+    """A literal the field's column type accepts, possibly after coercion"""
+    kind = rng.random()
+    if kind < 0.4:
+        return Value(rng.randint(0, 20))
+    if kind < 0.5:
+        return Value(rng.randint(0, 200) / 4)
+    if kind < 0.9:
+        return Value(str(rng.randint(0, 20)) if field_name in NUMERIC_FIELDS else rng.choice(STRINGS))
+    return Value(rng.random() < 0.5)
+
+def random_node(rng: random.Random, depth: int):
+    """Build a random AST, including shapes the parser cannot produce"""
+    if depth <= 0 or rng.random() < 0.3:
+        if rng.random() < 0.05:
+            return Constant(rng.random() < 0.5)
+        field = Identifier(rng.choice(FIELDS))
+        if rng.random() < 0.25:
+            values = [random_value(rng, field.name) for _ in range(rng.randint(0, 4))]
+            return ComparisonCondition(field, ComparisonOperator.IN, SetLiteral(values))
+        return ComparisonCondition(field, rng.choice(SCALAR_OPERATORS), random_value(rng, field.name))
+
+    operator = rng.choice(list(LogicalOperator))
+    if operator == LogicalOperator.NOT:
+        return LogicalExpression(operator, random_node(rng, depth - 1))
+    operands = [random_node(rng, depth - 1) for _ in range(rng.choice([2, 2, 3, 5]))]
+    return LogicalExpression.of(operator, operands)
+
+def random_query(rng: random.Random) -> Query:
+    """Wrap a random AST in a query with random ORDER BY keys and LIMIT"""
+    order_by = [
+        SortKey(Identifier(rng.choice(SORT_FIELDS)), rng.random() < 0.5)
+        for _ in range(rng.choice([0, 0, 1, 2]))
+    ]
+    limit = rng.choice([None, None, rng.randint(0, 100)])
+    return Query(random_node(rng, 5), order_by, limit)
+
+def compare(ast: Query, label: str, large_sets: Optional[SetStyle] = None) -> int:
+    """Translate an AST with both backends in every mode and check they agree"""
+    checked = 0
+    for param_style in [None] + list(ParamStyle):
+        for semi_joins in (False, True):
+            for columns in PROJECTIONS:
+                expected = QueryTranslator(param_style, semi_joins, columns, large_sets).translate(ast)
+                actual = SQLGenerator(param_style, semi_joins, columns, large_sets).translate(ast)
+                assert actual == expected, (
+                    f"{label} (param_style={param_style}, semi_joins={semi_joins}, columns={columns}, "
+                    f"large_sets={large_sets})\n"
+                    f"pypika: {expected}\ndirect: {actual}"
+                )
+                checked += 1
+    return checked
+
+def check_corpus():
+    print("\nDifferential corpus: direct SQL generator vs pypika")
+    print("-" * 50)
+    checked = 0
+    for query_str in CORPUS:
+        checked += compare(parse(query_str), query_str)
+    for query_str in LARGE_SET_CORPUS:
+        for large_sets in SetStyle:
+            checked += compare(parse(query_str), query_str[:40], large_sets)
+
+    rng = random.Random(20240501)
+    for i in range(500):
+        checked += compare(random_query(rng), f"random AST #{i}")
+    print(f"{checked} translations identical")
+    print("-" * 50)
+
+def check_deep_queries():
+    print("\nDeep and long queries")
+    print("-" * 50)
+    # A flat chain is joined pairwise by pypika, and the backends still agree
+    chain = " OR ".join(f"LOCATION = 'city{i}'" for i in range(3000))
+    sql, params = QueryTranslator(ParamStyle.QMARK).translate(parse(chain))
+    assert (sql, params) == SQLGenerator(ParamStyle.QMARK).translate(parse(chain)) and len(params) == 3000
+    print(f"3000-term OR: {len(sql)} characters of SQL from both backends")
+
+    nested = "YOE > 0"
+    for level in range(2000):
+        nested = f"(SKILLS = 'skill{level}' {'AND' if level % 2 else 'OR'} {nested})"
+    for query_str in [nested, "NOT " * 3000 + "YOE > 5"]:
+        ast = parse(query_str)
+        SQLGenerator(ParamStyle.QMARK).translate(ast)
+        try:
+            QueryTranslator(ParamStyle.QMARK).translate(ast)
+            raise AssertionError("expected the pypika backend to reject the query")
+        except ValueError as e:
+            print(f"pypika: {e}")
+    print("-" * 50)
+
+def main():
+    check_corpus()
+    check_deep_queries()
+
+if __name__ == "__main__":
+    main()